@@ -1,17 +1,32 @@
-from flask import Blueprint, request, jsonify, send_file, make_response
+from flask import Blueprint, request, jsonify, send_file, make_response, Response
+from werkzeug.http import parse_content_range_header
 from datetime import datetime
 import base64
+import itertools
 import json
 import re
+import secrets
+import shlex
 import shutil
 from ..database import connector
 from ..database.server import Server 
 from ..database.load_env import LoadDBEnv
 from ..database.auth import Auth
 from ..database.organization import Organization 
+from ..database.script_manifest import ScriptManifest
 from ..const import const
 from ..decorators import token_required
 from ..server_management.server_manager import *
+from ..server_management.batch import BATCH_ACTIONS, run_batch
+from ..server_management.execution_stream import start_execution, get_execution, sse_events
+from ..server_management.job_queue import job_queue, script_job, upload_folder_job
+from ..server_management.log_parser import parse_log_output
+from ..server_management.log_tail import log_store, read_log_end, tail_log, tail_initial_bytes, tail_max_bytes
+from ..server_management.log_index import LogSegment, log_index, ufw_row
+from ..server_management.log_analytics import UfwEvents
+from ..server_management.metrics import MetricsStore, metrics_enabled, metrics_interval, metrics_collector
+from ..database.server_job import ServerJob
+from ..database.file_transfer import FileTransfer
 
 server_bp = Blueprint("server", __name__)
 
@@ -19,64 +34,151 @@ server_bp = Blueprint("server", __name__)
 def secure_filename(filename):
   return filename.replace("\\", "").replace("/", "")
 
-def parse_history_regex(log_message):
-    # Regex pattern to capture timestamp (flexible on separators) and host
-    pattern = r"((\s+)?\d+)(\s+.*)"
+def event_stream_response(events):
+    response = Response(events, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+def parse_remote_log(server, script_path, kind):
+    """
+    Run a log script and parse its stdout while it streams in.
+    Returns (records, unparsed line count, stderr).
+    """
+    stderr = []
+
+    def stdout_chunks():
+        for stream, data in server.stream_script_in_remote_server(script_path, compress=True):
+            if stream == "stdout":
+                yield data
+            elif stream == "stderr":
+                stderr.append(data)
 
-    # Match the pattern and extract groups
-    match = re.match(pattern, log_message)
-    if match:
-        # Extract timestamp (handle cases with or without separators)
-        no = (match.groups(1)[0]).strip()
-        command_line = (match.groups(1)[2]).strip()
-    else:
-        return None, None
+    try:
+        records, unparsed = parse_log_output(kind, stdout_chunks())
+    except Exception as e:
+        print(f"Error executing script: {e}")
+        return [], 0, str(e)
+    return records, unparsed, "".join(stderr)
+
+def stream_raw_log(server, script_path, filename):
+    """
+    Send a log script's stdout as a chunked download while it is read from the channel.
+    With ?gzip=true output the server already gzipped is passed through as is, anything
+    else is compressed on the fly. A script failing midway cuts the download off.
+    The server is disconnected when the response is closed.
+    """
+    compress = request.args.get("gzip", "false").lower() == "true"
+    stderr = []
+    started = []
+    encoding = []
+
+    def stdout_chunks():
+        for stream, data in server.stream_script_in_remote_server(script_path, chunk_size=raw_log_chunk_size, decode=False,
+                                                                compress=True, inflate=not compress):
+            if stream == "stdout":
+                started.append(True)
+                yield data
+            elif stream == "encoding":
+                encoding.append(data)
+            elif stream == "stderr" and not started:
+                # Only needed to report a script that printed nothing, dropped once output flows
+                stderr.append(data)
+            elif stream == "exit" and data != 0:
+                print(f"Log script '{script_path}' exited with status {data}")
+                raise RuntimeError(f"Log script exited with status {data}")
+
+    def stderr_response():
+        return jsonify({"stderr": b"".join(stderr).decode("utf-8", errors="replace").split("\n")}), 500
+
+    chunks = stdout_chunks()
+    try:
+        # Wait for the first output so a failing script still gets an error status
+        first = next(chunks, None)
+    except Exception as e:
+        print(f"Error executing script: {e}")
+        chunks.close()
+        server.disconnect()
+        return stderr_response() if stderr else (jsonify({"message": "Can not execute script"}), 500)
+    if first is None:
+        server.disconnect()
+        if stderr:
+            return stderr_response()
+        return jsonify({"message": "Something is wrong"}), 404
+
+    def generate():
+        # Exceptions propagate so the server aborts the response instead of ending it cleanly
+        body = itertools.chain((first,), chunks)
+        if compress and not encoding:
+            body = gzip_stream(body, raw_log_gzip_level)
+        yield from body
+
+    def close():
+        # Also runs when the body is never iterated, e.g. the client went away first
+        chunks.close()
+        server.disconnect()
+
+    if compress:
+        filename = f"{filename}.gz"
+    response = Response(generate(), mimetype="application/gzip" if compress else "application/octet-stream")
+    response.call_on_close(close)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response.headers["Access-Control-Expose-Headers"] = "Content-Disposition"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response, 200
 
-    return no, command_line
+# Logs kept in the columnar index, with the script that reads each one
+LOG_QUERY_SCRIPTS = {"ufw": "SCRIPT_PATH_LOG_UFW", "lastlog": "SCRIPT_PATH_LOG_LAST"}
 
-def parse_ufwlog_regex(log_message):
-    # Regex pattern to capture timestamp (flexible on separators) and host
-    pattern = r"(\w+\s+\d+\s\d+:\d+:\d+)(\s.*\s)(kernel.*)"
+def connect_log_server(server_manager, db, server_id, kind):
+    """
+    Connect to the server and deploy its scripts, then close db.
+    Returns (ServerManager, path of kind's script, None) or (None, None, error response).
+    """
+    server_info = server_manager.get_info_to_connect(server_id)
+    if server_info == None:
+        db.close()
+        return None, None, (jsonify({"message":"No data for server"}), 500)
 
-    # Match the pattern and extract groups
-    match = re.match(pattern, log_message)
-    if match:
-        # Extract timestamp (handle cases with or without separators)
-        timestamp = match.groups(1)[0]
-        host = (match.groups(1)[1]).strip()
-        log = (match.groups(1)[2]).strip()
-    else:
-        return None, None, None
-
-    return timestamp, host, log
-
-def parse_lastlog_regex(log_message):
-    # Regex pattern to capture timestamp (flexible on separators) and host
-    pattern = r"^(\w+)\s+((pts\/\d+\s+))((\S+)?)(\s+)((\S+\s+\S+\s+.+))$"
-    pattern_1 = r"^(reboot)\s+(\S+\s+boot)\s+([^ ]+)(?:\s+|\t+)(.+)$"
-    pattern_2 = r"^(wtmp)\s(begins)\s(.*)$"
-    # Match the pattern and extract groups
-    match = re.match(pattern, log_message)
-    match_1 = re.match(pattern_1, log_message)
-    match_2 = re.match(pattern_2, log_message)
-    if match:        
-        user = match.groups(1)[0]
-        info = (match.groups(1)[1]).strip()
-        from_ip = (match.groups(1)[3]).strip()
-        timestamp = (match.groups(1)[7]).strip()
-    elif match_1:
-        user = match_1.groups(1)[0]
-        info = (match_1.groups(1)[1]).strip()
-        from_ip = (match_1.groups(1)[2]).strip()
-        timestamp = (match_1.groups(1)[3]).strip()
-    elif match_2:
-        user = match_2.groups(1)[0]
-        info = (match_2.groups(1)[1]).strip()
-        from_ip = ""
-        timestamp = (match_2.groups(1)[2]).strip()
-    else:
-        return None, None, None, None
-    return user, info, from_ip, timestamp
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
+    if not server.connect():
+        db.close()
+        return None, None, (jsonify({"message": "Can not connect server"}), 500)
+
+    script_directory = os.environ.get("SERVER_DIRECTORY")
+    file_name = server.get_file_name(os.environ.get(LOG_QUERY_SCRIPTS[kind]))
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return None, None, (jsonify({"message": "Can not deploy scripts to server"}), 500)
+    db.close()
+    return server, f"{script_directory}/{file_name}", None
+
+def refresh_log_index(server_manager, db, server_id, kind):
+    # Returns an error response, or None once the index holds the latest lines
+    server, script_path, error = connect_log_server(server_manager, db, server_id, kind)
+    if error is not None:
+        return error
+    result = tail_log(server, server_id, kind, log_store, tail_initial_bytes, tail_max_bytes, script_path, log_index)
+    server.disconnect()
+    if result is None:
+        return jsonify({"message": "Can not read log"}), 500
+    return None
+
+def incremental_log_report(server, server_id, kind, script_path):
+    # Only bytes appended since the stored cursor cross the SSH connection. parsed_log holds
+    # the records read by this call unless ?limit= asks for that many of the latest stored.
+    # History "no" counts from the first line tailed, not from the top of the file.
+    result = tail_log(server, server_id, kind, log_store, tail_initial_bytes, tail_max_bytes, script_path, log_index)
+    server.disconnect()
+    if result is None:
+        return jsonify({"message": "Can not read log"}), 500
+    new, unparsed = result
+    limit = request.args.get("limit", new, type=int)
+    if not 0 <= limit <= log_store.max_records:
+        return jsonify({"message": f"limit must be between 0 and {log_store.max_records}"}), 400
+    parsed_log = log_store.read(server_id, kind, limit)
+    return jsonify({"parsed_log": parsed_log, "new": new, "unparsed": unparsed}), 200
 
 @server_bp.route("/add", methods=["POST"])
 @token_required
@@ -638,12 +740,24 @@ def get_server_info(server_id):
     if server_manager.check_user_access(username, server_id) == False:
         db.close()
         return jsonify({"message": "Permission denied"}), 403
+
+    if metrics_enabled:
+        metrics_collector.ensure_started()
+        # Samples collected in the background are served without opening an SSH session
+        latest = MetricsStore(db).get_latest(server_id, max_age=float(os.environ.get("METRICS_MAX_AGE", 3 * metrics_interval)))
+        if latest is not None:
+            db.close()
+            sampled_at, data = latest
+            data = dict(data)
+            data["last_seen"] = str(datetime.fromtimestamp(sampled_at))
+            return json.dumps(data), 200
     
     server_info = server_manager.get_info_to_connect(server_id)
     if server_info == None:
+        db.close()
         return jsonify({"message":"No data for server"}), 500
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     # Connect to the server
     result = server.connect()
@@ -657,9 +771,10 @@ def get_server_info(server_id):
     file_name = server.get_file_name(info_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(info_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
     data_return, stderr = server.execute_script_in_remote_server(file_in_server)
     server.disconnect()
@@ -668,6 +783,10 @@ def get_server_info(server_id):
 
         # Add new key-value pair
         data["script_directory"] = script_directory
+        # The connection is not held while the script runs, borrow one again for the sample
+        db.connect()
+        MetricsStore(db).record(server_id, data)
+        db.close()
         data["last_seen"] = str(datetime.now())
 
         # Convert dictionary back to JSON string
@@ -675,6 +794,43 @@ def get_server_info(server_id):
         return updated_json_str, 200
     return stderr, 500
 
+@server_bp.route("/get_server_metrics/<server_id>", methods=["GET"])
+@token_required
+def get_server_metrics(server_id):
+    db_env = LoadDBEnv.load_db_env()
+    db = connector.DBConnector(*db_env)
+    db.connect()
+    server_manager = Server(db)
+
+    username = request.jwt_payload.get("username")
+
+    if username == None:
+        db.close()
+        return jsonify({"message": "Permission denied"}), 403
+
+    if server_manager.check_user_access(username, server_id) == False:
+        db.close()
+        return jsonify({"message": "Permission denied"}), 403
+
+    # start and end are unix timestamps, unparsable values are ignored
+    start = request.args.get("start", type=float)
+    end = request.args.get("end", type=float)
+    buckets = request.args.get("buckets", type=int)
+    if buckets is not None and not 0 < buckets <= 10000:
+        db.close()
+        return jsonify({"message": "buckets must be between 1 and 10000"}), 400
+    if start is not None and end is not None and start > end:
+        db.close()
+        return jsonify({"message": "start must not be after end"}), 400
+
+    if metrics_enabled:
+        metrics_collector.ensure_started()
+    history = MetricsStore(db).history(server_id, start, end, buckets)
+    db.close()
+    if history is None:
+        return jsonify({"message": "Can not read metrics"}), 500
+    return jsonify(history), 200
+
 @server_bp.route("/get_all_proxy/<server_id>", methods=["GET"])
 @token_required
 def get_all_proxy(server_id):
@@ -702,7 +858,7 @@ def get_all_proxy(server_id):
         db.close()
         return jsonify({"message":"No data for server"}), 500
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     # Connect to the server
     result = server.connect()
@@ -716,9 +872,10 @@ def get_all_proxy(server_id):
     file_name = server.get_file_name(proxy_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(proxy_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
     data_return, stderr = server.execute_script_in_remote_server(file_in_server)
     server.disconnect()
@@ -769,7 +926,7 @@ def update_proxy(server_id):
     new_domain = data["new_domain"]
     new_port = data["new_port"]
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     # Connect to the server
     result = server.connect()
@@ -789,9 +946,10 @@ def update_proxy(server_id):
     file_name = server.get_file_name(proxy_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(proxy_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
     data_return, stderr = server.execute_script_in_remote_server(file_in_server, old_domain, old_port, new_domain, new_port)
     server.disconnect()
@@ -835,7 +993,7 @@ def add_proxy(server_id):
     domain = data["domain"]
     port = data["port"]
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     # Connect to the server
     result = server.connect()
@@ -855,9 +1013,10 @@ def add_proxy(server_id):
     file_name = server.get_file_name(proxy_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(proxy_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
     data_return, stderr = server.execute_script_in_remote_server(file_in_server, domain, port)
     server.disconnect()
@@ -904,7 +1063,7 @@ def delete_proxy(server_id):
     domain = input_data[0]
     port = input_data[1]
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     # Connect to the server
     result = server.connect()
@@ -927,9 +1086,10 @@ def delete_proxy(server_id):
     file_name = server.get_file_name(proxy_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(proxy_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
     data_return, stderr = server.execute_script_in_remote_server(file_in_server, domain, port)
     server.disconnect()
@@ -967,7 +1127,7 @@ def lib_status(server_id):
         db.close()
         return jsonify({"message":"No data for server"}), 500
     
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"]) 
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id) 
 
     # Connect to the server
     result = server.connect()
@@ -982,9 +1142,10 @@ def lib_status(server_id):
     file_name = server.get_file_name(action_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(action_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
 
     data_return, stderr = server.execute_script_in_remote_server(file_in_server)
@@ -1031,14 +1192,6 @@ def install_lib(server_id):
 
     library = data["library"]
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"]) 
-
-    # Connect to the server
-    result = server.connect()
-    if not result:
-        db.close()
-        return jsonify({"message": "Can not connect server"}), 500
-    
     if library == "docker":
         library_path = os.environ.get("SCRIPT_PATH_LIB_INSTALL_DOCKER")
     elif library == "mongodb":
@@ -1052,24 +1205,11 @@ def install_lib(server_id):
     elif library == "python":
         library_path = os.environ.get("SCRIPT_PATH_LIB_INSTALL_PYTHON")
 
-    script_directory = os.environ.get("SERVER_DIRECTORY")
-    
-    file_name = server.get_file_name(library_path)
-    file_in_server = f"{script_directory}/{file_name}"
-
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(library_path, script_directory)
-        server.grant_permission(file_in_server, 700)
     db.close()
-    data_return, stderr = server.execute_script_in_remote_server(file_in_server)
-    server.disconnect()
-    if data_return:
-        data_return = data_return.split("\n")
-        return jsonify({"lines": data_return})
-    if stderr:
-        error_messages = stderr.split("\n")
-        return jsonify({"stderr": error_messages}), 500
-    return jsonify({"message": "Something is wrong"}), 404
+    job_id = job_queue.submit(server_id, username, "install_lib", script_job(server_info, server_id, library_path))
+    if job_id is None:
+        return jsonify({"message": "Job queue is full"}), 503
+    return jsonify({"message": "Job submitted", "job_id": job_id}), 202
 
 @server_bp.route("/uninstall_lib/<server_id>", methods=["POST"])
 @token_required
@@ -1102,14 +1242,6 @@ def uninstall_lib(server_id):
 
     library = data["library"]
     
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
-
-    # Connect to the server
-    result = server.connect()
-    if not result:
-        db.close()
-        return jsonify({"message": "Can not connect server"}), 500
-    
     if library == "docker":
         library_path = os.environ.get("SCRIPT_PATH_LIB_UNINSTALL_DOCKER")
     elif library == "mongodb":
@@ -1123,24 +1255,11 @@ def uninstall_lib(server_id):
     elif library == "python":
         library_path = os.environ.get("SCRIPT_PATH_LIB_UNINSTALL_PYTHON")
 
-    script_directory = os.environ.get("SERVER_DIRECTORY")
-    
-    file_name = server.get_file_name(library_path)
-    file_in_server = f"{script_directory}/{file_name}"
-
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(library_path, script_directory)
-        server.grant_permission(file_in_server, 700)
     db.close()
-    data_return, stderr = server.execute_script_in_remote_server(file_in_server)
-    server.disconnect()
-    if data_return:
-        data_return = data_return.split("\n")
-        return jsonify({"lines": data_return})
-    if stderr:
-        error_messages = stderr.split("\n")
-        return jsonify({"stderr": error_messages}), 500
-    return jsonify({"message": "Something is wrong"}), 404
+    job_id = job_queue.submit(server_id, username, "uninstall_lib", script_job(server_info, server_id, library_path))
+    if job_id is None:
+        return jsonify({"message": "Job queue is full"}), 503
+    return jsonify({"message": "Job submitted", "job_id": job_id}), 202
 
 @server_bp.route("/firewall_action/<server_id>", methods=["POST"])
 @token_required
@@ -1175,7 +1294,7 @@ def firewall_action(server_id):
     port = data.get("port")
     ip = data.get("ip")
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     # Connect to the server
     result = server.connect()
@@ -1227,9 +1346,10 @@ def firewall_action(server_id):
     file_name = server.get_file_name(action_path)
     file_in_server = f"{script_directory}/{file_name}"
     
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(action_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
     data_return, stderr = server.execute_script_in_remote_server(file_in_server, arg)
     server.disconnect()
@@ -1268,7 +1388,7 @@ def firewall_rules(server_id):
         db.close()
         return jsonify({"message":"No data for server"}), 500
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     # Connect to the server
     result = server.connect()
@@ -1283,9 +1403,10 @@ def firewall_rules(server_id):
     file_name = server.get_file_name(action_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(action_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
     data_return, stderr = server.execute_script_in_remote_server(file_in_server)
     server.disconnect()
@@ -1348,43 +1469,17 @@ def docker_build(server_id):
         db.close()
         return jsonify({"message":"No data for docker build"}), 500
     
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
-
-    # Connect to the server
-    result = server.connect()
-    if not result:
-        db.close()
-        return jsonify({"message": "Can not connect server"}), 500
-    
     docker_path = os.environ.get("SCRIPT_PATH_DOCKER_CONTROL")
-    script_directory = os.environ.get("SERVER_DIRECTORY")
-    
-    file_name = server.get_file_name(docker_path)
-    file_in_server = f"{script_directory}/{file_name}"
-
-    if not server.check_script_exists_on_remote(dockerfile):
-        db.close()
-        return jsonify({"message": "Please upload folder to server"}), 500
-    
-    dockerfile_path = f"{dockerfile}/Dockerfile"
-    if not server.check_script_exists_on_remote(dockerfile_path):
-        db.close()
-        return jsonify({"message": "Please upload Dockerfile to server"}), 500
-    
-    if not server.check_script_exists_on_remote(file_in_server):
-        db.close()
-        server.upload_file_to_remote(docker_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    # Checked by the job once it holds the SSH connection
+    required_paths = [
+        (dockerfile, "Please upload folder to server"),
+        (f"{dockerfile}/Dockerfile", "Please upload Dockerfile to server")
+    ]
     db.close()
-    data_return, stderr = server.execute_script_in_remote_server(file_in_server, "build", dockerfile, image_tag)
-    server.disconnect()
-    if data_return:
-        data_return = data_return.split("\n")
-        return jsonify({"lines": data_return})
-    if stderr:
-        error_messages = stderr.split("\n")
-        return jsonify({"stderr": error_messages}), 500
-    return jsonify({"message": "Something is wrong"}), 404
+    job_id = job_queue.submit(server_id, username, "docker_build", script_job(server_info, server_id, docker_path, ("build", dockerfile, image_tag), required_paths))
+    if job_id is None:
+        return jsonify({"message": "Job queue is full"}), 503
+    return jsonify({"message": "Job submitted", "job_id": job_id}), 202
 
 @server_bp.route("/docker_containers/<server_id>", methods=["POST"])
 @token_required
@@ -1418,7 +1513,7 @@ def docker_containers(server_id):
     container = data.get("container")
     action = data.get("action")
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     # Connect to the server
     result = server.connect()
@@ -1435,9 +1530,10 @@ def docker_containers(server_id):
     file_name = server.get_file_name(docker_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(docker_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
     data_return, stderr = server.execute_script_in_remote_server(file_in_server, action, container)
     server.disconnect()
@@ -1481,7 +1577,7 @@ def docker_create_containers(server_id):
     image = data.get("image")
     container_name = data.get("container_name")
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     # Connect to the server
     result = server.connect()
@@ -1499,9 +1595,10 @@ def docker_create_containers(server_id):
     file_name = server.get_file_name(docker_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(docker_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
     data_return, stderr = server.execute_script_in_remote_server(file_in_server, "create", container_name, image)
     server.disconnect()
@@ -1545,37 +1642,16 @@ def docker_compose(server_id):
     compose_yaml = data.get("compose_yaml")
     action = data.get("action")
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
-
-    # Connect to the server
-    result = server.connect()
-    if not result:
-        db.close()
-        return jsonify({"message": "Can not connect server"}), 500
-    
     if not compose_yaml:
         db.close()
         return jsonify({"message":"No data for docker compose"}), 500
 
     docker_path = os.environ.get("SCRIPT_PATH_DOCKER_CONTROL")
-    script_directory = os.environ.get("SERVER_DIRECTORY")
-    
-    file_name = server.get_file_name(docker_path)
-    file_in_server = f"{script_directory}/{file_name}"
-
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(docker_path, script_directory)
-        server.grant_permission(file_in_server, 700)
     db.close()
-    data_return, stderr = server.execute_script_in_remote_server(file_in_server, action, compose_yaml)
-    server.disconnect()
-    if data_return:
-        data_return = data_return.split("\n")
-        return jsonify({"lines": data_return})
-    if stderr:
-        error_messages = stderr.split("\n")
-        return jsonify({"stderr": error_messages}), 500
-    return jsonify({"message": "Something is wrong"}), 404
+    job_id = job_queue.submit(server_id, username, "docker_compose", script_job(server_info, server_id, docker_path, (action, compose_yaml)))
+    if job_id is None:
+        return jsonify({"message": "Job queue is full"}), 503
+    return jsonify({"message": "Job submitted", "job_id": job_id}), 202
 
 @server_bp.route("/docker_list_images/<server_id>", methods=["GET"])
 @token_required
@@ -1603,7 +1679,7 @@ def docker_list_images(server_id):
         db.close()
         return jsonify({"message":"No data for server"}), 500
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
     
     result = server.connect()
     if not result:
@@ -1616,11 +1692,12 @@ def docker_list_images(server_id):
     file_name = server.get_file_name(docker_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(docker_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
-    data_return, stderr = server.execute_script_in_remote_server(file_in_server, "list-images")
+    data_return, stderr = server.execute_script_in_remote_server(file_in_server, "list-images", compress=True)
     server.disconnect()
     if data_return:
         # Parse the output
@@ -1672,7 +1749,7 @@ def docker_list_containers(server_id):
         db.close()
         return jsonify({"message":"No data for server"}), 500
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     result = server.connect()
     if not result:
@@ -1685,11 +1762,12 @@ def docker_list_containers(server_id):
     file_name = server.get_file_name(docker_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(docker_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
-    data_return, stderr = server.execute_script_in_remote_server(file_in_server, "list-containers")
+    data_return, stderr = server.execute_script_in_remote_server(file_in_server, "list-containers", compress=True)
     server.disconnect()
     if data_return:
         # Parse the output
@@ -1755,13 +1833,18 @@ def execute_code(server_id):
         db.close()
         return jsonify({"message":"No data for server"}), 500
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
     result = server.connect()
     if not result:
         db.close()
         return jsonify({"message": "Can not connect server"}), 500
 
-    if not server.check_script_exists_on_remote(execute_file):
+    file_info = server.path_info(execute_file)
+    if file_info["error"]:
+        db.close()
+        server.disconnect()
+        return jsonify({"message": f"Can not check file on server: {file_info['error']}"}), 500
+    if not file_info["exists"]:
         db.close()
         server.disconnect()
         return jsonify({"message": "File does not exist on server"}), 500
@@ -1772,9 +1855,10 @@ def execute_code(server_id):
     file_name = server.get_file_name(execute_code_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(execute_code_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
     server.grant_permission(execute_file, 700)
     data_return, stderr = server.execute_script_in_remote_server(file_in_server, execute_file)
@@ -1795,6 +1879,102 @@ def execute_code(server_id):
         return jsonify({"message":"Can not execute code on server"}), 500
     return jsonify({"lines": lines, "stderr": error_messages}), 200
     
+@server_bp.route("/execute_code_stream/<server_id>", methods=["POST"])
+@token_required
+def execute_code_stream(server_id):
+    db_env = LoadDBEnv.load_db_env()
+    db = connector.DBConnector(*db_env)
+    db.connect()
+    server_manager = Server(db)
+
+    if not server_id:
+        db.close()
+        return jsonify({"message": "Server ID is required."}), 400
+
+    username = request.jwt_payload.get("username")
+    if username is None:
+        db.close()
+        return jsonify({"message": "Permission denied"}), 403
+
+    if not server_manager.check_user_access(username, server_id):
+        db.close()
+        return jsonify({"message": "Permission denied"}), 403
+
+    data = request.get_json()
+
+    execute_file = data.get("execute_file")
+
+    if not execute_file:
+        db.close()
+        return jsonify({"message":"Execute file is required"}), 500
+    
+    file_type = execute_file.split(".")[-1]
+    support_file = ["py","go", "js"]
+    if file_type not in support_file:
+        db.close()
+        return jsonify({"message":"Unsupported file"}), 500
+    
+    server_info = server_manager.get_info_to_connect(server_id)
+    if server_info == None:
+        db.close()
+        return jsonify({"message":"No data for server"}), 500
+
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
+    result = server.connect()
+    if not result:
+        db.close()
+        return jsonify({"message": "Can not connect server"}), 500
+
+    file_info = server.path_info(execute_file)
+    if file_info["error"]:
+        db.close()
+        server.disconnect()
+        return jsonify({"message": f"Can not check file on server: {file_info['error']}"}), 500
+    if not file_info["exists"]:
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "File does not exist on server"}), 500
+
+    execute_code_path = os.environ.get("SCRIPT_PATH_EXECUTE_CODE")
+    script_directory = os.environ.get("SERVER_DIRECTORY")
+    
+    file_name = server.get_file_name(execute_code_path)
+    file_in_server = f"{script_directory}/{file_name}"
+
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
+    db.close()
+    server.grant_permission(execute_file, 700)
+
+    # The job thread owns the connection now and disconnects when the program exits
+    job = start_execution(server, file_in_server, (execute_file,), server_id, username)
+    return event_stream_response(sse_events(job))
+
+@server_bp.route("/execute_code_stream/<server_id>/<job_id>", methods=["GET"])
+@token_required
+def execute_code_stream_reattach(server_id, job_id):
+    username = request.jwt_payload.get("username")
+    if username is None:
+        return jsonify({"message": "Permission denied"}), 403
+
+    job = get_execution(job_id)
+    if job is None or job.server_id != server_id or job.username != username:
+        return jsonify({"message": "Job not found"}), 404
+
+    # EventSource sends the last id it received, plain clients can pass ?offset=
+    last_event_id = request.headers.get("Last-Event-ID")
+    try:
+        if last_event_id is not None:
+            offset = int(last_event_id) + 1
+        else:
+            offset = int(request.args.get("offset", 0))
+    except ValueError:
+        return jsonify({"message": "Invalid offset"}), 400
+
+    return event_stream_response(sse_events(job, offset))
+
 @server_bp.route("/report_log_history/<server_id>", methods=["POST"])
 @token_required
 def report_log_history(server_id):
@@ -1821,7 +2001,7 @@ def report_log_history(server_id):
         db.close()
         return jsonify({"message":"No data for server"}), 500
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
     
     result = server.connect()
     if not result:
@@ -1834,24 +2014,18 @@ def report_log_history(server_id):
     file_name = server.get_file_name(execute_code_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(execute_code_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
-    data_return, stderr = server.execute_script_in_remote_server(file_in_server)
+    if request.args.get("incremental", "false").lower() == "true":
+        return incremental_log_report(server, server_id, "history", file_in_server)
+    parsed_log, unparsed, stderr = parse_remote_log(server, file_in_server, "history")
     server.disconnect()
-    if data_return:
-        # Parse the output
-        lines = data_return.split("\n")
-        lines.remove("")
-        parsed_log = []
-        for line in lines:
-            no, command_line = parse_history_regex(line)
-            if no == None or command_line == None:
-                return jsonify({"message": "Error in parsing log"}), 500
-            
-            parsed_log.append({"no": no, "command_line": command_line})
-        return jsonify({"parsed_log": parsed_log}), 200
+    if parsed_log or unparsed:
+        # Lines that do not match the log format are counted instead of failing the report
+        return jsonify({"parsed_log": parsed_log, "unparsed": unparsed}), 200
     if stderr:
         error_messages = stderr.split("\n")
         return jsonify({"stderr": error_messages}), 500
@@ -1883,7 +2057,7 @@ def report_raw_history(server_id):
         db.close()
         return jsonify({"message":"No data for server"}), 500
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     result = server.connect()
     if not result:
@@ -1896,42 +2070,12 @@ def report_raw_history(server_id):
     file_name = server.get_file_name(execute_code_path)
     file_in_server = f"{script_directory}/{file_name}"
    
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(execute_code_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
-    data_return, stderr = server.execute_script_in_remote_server(file_in_server)
-    server.disconnect()
-    if data_return:
-        local_file_path = os.environ.get("TMP_FOLDER")
-        local_file_path = os.path.join(local_file_path, server_id)
-
-        try:
-            os.makedirs(local_file_path)
-        except OSError as e:
-            if "file already exists" in str(e):  # Check for file/folder existence in error message
-                print(f"Folder '{local_file_path}' already exists.")
-            else:
-                print(f"Error creating folder: {e}")
-        
-        filename = os.environ.get("LOG_HISTORY")
-        local_file_path = os.path.join(local_file_path, filename)
-
-        with open(local_file_path, "w", encoding="utf-8") as f:  # Open the file in write mode ('w')
-            if isinstance(data_return, str):  # Check if data is a single string
-                f.write(data_return)
-            else:  # Assume data is a list of strings
-                f.writelines(data_return)  # Write each line in the list
-
-        response = make_response(send_file(local_file_path, mimetype="application/octet-stream", as_attachment=True, download_name=filename))    
-        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
-        response.headers["Access-Control-Expose-Headers"] = "Content-Disposition"
-        
-        return response, 200
-    if stderr:
-        error_messages = stderr.split("\n")
-        return jsonify({"stderr": error_messages}), 500
-    return jsonify({"message": "Something is wrong"}), 404
+    return stream_raw_log(server, file_in_server, os.environ.get("LOG_HISTORY"))
 
 @server_bp.route("/report_log_last/<server_id>", methods=["POST"])
 @token_required
@@ -1959,7 +2103,7 @@ def report_log_last(server_id):
         db.close()
         return jsonify({"message":"No data for server"}), 500
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     result = server.connect()
     if not result:
@@ -1972,26 +2116,18 @@ def report_log_last(server_id):
     file_name = server.get_file_name(execute_code_path)
     file_in_server = f"{script_directory}/{file_name}"
 
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(execute_code_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
-    data_return, stderr = server.execute_script_in_remote_server(file_in_server)
+    if request.args.get("incremental", "false").lower() == "true":
+        return incremental_log_report(server, server_id, "lastlog", file_in_server)
+    parsed_log, unparsed, stderr = parse_remote_log(server, file_in_server, "lastlog")
     server.disconnect()
-    if data_return:
-        # Parse the output
-        lines = data_return.split("\n")
-        lines.remove("")
-        parsed_log = []
-        for line in lines:
-            if line == "":
-                continue
-            user, info, from_ip, timestamp = parse_lastlog_regex(line)
-            if user == None or info == None or from_ip == None or timestamp == None:
-                return jsonify({"message": "Error in parsing log"}), 500
-            
-            parsed_log.append({"user": user, "info": info, "from_ip": from_ip, "timestamp": timestamp})
-        return jsonify({"parsed_log": parsed_log}), 200
+    if parsed_log or unparsed:
+        # Lines that do not match the log format are counted instead of failing the report
+        return jsonify({"parsed_log": parsed_log, "unparsed": unparsed}), 200
     if stderr:
         error_messages = stderr.split("\n")
         return jsonify({"stderr": error_messages}), 500
@@ -2023,7 +2159,7 @@ def report_raw_log_last(server_id):
         db.close()
         return jsonify({"message":"No data for server"}), 500
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     result = server.connect()
     if not result:
@@ -2036,42 +2172,12 @@ def report_raw_log_last(server_id):
     file_name = server.get_file_name(execute_code_path)
     file_in_server = f"{script_directory}/{file_name}"
    
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(execute_code_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
-    data_return, stderr = server.execute_script_in_remote_server(file_in_server)
-    server.disconnect()
-    if data_return:
-        local_file_path = os.environ.get("TMP_FOLDER")
-        local_file_path = os.path.join(local_file_path, server_id)
-
-        try:
-            os.makedirs(local_file_path)
-        except OSError as e:
-            if "file already exists" in str(e):  # Check for file/folder existence in error message
-                print(f"Folder '{local_file_path}' already exists.")
-            else:
-                print(f"Error creating folder: {e}")
-        
-        filename = os.environ.get("LOG_LASTLOG")
-        local_file_path = os.path.join(local_file_path, filename)
-
-        with open(local_file_path, 'w', encoding="utf-8") as f:  # Open the file in write mode ('w')
-            if isinstance(data_return, str):  # Check if data is a single string
-                f.write(data_return)
-            else:  # Assume data is a list of strings
-                f.writelines(data_return)  # Write each line in the list
-
-        response = make_response(send_file(local_file_path, mimetype="application/octet-stream", as_attachment=True, download_name=filename))    
-        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
-        response.headers["Access-Control-Expose-Headers"] = "Content-Disposition"
-        
-        return response, 200
-    if stderr:
-        error_messages = stderr.split("\n")
-        return jsonify({"stderr": error_messages}), 500
-    return jsonify({"message": "Something is wrong"}), 404
+    return stream_raw_log(server, file_in_server, os.environ.get("LOG_LASTLOG"))
 
 @server_bp.route("/report_log_ufw/<server_id>", methods=["POST"])
 @token_required
@@ -2099,7 +2205,7 @@ def report_log_ufw(server_id):
         db.close()
         return jsonify({"message":"No data for server"}), 500
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     result = server.connect()
     if not result:
@@ -2112,28 +2218,18 @@ def report_log_ufw(server_id):
     file_name = server.get_file_name(execute_code_path)
     file_in_server = f"{script_directory}/{file_name}"
    
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(execute_code_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
-    data_return, stderr = server.execute_script_in_remote_server(file_in_server)
+    if request.args.get("incremental", "false").lower() == "true":
+        return incremental_log_report(server, server_id, "ufw", file_in_server)
+    parsed_log, unparsed, stderr = parse_remote_log(server, file_in_server, "ufw")
     server.disconnect()
-    if data_return:
-        # Parse the output
-        lines = data_return.split("\n")
-        lines.remove("")
-        parsed_log = []
-        for line in lines:
-            timestamp, host, log = parse_ufwlog_regex(line)
-            if timestamp == None or host == None or log == None:
-                print(line)
-                print(timestamp)
-                print(host)
-                print(log)
-                return jsonify({"message": "Error in parsing log"}), 500
-            
-            parsed_log.append({"timestamp": timestamp, "host": host, "log": log})
-        return jsonify({"parsed_log": parsed_log}), 200
+    if parsed_log or unparsed:
+        # Lines that do not match the log format are counted instead of failing the report
+        return jsonify({"parsed_log": parsed_log, "unparsed": unparsed}), 200
     if stderr:
         error_messages = stderr.split("\n")
         return jsonify({"stderr": error_messages}), 500
@@ -2165,7 +2261,7 @@ def report_raw_log_ufw(server_id):
         db.close()
         return jsonify({"message":"No data for server"}), 500
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
 
     result = server.connect()
     if not result:
@@ -2178,42 +2274,116 @@ def report_raw_log_ufw(server_id):
     file_name = server.get_file_name(execute_code_path)
     file_in_server = f"{script_directory}/{file_name}"
    
-    if not server.check_script_exists_on_remote(file_in_server):
-        server.upload_file_to_remote(execute_code_path, script_directory)
-        server.grant_permission(file_in_server, 700)
+    if not server.ensure_scripts_deployed(script_directory, ScriptManifest(db)):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Can not deploy scripts to server"}), 500
     db.close()
-    data_return, stderr = server.execute_script_in_remote_server(file_in_server)
-    server.disconnect()
-    if data_return:
-        local_file_path = os.environ.get("TMP_FOLDER")
-        local_file_path = os.path.join(local_file_path, server_id)
+    return stream_raw_log(server, file_in_server, os.environ.get("LOG_UFWLOG"))
 
-        try:
-            os.makedirs(local_file_path)
-        except OSError as e:
-            if "file already exists" in str(e):  # Check for file/folder existence in error message
-                print(f"Folder '{local_file_path}' already exists.")
-            else:
-                print(f"Error creating folder: {e}")
-        
-        filename = os.environ.get("LOG_UFWLOG")
-        local_file_path = os.path.join(local_file_path, filename)
-
-        with open(local_file_path, 'w', encoding="utf-8") as f:  # Open the file in write mode ('w')
-            if isinstance(data_return, str):  # Check if data is a single string
-                f.write(data_return)
-            else:  # Assume data is a list of strings
-                f.writelines(data_return)  # Write each line in the list
-
-        response = make_response(send_file(local_file_path, mimetype="application/octet-stream", as_attachment=True, download_name=filename))    
-        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
-        response.headers["Access-Control-Expose-Headers"] = "Content-Disposition"
-        
-        return response, 200
-    if stderr:
-        error_messages = stderr.split("\n")
-        return jsonify({"stderr": error_messages}), 500
-    return jsonify({"message": "Something is wrong"}), 404
+@server_bp.route("/logs/query/<server_id>", methods=["GET"])
+@token_required
+def query_logs(server_id):
+    db_env = LoadDBEnv.load_db_env()
+    db = connector.DBConnector(*db_env)
+    db.connect()
+    server_manager = Server(db)
+
+    username = request.jwt_payload.get("username")
+    if username is None:
+        db.close()
+        return jsonify({"message": "Permission denied"}), 403
+
+    if not server_manager.check_user_access(username, server_id):
+        db.close()
+        return jsonify({"message": "Permission denied"}), 403
+
+    kind = request.args.get("kind", "ufw")
+    if kind not in LOG_QUERY_SCRIPTS:
+        db.close()
+        return jsonify({"message": "kind must be ufw or lastlog"}), 400
+
+    # start and end are unix timestamps
+    start = request.args.get("start", type=float)
+    end = request.args.get("end", type=float)
+    port = request.args.get("port", type=int)
+    offset = request.args.get("offset", 0, type=int)
+    limit = request.args.get("limit", 100, type=int)
+    if offset < 0 or not 0 < limit <= 1000:
+        db.close()
+        return jsonify({"message": "offset must not be negative and limit must be between 1 and 1000"}), 400
+    if start is not None and end is not None and start > end:
+        db.close()
+        return jsonify({"message": "start must not be after end"}), 400
+
+    if request.args.get("refresh", "false").lower() == "true":
+        # Pull what was appended to the remote log since the last read before querying
+        error = refresh_log_index(server_manager, db, server_id, kind)
+        if error is not None:
+            return error
+    else:
+        db.close()
+
+    total, records = log_index.query(server_id, kind, start, end, request.args.get("ip"), port,
+                                     request.args.get("user"), request.args.get("action"), offset, limit)
+    return jsonify({"records": records, "total": total, "offset": offset, "limit": limit}), 200
+
+@server_bp.route("/logs/ufw_analytics/<server_id>", methods=["GET"])
+@token_required
+def ufw_analytics(server_id):
+    db_env = LoadDBEnv.load_db_env()
+    db = connector.DBConnector(*db_env)
+    db.connect()
+    server_manager = Server(db)
+
+    username = request.jwt_payload.get("username")
+    if username is None:
+        db.close()
+        return jsonify({"message": "Permission denied"}), 403
+
+    if not server_manager.check_user_access(username, server_id):
+        db.close()
+        return jsonify({"message": "Permission denied"}), 403
+
+    # start and end are unix timestamps, interval is the rate bucket in seconds
+    start = request.args.get("start", type=float)
+    end = request.args.get("end", type=float)
+    top = request.args.get("top", 10, type=int)
+    interval = request.args.get("interval", 60, type=int)
+    threshold = request.args.get("threshold", 3.0, type=float)
+    if not 0 < top <= 1000 or not 0 < interval <= 86400:
+        db.close()
+        return jsonify({"message": "top must be between 1 and 1000 and interval between 1 and 86400"}), 400
+    if start is not None and end is not None and start > end:
+        db.close()
+        return jsonify({"message": "start must not be after end"}), 400
+
+    if request.args.get("live", "false").lower() == "true":
+        # Analyse the end of the remote log file (its last LOG_TAIL_MAX_BYTES) instead of
+        # what the index holds; ufw.sh would only return the last 1000 lines
+        server, _, error = connect_log_server(server_manager, db, server_id, "ufw")
+        if error is not None:
+            return error
+        text = read_log_end(server, "ufw", tail_max_bytes)
+        server.disconnect()
+        if text is None:
+            return jsonify({"message": "Can not read log"}), 500
+        records, unparsed = parse_log_output("ufw", text)
+        segment = LogSegment.from_rows([ufw_row(record) for record in records])
+        events = UfwEvents.from_segments([segment]).select(start, end)
+    else:
+        if request.args.get("refresh", "false").lower() == "true":
+            error = refresh_log_index(server_manager, db, server_id, "ufw")
+            if error is not None:
+                return error
+        else:
+            db.close()
+        unparsed = 0
+        events = UfwEvents.from_segments(log_index.segments_between(server_id, "ufw", start, end)).select(start, end)
+
+    analytics = events.summary(top, interval, threshold)
+    analytics["unparsed"] = unparsed
+    return jsonify(analytics), 200
 
 @server_bp.route("/upload_file/<server_id>", methods=["POST"])
 @token_required
@@ -2231,26 +2401,34 @@ def upload_file(server_id):
     if dir == "undefined":
         return jsonify({"message": "File path is required"}), 400
     filename = uploaded_file.filename
+    normalize_newlines = request.form.get("normalize_newlines", "true") != "false"
+
+    return stream_upload_to_server(server_id, dir, filename, uploaded_file.stream, normalize_newlines)
 
+@server_bp.route("/upload_file_stream/<server_id>", methods=["POST", "PUT"])
+@token_required
+def upload_file_stream(server_id):
+    # Raw request body is the file content, so nothing is parsed into a spooled form file
+    filename = request.args.get("filename")
+    if not filename:
+        return jsonify({"message": "No selected file"}), 400
+    dir = request.args.get("dir", None)
+    if dir == None:
+        dir = os.environ.get("DEFAULT_FOLDER")
+    if dir == "undefined":
+        return jsonify({"message": "File path is required"}), 400
+    normalize_newlines = request.args.get("normalize_newlines", "true") != "false"
+
+    return stream_upload_to_server(server_id, dir, filename, request.stream, normalize_newlines)
+
+def stream_upload_to_server(server_id, dir, filename, stream, normalize_newlines):
     if dir[-1] != "/":
         dir = dir + "/"
-        
+
     db_env = LoadDBEnv.load_db_env()
     db = connector.DBConnector(*db_env)
     db.connect()
     server_manager = Server(db)
-    upload_folder_tmp = os.environ.get("TMP_FOLDER")
-    upload_folder_tmp = os.path.join(upload_folder_tmp, server_id)
-    
-    try:
-        os.makedirs(upload_folder_tmp)
-    except OSError as e:
-        if "file already exists" in str(e):  # Check for file/folder existence in error message
-            print(f"Folder '{upload_folder_tmp}' already exists.")
-        elif "File exists" in str(e):
-            print(f"Folder '{upload_folder_tmp}' already exists.")
-        else:
-            print(f"Error creating folder: {e}")
 
     if not server_id:
         db.close()
@@ -2271,29 +2449,220 @@ def upload_file(server_id):
         return jsonify({"message":"No data for server"}), 500
     
     filename = secure_filename(filename)
-    local_filepath = os.path.join(upload_folder_tmp, filename)
-    uploaded_file.save(local_filepath)
-
     remote_filepath = os.path.join(dir, filename)
    
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
     result = server.connect()
     if not result:
         db.close()
         return jsonify({"message": "Can not connect server"}), 500
 
-    if server.check_script_exists_on_remote(remote_filepath):
+    file_info = server.path_info(remote_filepath)
+    if file_info["error"]:
+        db.close()
+        server.disconnect()
+        return jsonify({"message": f"Can not check file on server: {file_info['error']}"}), 500
+    if file_info["exists"]:
+        db.close()
+        server.disconnect()
         return jsonify({"message":"File exists on server"}), 500
     db.close()
-    server.upload_file_to_remote(local_filepath, dir)
+
+    chunk_size = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+    server.create_remote_directory_if_not_exists(dir)
+    chunks = iter(lambda: stream.read(chunk_size), b"")
+    result = server.upload_stream_to_remote(chunks, remote_filepath, normalize_newlines, chunk_size)
     server.disconnect()
-    try:
-        os.remove(local_filepath)
-        print(f"Local file deleted: {local_filepath}")
+    if result:
         return jsonify({"message": "Upload file success"}), 200
-    except OSError as e:
-        print(f"Error deleting local file: {e}")
+    return jsonify({"message": "Upload file failed"}), 500
+
+@server_bp.route("/upload_session/<server_id>", methods=["POST"])
+@token_required
+def create_upload_session(server_id):
+    db_env = LoadDBEnv.load_db_env()
+    db = connector.DBConnector(*db_env)
+    db.connect()
+    server_manager = Server(db)
+
+    if not server_id:
+        db.close()
+        return jsonify({"message": "Server ID is required."}), 400
+
+    username = request.jwt_payload.get("username")
+    if username is None:
+        db.close()
+        return jsonify({"message": "Permission denied"}), 403
+
+    if not server_manager.check_user_access(username, server_id):
+        db.close()
+        return jsonify({"message": "Permission denied"}), 403
+
+    data = request.get_json()
+    filename = data.get("filename")
+    size = data.get("size")
+    sha256 = data.get("sha256")
+    dir = data.get("dir") or os.environ.get("DEFAULT_FOLDER")
+    if not filename:
+        db.close()
+        return jsonify({"message": "No selected file"}), 400
+    if not isinstance(size, int) or size < 0:
+        db.close()
+        return jsonify({"message": "File size is required"}), 400
+    if dir[-1] != "/":
+        dir = dir + "/"
+
+    server_info = server_manager.get_info_to_connect(server_id)
+    if server_info == None:
+        db.close()
+        return jsonify({"message":"No data for server"}), 500
+
+    remote_filepath = os.path.join(dir, secure_filename(filename))
+
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
+    result = server.connect()
+    if not result:
+        db.close()
+        return jsonify({"message": "Can not connect server"}), 500
+
+    file_info = server.path_info(remote_filepath)
+    if file_info["error"]:
+        db.close()
+        server.disconnect()
+        return jsonify({"message": f"Can not check file on server: {file_info['error']}"}), 500
+    if file_info["exists"]:
+        db.close()
+        server.disconnect()
+        return jsonify({"message":"File exists on server"}), 500
+    server.create_remote_directory_if_not_exists(dir)
+    server.disconnect()
+
+    transfer_id = secrets.token_urlsafe(16)
+    if not FileTransfer(db).create_transfer(transfer_id, server_id, username, remote_filepath, size, sha256):
+        db.close()
+        return jsonify({"message": "Can not create upload session"}), 500
+    db.close()
+
+    chunk_size = int(os.environ.get("UPLOAD_SESSION_CHUNK_SIZE", 64 * 1024 * 1024))
+    return jsonify({"transfer_id": transfer_id, "offset": 0, "chunk_size": chunk_size}), 201
+
+def load_upload_session(db, server_id, transfer_id):
+    username = request.jwt_payload.get("username")
+    if username is None:
+        return None, (jsonify({"message": "Permission denied"}), 403)
+
+    transfer = FileTransfer(db).get_transfer(transfer_id)
+    if transfer is None or transfer["server_id"] != server_id:
+        return None, (jsonify({"message": "Upload session not found"}), 404)
+    if transfer["username"] != username:
+        return None, (jsonify({"message": "Permission denied"}), 403)
+    return transfer, None
+
+@server_bp.route("/upload_session/<server_id>/<transfer_id>", methods=["GET"])
+@token_required
+def get_upload_session(server_id, transfer_id):
+    db_env = LoadDBEnv.load_db_env()
+    db = connector.DBConnector(*db_env)
+    db.connect()
+
+    transfer, error = load_upload_session(db, server_id, transfer_id)
+    db.close()
+    if error is not None:
+        return error
+    return jsonify(transfer), 200
+
+@server_bp.route("/upload_session/<server_id>/<transfer_id>", methods=["PUT"])
+@token_required
+def upload_session_chunk(server_id, transfer_id):
+    db_env = LoadDBEnv.load_db_env()
+    db = connector.DBConnector(*db_env)
+    db.connect()
+    server_manager = Server(db)
+    file_transfer = FileTransfer(db)
+
+    transfer, error = load_upload_session(db, server_id, transfer_id)
+    if error is not None:
+        db.close()
+        return error
+    if transfer["status"] != "uploading":
+        db.close()
+        return jsonify({"message": f"Upload session is {transfer['status']}"}), 409
+
+    # Content-Range: bytes <start>-<end>/<size>, or ?offset= for clients that cannot set it
+    content_range = parse_content_range_header(request.headers.get("Content-Range"))
+    try:
+        if content_range is not None:
+            offset = content_range.start
+        else:
+            offset = int(request.args.get("offset", 0))
+    except ValueError:
+        db.close()
+        return jsonify({"message": "Invalid offset"}), 400
+    if offset != transfer["offset"]:
+        db.close()
+        return jsonify({"message": "Offset mismatch", "offset": transfer["offset"]}), 409
+    if request.content_length is not None and offset + request.content_length > transfer["size"]:
+        db.close()
+        return jsonify({"message": "Chunk exceeds file size", "offset": offset}), 400
+
+    server_info = server_manager.get_info_to_connect(server_id)
+    db.close()
+    if server_info == None:
+        return jsonify({"message":"No data for server"}), 500
+
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
+    result = server.connect()
+    if not result:
+        return jsonify({"message": "Can not connect server"}), 500
+
+    part_path = f"{transfer['remote_path']}.part"
+    chunk_size = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+    chunks = iter(lambda: request.stream.read(chunk_size), b"")
+    try:
+        written, chunk_sha256 = server.write_remote_chunk(part_path, offset, chunks, chunk_size)
+    except Exception as e:
+        print(f"Error writing chunk: {e}")
+        server.truncate_remote_file(part_path, offset)
+        server.disconnect()
+        return jsonify({"message": "Upload chunk failed", "offset": offset}), 500
+
+    # The chunk only counts once the client's, our streamed and the server's sha256 agree
+    expected_sha256 = request.headers.get("X-Chunk-Sha256")
+    if offset + written > transfer["size"] or (expected_sha256 and expected_sha256.lower() != chunk_sha256) \
+            or server.remote_sha256(part_path, offset, written) != chunk_sha256:
+        server.truncate_remote_file(part_path, offset)
+        server.disconnect()
+        return jsonify({"message": "Chunk checksum mismatch", "offset": offset}), 400
+
+    new_offset = offset + written
+    db.connect()
+    if not file_transfer.advance_offset(transfer_id, offset, new_offset):
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "Offset mismatch"}), 409
+
+    if new_offset < transfer["size"]:
+        db.close()
+        server.disconnect()
+        return jsonify({"offset": new_offset, "sha256": chunk_sha256, "status": "uploading"}), 200
+
+    # Drop bytes an interrupted earlier attempt may have left past the end
+    server.truncate_remote_file(part_path, transfer["size"])
+    file_sha256 = server.remote_sha256(part_path)
+    if file_sha256 is None or (transfer["sha256"] and transfer["sha256"].lower() != file_sha256):
+        file_transfer.update_status(transfer_id, "failed")
+        db.close()
+        server.disconnect()
+        return jsonify({"message": "File checksum mismatch", "sha256": file_sha256}), 400
+
+    if not server.rename_remote_file(part_path, transfer["remote_path"]):
+        db.close()
+        server.disconnect()
         return jsonify({"message": "Upload file failed"}), 500
+    file_transfer.update_status(transfer_id, "completed")
+    db.close()
+    server.disconnect()
+    return jsonify({"offset": new_offset, "sha256": file_sha256, "status": "completed"}), 200
 
 @server_bp.route("/upload_folder/<server_id>", methods=["POST"])
 @token_required
@@ -2354,35 +2723,16 @@ def upload_folder(server_id):
     local_filepath = os.path.join(upload_folder_tmp, filename)
     uploaded_file.save(local_filepath)
     db.close()
-   
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
-    result = server.connect()
-    if not result:
-        db.close()
-        return jsonify({"message": "Can not connect server"}), 500
-
-    extracted_folder = os.path.splitext(filename)[0]
-    remote_filepath = os.path.join(dir, extracted_folder)
 
-    if server.check_script_exists_on_remote(remote_filepath):
-        return jsonify({"message":"Folder exists on server"}), 500
-    
-    with zipfile.ZipFile(local_filepath, "r") as zip_ref:
-        extract_path = os.path.join(os.path.dirname(local_filepath), extracted_folder)
-        os.makedirs(extract_path, exist_ok=True)
-        zip_ref.extractall(extract_path)
+    # mode=sync updates an existing folder, sending only the files that changed
+    sync = request.form.get("mode") == "sync"
 
-    server.upload_folder(extract_path, dir)
-    server.disconnect()
-    try:
+    # The job extracts, uploads and deletes the local copy
+    job_id = job_queue.submit(server_id, username, "upload_folder", upload_folder_job(server_info, server_id, local_filepath, dir, sync))
+    if job_id is None:
         os.remove(local_filepath)
-        print(f"Local file deleted: {local_filepath}")
-        shutil.rmtree(extract_path)
-        print(f"Local folder deleted: {extract_path}")
-        return jsonify({"message": "Upload file success"}), 200
-    except OSError as e:
-        print(f"Error deleting local file: {e}")
-        return jsonify({"message": "Upload file failed"}), 500
+        return jsonify({"message": "Job queue is full"}), 503
+    return jsonify({"message": "Job submitted", "job_id": job_id}), 202
     
 @server_bp.route("/download_file/<server_id>", methods=["GET"])
 @token_required
@@ -2411,7 +2761,7 @@ def download_file(server_id):
         return jsonify({"message":"No data for server"}), 500
     db.close()
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
     result = server.connect()
     if not result:
         db.close()
@@ -2424,43 +2774,80 @@ def download_file(server_id):
         return jsonify({"messsage": "File path is required"}), 500
     file_path = str(file_path)
    
-    if not server.check_script_exists_on_remote(file_path) :
+    path_info = server.path_info(file_path)
+    if path_info["error"]:
         db.close()
-        return jsonify({"messsage": "File path does not exist"}), 500
-    
-    status, type = server.check_file_type(file_path)
-    if not status:
+        server.disconnect()
+        return jsonify({"messsage": f"Can not check file path: {path_info['error']}"}), 500
+    if not path_info["exists"]:
         db.close()
-        return jsonify({"messsage": "Error in downloading file"}), 500
+        server.disconnect()
+        return jsonify({"messsage": "File path does not exist"}), 500
 
-    if type != "file":
+    if path_info["type"] != "file":
         db.close()
+        server.disconnect()
         return jsonify({"messsage": "Path must be file"}), 500
 
-    local_file_path = os.environ.get("TMP_FOLDER")
-    local_file_path = os.path.join(local_file_path, server_id)
-
-    try:
-        os.makedirs(local_file_path)
-    except OSError as e:
-        if "file already exists" in str(e):  # Check for file/folder existence in error message
-            print(f"Folder '{local_file_path}' already exists.")
-        elif "File exists" in str(e):
-            print(f"Folder '{local_file_path}' already exists.")
-        else:
-            print(f"Error creating folder: {e}")
-   
-    server.download_file_from_remote(file_path, local_file_path)
     filename = os.path.basename(file_path)
-    local_file_path = os.path.join(local_file_path, filename)
-
-    server.disconnect()
-    
-    response = make_response(send_file(local_file_path, mimetype="application/octet-stream", as_attachment=True, download_name=filename))    
+    size = path_info["size"]
+    etag = f"{size:x}-{int(path_info['mtime'] or 0):x}"
+    start, stop = 0, size
+    status_code = 200
+
+    # A Range is only honoured while the file is unchanged since the client's If-Range,
+    # which holds either our ETag or the exact Last-Modified date
+    mtime = int(path_info["mtime"] or 0)
+    byte_range = request.range
+    if_range = request.if_range
+    if byte_range is not None and if_range.etag is not None and if_range.etag != etag:
+        byte_range = None
+    if byte_range is not None and if_range.date is not None and int(if_range.date.timestamp()) != mtime:
+        byte_range = None
+    if byte_range is not None and len(byte_range.ranges) > 1:
+        # Multipart responses are not supported, the whole file is sent instead
+        byte_range = None
+    if byte_range is not None:
+        span = byte_range.range_for_length(size)
+        if span is None:
+            server.disconnect()
+            response = make_response("", 416)
+            response.headers["Content-Range"] = f"bytes */{size}"
+            return response
+        start, stop = span
+        status_code = 206
+
+    checksum = None
+    if request.args.get("checksum") == "true":
+        # sha256 of exactly the bytes in this response, hashed on the server
+        checksum = server.remote_sha256(file_path, start, stop - start) if status_code == 206 else server.remote_sha256(file_path)
+
+    def generate():
+        try:
+            yield from server.read_remote_range(file_path, start, stop)
+        except Exception as e:
+            # Re-raised so the response is cut off short of Content-Length and the client resumes
+            print(f"Error streaming file: {e}")
+            raise
+
+    response = Response(generate(), status=status_code, mimetype="application/octet-stream")
+    # Also runs when the body is never iterated
+    response.call_on_close(server.disconnect)
     response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
-    response.headers["Access-Control-Expose-Headers"] = "Content-Disposition"
-    
-    return response, 200
+    response.headers["Content-Length"] = str(stop - start)
+    response.headers["Accept-Ranges"] = "bytes"
+    response.set_etag(etag)
+    if mtime:
+        response.last_modified = mtime
+    expose_headers = ["Content-Disposition", "Content-Range", "Accept-Ranges", "ETag", "Last-Modified"]
+    if status_code == 206:
+        response.headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+    if checksum is not None:
+        response.headers["X-Checksum-Sha256"] = checksum
+        expose_headers.append("X-Checksum-Sha256")
+    response.headers["Access-Control-Expose-Headers"] = ", ".join(expose_headers)
+    
+    return response
 
 @server_bp.route("/download_folder/<server_id>", methods=["GET"])
 @token_required
@@ -2489,7 +2876,7 @@ def download_folder(server_id):
         return jsonify({"message":"No data for server"}), 500
     db.close()
 
-    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"])
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
     result = server.connect()
     if not result:
         db.close()
@@ -2502,42 +2889,38 @@ def download_folder(server_id):
         return jsonify({"messsage": "Folder path is required"}), 500
     folder_path = str(folder_path)
    
-    if not server.check_script_exists_on_remote(folder_path) :
+    path_info = server.path_info(folder_path)
+    if path_info["error"]:
         db.close()
-        return jsonify({"messsage": "Folder path does not exist"}), 500
-    
-    status, type = server.check_file_type(folder_path)
-    if not status:
+        server.disconnect()
+        return jsonify({"messsage": f"Can not check folder path: {path_info['error']}"}), 500
+    if not path_info["exists"]:
         db.close()
-        return jsonify({"messsage": "Error in downloading file"}), 500
+        server.disconnect()
+        return jsonify({"messsage": "Folder path does not exist"}), 500
 
-    if type != "directory":
+    if path_info["type"] != "directory":
         db.close()
+        server.disconnect()
         return jsonify({"messsage": "Path must be folder"}), 500
     
-    local_folder_path = os.environ.get("TMP_FOLDER")
-    local_folder_path = os.path.join(local_folder_path, server_id)
-
-    try:
-        os.makedirs(local_folder_path)
-    except OSError as e:
-        if "file already exists" in str(e):  # Check for file/folder existence in error message
-            print(f"Folder '{local_folder_path}' already exists.")
-        elif "File exists" in str(e):
-            print(f"Folder '{local_folder_path}' already exists.")
-        else:
-            print(f"Error creating folder: {e}")
-   
-    server.download_folder(folder_path, local_folder_path)
     filename = os.path.basename(folder_path)
-    filename_zip = f"{filename}.zip"
-    local_folder_path = os.path.join(local_folder_path, filename_zip)
 
-    server.disconnect()
-    
-    response = make_response(send_file(local_folder_path, mimetype="application/zip", as_attachment=True, download_name=filename_zip))    
+    def generate():
+        # The archive is built while the remote files are read
+        try:
+            yield from server.stream_folder_as_zip(folder_path)
+        except Exception as e:
+            # Re-raised so the chunked response is cut off instead of ending like a complete archive
+            print(f"Error streaming folder: {e}")
+            raise
+
+    response = Response(generate(), mimetype="application/zip")
+    # Also runs when the body is never iterated
+    response.call_on_close(server.disconnect)
     response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
     response.headers["Access-Control-Expose-Headers"] = "Content-Disposition"
+    response.headers["X-Accel-Buffering"] = "no"
     
     return response, 200
 
@@ -2580,6 +2963,109 @@ def confirm_download(server_id):
         os.remove(local_file_path)
         print(f"Local file deleted: {local_file_path}")
         return jsonify({"message": "Upload file success"}), 200
+    except FileNotFoundError:
+        # Folder downloads are streamed and leave nothing behind to clean up
+        return jsonify({"message": "Upload file success"}), 200
     except OSError as e:
         print(f"Error deleting local file: {e}")
-        return jsonify({"message": "Upload file failed"}), 500
\ No newline at end of file
+        return jsonify({"message": "Upload file failed"}), 500
+
+@server_bp.route("/jobs/<job_id>", methods=["GET"])
+@token_required
+def get_job(job_id):
+    db_env = LoadDBEnv.load_db_env()
+    db = connector.DBConnector(*db_env)
+    db.connect()
+    server_manager = Server(db)
+
+    username = request.jwt_payload.get("username")
+    if username is None:
+        db.close()
+        return jsonify({"message": "Permission denied"}), 403
+
+    job = ServerJob(db).get_job(job_id)
+    if job is None:
+        db.close()
+        return jsonify({"message": "Job not found"}), 404
+
+    if job["username"] != username and not server_manager.check_user_access(username, job["server_id"]):
+        db.close()
+        return jsonify({"message": "Permission denied"}), 403
+
+    db.close()
+    return jsonify(job), 200
+
+@server_bp.route("/batch/<action>", methods=["POST"])
+@token_required
+def batch_action(action):
+    if action not in BATCH_ACTIONS:
+        return jsonify({"message": "Unsupported action"}), 400
+
+    db_env = LoadDBEnv.load_db_env()
+    db = connector.DBConnector(*db_env)
+    db.connect()
+    server_manager = Server(db)
+    org = Organization(db)
+
+    username = request.jwt_payload.get("username")
+    if username is None:
+        db.close()
+        return jsonify({"message": "Permission denied"}), 403
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        db.close()
+        return jsonify({"message": "Invalid request body"}), 400
+    server_ids = data.get("server_ids")
+    organization_id = data.get("organization_id")
+    arg = data.get("arg")
+    try:
+        timeout = float(data.get("timeout", os.environ.get("BATCH_SERVER_TIMEOUT", 60)))
+    except (TypeError, ValueError):
+        timeout = None
+    if timeout is None or not 0 < timeout <= 3600:
+        db.close()
+        return jsonify({"message": "timeout must be a number of seconds between 0 and 3600"}), 400
+
+    env_name, args, requires_arg = BATCH_ACTIONS[action]
+    if requires_arg:
+        if not arg:
+            db.close()
+            return jsonify({"message": "Argument required"}), 400
+        args = args + [shlex.quote(str(arg))]
+
+    if organization_id:
+        if not org.check_user_access(username, organization_id):
+            db.close()
+            return jsonify({"message": "Permission denied"}), 403
+        servers_in_organization = server_manager.get_server_in_organization(organization_id) or []
+        server_ids = [server["server_id"] for server in servers_in_organization if server["status"] == const.STATUS_ACTIVE]
+
+    if not server_ids:
+        db.close()
+        return jsonify({"message": "Server IDs or organization ID is required"}), 400
+
+    skipped = []
+    targets = []
+    for server_id in dict.fromkeys(server_ids):
+        if not server_manager.check_user_access(username, server_id):
+            skipped.append({"server_id": server_id, "hostname": None, "status": "denied", "message": "Permission denied"})
+            continue
+        server_info = server_manager.get_info_to_connect(server_id)
+        if server_info is None:
+            skipped.append({"server_id": server_id, "hostname": None, "status": "error", "message": "No data for server"})
+            continue
+        targets.append(server_info)
+    db.close()
+
+    script_path = os.environ.get(env_name)
+    script_directory = os.environ.get("SERVER_DIRECTORY")
+
+    def generate():
+        # One JSON document per line, in completion order
+        for result in skipped:
+            yield json.dumps(result) + "\n"
+        for result in run_batch(targets, script_path, args, script_directory, timeout=timeout):
+            yield json.dumps(result) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson"), 200
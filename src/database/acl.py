@@ -0,0 +1,128 @@
+import os
+import select
+import threading
+import time
+import psycopg2
+import psycopg2.extensions
+from . import connector
+from .load_env import LoadDBEnv
+from ..cache import TTLCache
+
+# Payload of a NOTIFY that drops every user's entries
+ALL_USERS = "*"
+
+class AclIndex:
+    """
+    In-memory index of username -> {server_id: roles} and username -> {organization_id},
+    loaded lazily per user. Member mutations call changed(), which drops the user's
+    entries here and, through Postgres NOTIFY, in every other API process.
+    """
+    def __init__(self, max_size: int = 4096, ttl: float = 300, channel: str = "acl_changed", listen: bool = True):
+        # The TTL only bounds staleness when a notification is missed
+        self.servers = TTLCache(max_size=max_size, ttl=ttl)
+        self.organizations = TTLCache(max_size=max_size, ttl=ttl)
+        self.channel = channel
+        self.listen = listen
+        self.invalidations = 0
+        self.listener = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def server_roles(self, username: str, server_id: str, load):
+        """
+        Roles of username on server_id, or None without access. load() returns the
+        user's {server_id: roles} and is only called on a miss.
+        """
+        servers = self._get(self.servers, username, load)
+        return None if servers is None else servers.get(server_id)
+
+    def has_server_access(self, username: str, server_id: str, load) -> bool:
+        return self.server_roles(username, server_id, load) is not None
+
+    def has_organization_access(self, username: str, organization_id: str, load) -> bool:
+        organizations = self._get(self.organizations, username, load)
+        return organizations is not None and organization_id in organizations
+
+    def _get(self, cache: TTLCache, username: str, load):
+        self.ensure_listening()
+        value = cache.get(username)
+        if value is not None:
+            return value
+        generation = self._generation
+        value = load()
+        if value is None:
+            return None
+        with self._lock:
+            # An invalidation that raced with the load may have made value stale
+            if generation == self._generation:
+                cache.set(username, value)
+        return value
+
+    def invalidate(self, username: str = None):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if username is None or username == ALL_USERS:
+                self.servers.clear()
+                self.organizations.clear()
+            else:
+                self.servers.pop(username)
+                self.organizations.pop(username)
+
+    def changed(self, db: connector.DBConnector, username: str = None):
+        """
+        Membership of username changed (or of everyone when username is None): drop
+        the local entries and tell the other processes.
+        """
+        self.invalidate(username)
+        if self.listen:
+            db.execute_transaction([("SELECT pg_notify(%s, %s)", (self.channel, username or ALL_USERS))])
+
+    def ensure_listening(self):
+        if not self.listen:
+            return
+        with self._lock:
+            if self.listener is None or not self.listener.is_alive():
+                self.listener = threading.Thread(target=self._listen, name="acl-listener", daemon=True)
+                self.listener.start()
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                dbname, user, password, host, port = LoadDBEnv.load_db_env()
+                conn = psycopg2.connect(dbname=dbname, user=user, password=password, host=host, port=port)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {self.channel}")
+                # Changes made while the listener was down are unknown
+                self.invalidate()
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.invalidate(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print("ACL listener error:", e)
+                self.invalidate()
+            finally:
+                if conn is not None:
+                    conn.close()
+            time.sleep(5)
+
+    def stats(self) -> dict:
+        servers = self.servers.stats()
+        organizations = self.organizations.stats()
+        return {
+            "users": servers["size"],
+            "hits": servers["hits"] + organizations["hits"],
+            "misses": servers["misses"] + organizations["misses"],
+            "invalidations": self.invalidations
+        }
+
+acl_enabled = os.environ.get("ACL_CACHE_ENABLED", "true").lower() == "true"
+acl_index = AclIndex(max_size=int(os.environ.get("ACL_CACHE_SIZE", 4096)),
+                     ttl=float(os.environ.get("ACL_CACHE_TTL", 300)),
+                     channel=os.environ.get("ACL_NOTIFY_CHANNEL", "acl_changed"),
+                     listen=os.environ.get("ACL_NOTIFY_ENABLED", "true").lower() == "true")
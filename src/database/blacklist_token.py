@@ -1,35 +1,169 @@
 from datetime import datetime, timedelta, timezone
+import hashlib
+import math
+import os
+import threading
+import time
 from . import connector
 
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing over one SHA-256 digest gives hash_count independent positions
+        digest = hashlib.sha256(item.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class BlacklistCache:
+    """
+    Process-local Bloom filter over tbl_blacklisttoken. A miss proves the token is not
+    blacklisted; a hit still has to be confirmed by the exact database check.
+    """
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001,
+                 refresh_interval: float = 5, rebuild_interval: float = 3600, overlap: float = 60) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        # Re-read rows this far behind the cursor to catch late commits and clock skew
+        self.overlap = timedelta(seconds=overlap)
+        self.filter = None
+        self.cursor = None
+        self.count = 0
+        self.last_refresh = 0
+        self.last_rebuild = 0
+        self._lock = threading.Lock()
+
+    def might_contain(self, token: str, load_rows) -> bool:
+        self.refresh(load_rows)
+        bloom = self.filter
+        if bloom is None:
+            # Never loaded, so nothing can be ruled out
+            return True
+        return token in bloom
+
+    def add(self, token: str) -> None:
+        bloom = self.filter
+        if bloom is not None:
+            bloom.add(token)
+            self.count += 1
+
+    def refresh(self, load_rows) -> None:
+        now = time.monotonic()
+        if self.filter is not None and now - self.last_refresh < self.refresh_interval:
+            return
+        if not self._lock.acquire(blocking=self.filter is None):
+            # Another request is already refreshing, keep answering from the current filter
+            return
+        try:
+            now = time.monotonic()
+            if self.filter is not None and now - self.last_refresh < self.refresh_interval:
+                return
+            rebuild = self.filter is None or self.cursor is None \
+                or now - self.last_rebuild >= self.rebuild_interval or self.count > self.capacity
+            since = None if rebuild else self.cursor - self.overlap
+            rows = load_rows(since)
+            if rows is None:
+                return
+
+            if rebuild:
+                # Full reload also forgets tokens that remove_expired_tokens deleted
+                self.capacity = max(self.capacity, len(rows) * 2)
+                bloom = BloomFilter(self.capacity, self.error_rate)
+                previous_cursor = None
+                self.count = 0
+            else:
+                bloom = self.filter
+                previous_cursor = self.cursor
+            cursor = previous_cursor
+            for token, timestamp in rows:
+                bloom.add(token)
+                if previous_cursor is None or timestamp is None or timestamp > previous_cursor:
+                    self.count += 1
+                if timestamp is not None and (cursor is None or timestamp > cursor):
+                    cursor = timestamp
+            self.cursor = cursor
+            self.filter = bloom
+            self.last_refresh = now
+            if rebuild:
+                self.last_rebuild = now
+        finally:
+            self._lock.release()
+
+blacklist_cache = BlacklistCache(
+    capacity=int(os.environ.get("BLACKLIST_BLOOM_CAPACITY", 100000)),
+    error_rate=float(os.environ.get("BLACKLIST_BLOOM_ERROR_RATE", 0.001)),
+    refresh_interval=float(os.environ.get("BLACKLIST_REFRESH_INTERVAL", 5)),
+    rebuild_interval=float(os.environ.get("BLACKLIST_REBUILD_INTERVAL", 3600))
+)
+
 class BlackListToken:
     def __init__(self, db: connector.DBConnector) -> None:
         self.db = db
 
+    def _ensure_connected(self) -> None:
+        # token_required hands over an unopened connector, only open it when Postgres is needed
+        if self.db.conn is None:
+            self.db.connect()
+
     def add_to_blacklist(self, token: str) -> None:
         current_time = datetime.utcnow()
         query = "INSERT INTO tbl_blacklisttoken (token, timestamp) VALUES (%s, %s)"
         values = (token, current_time)
         try:
+            self._ensure_connected()
             self.db.execute_query(query, values)
+            blacklist_cache.add(token)
             return "Token added to blacklist.", 200
         except Exception as e:
             return "Error adding token to blacklist:{e}", 500
 
     def is_token_blacklisted(self, token: str) -> bool:
+        if not blacklist_cache.might_contain(token, self.load_blacklist):
+            return False
         query = "SELECT COUNT(*) FROM tbl_blacklisttoken WHERE token = %s"
         values = (token,)
         try:
+            self._ensure_connected()
             result = self.db.execute_query(query, values)
             return result[0][0] > 0
         except Exception as e:
             print("Error checking token existence in blacklist:", e)
             return False
-        
+
+    def load_blacklist(self, since: datetime = None):
+        if since is None:
+            query = "SELECT token, timestamp FROM tbl_blacklisttoken"
+            values = None
+        else:
+            query = "SELECT token, timestamp FROM tbl_blacklisttoken WHERE timestamp >= %s"
+            values = (since,)
+        try:
+            self._ensure_connected()
+            return self.db.execute_query(query, values)
+        except Exception as e:
+            print("Error loading token blacklist:", e)
+            return None
+
     def remove_expired_tokens(self) -> None:
         two_hours_ago = datetime.now(timezone.utc) - timedelta(hours=2)
         query = "DELETE FROM tbl_blacklisttoken WHERE timestamp <= %s"
         values = (two_hours_ago,)
         try:
+            self._ensure_connected()
             self.db.execute_query(query, values)
             return "Expired tokens removed from the blacklist.", 200
         except Exception as e:
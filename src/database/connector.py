@@ -1,16 +1,192 @@
 import psycopg2
+import psycopg2.pool
+import re
+import threading
+import time
+from .load_env import LoadDBEnv
+
+# Statements that write even when they return rows (INSERT ... RETURNING)
+WRITE_STATEMENT_PATTERN = re.compile(r"\s*(insert|update|delete|alter)\b", re.IGNORECASE)
+
+class DBConnectionPool:
+    def __init__(self, dbname: str = None, user: str = None, password: str = None, host: str = None, port: int = None,
+                 min_size: int = 1, max_size: int = 10, timeout: float = 10, idle_timeout: float = 300,
+                 health_check_after: float = 30):
+        self.connect_kwargs = {
+            "dbname": dbname,
+            "user": user,
+            "password": password,
+            "host": host,
+            "port": port
+        }
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        # Idle connections as (connection, last_used) pairs, most recently used at the end
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def fill(self):
+        # Open connections up to min_size so the first requests skip the handshake
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._new_connection()
+            except psycopg2.Error as e:
+                self._discard(None)
+                print("Error filling the connection pool:", e)
+                return
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn = None
+            with self._cond:
+                self._reap_idle()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise psycopg2.pool.PoolError("Timed out waiting for a database connection")
+                    self._cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    return self._new_connection()
+                except psycopg2.Error:
+                    self._discard(None)
+                    raise
+
+            if self._is_healthy(conn, last_used):
+                return conn
+            self._discard(conn)
+
+    def putconn(self, conn):
+        if conn is None:
+            return
+        if conn.closed:
+            self._discard(None)
+            return
+        try:
+            # Drop any open or aborted transaction left behind by the borrower
+            conn.rollback()
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._reap_idle()
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            idle = self._idle
+            self._idle = []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def _new_connection(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        print("Connected to the database")
+        return conn
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            print("Discarding broken pooled connection:", e)
+            return False
+
+    def _reap_idle(self):
+        # Caller holds self._cond. Close the oldest idle connections above min_size.
+        if self.idle_timeout is None:
+            return
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size:
+            conn, last_used = self._idle[0]
+            if now - last_used < self.idle_timeout:
+                break
+            self._idle.pop(0)
+            self._size -= 1
+            self._close_quietly(conn)
+
+    def _discard(self, conn):
+        if conn is not None:
+            self._close_quietly(conn)
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(dbname: str = None, user: str = None, password: str = None, host: str = None, port: int = None) -> DBConnectionPool:
+    # One pool per database target, shared by every DBConnector in the process
+    key = (dbname, user, host, port)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            min_size, max_size, timeout, idle_timeout = LoadDBEnv.load_db_pool_env()
+            pool = DBConnectionPool(dbname, user, password, host, port,
+                                    min_size=min_size, max_size=max_size,
+                                    timeout=timeout, idle_timeout=idle_timeout)
+            _pools[key] = pool
+            created = True
+        else:
+            created = False
+    if created:
+        pool.fill()
+    return pool
 
 class DBConnector:
-    def __init__(self, dbname: str = None, user: str = None, password: str = None, host: str = None, port: int = None):
+    def __init__(self, dbname: str = None, user: str = None, password: str = None, host: str = None, port: int = None, pooled: bool = None):
         self.dbname = dbname
         self.user = user
         self.password = password
         self.host = host
         self.port = port
         self.conn = None
+        if pooled is None:
+            pooled = LoadDBEnv.load_db_pool_enabled()
+        self.pooled = pooled
+        self.pool = None
 
     def connect(self):
         try:
+            if self.pooled:
+                # Borrow a live connection from the shared process-wide pool
+                self.pool = get_pool(self.dbname, self.user, self.password, self.host, self.port)
+                self.conn = self.pool.getconn()
+                return
             # Connect to the PostgreSQL database
             self.conn = psycopg2.connect(
                 dbname=self.dbname,
@@ -24,16 +200,27 @@ class DBConnector:
             print("Error connecting to the database:", e)
 
     def close(self):
-        # Close the database connection.
+        # Close the database connection, or hand it back to the pool.
         if self.conn is not None:
+            if self.pool is not None:
+                conn = self.conn
+                self.conn = None
+                self.pool.putconn(conn)
+                return
             self.conn.close()
             print("Connection closed")
 
+    def __del__(self):
+        # Routes that return early without close() must not leak pooled connections
+        if self.pool is not None and self.conn is not None:
+            self.close()
+
     def execute_query(self, query, params=None):
         """
         Execute a query with optional parameters and return the result.
         """
         result = None
+        cursor = None
         try:
             # Create a cursor object
             cursor = self.conn.cursor()
@@ -44,13 +231,12 @@ class DBConnector:
             else:
                 cursor.execute(query)
             
+            # Fetch the result whenever the statement returned rows, whatever the query text mentions
+            if cursor.description is not None:
+                result = cursor.fetchall()
             # Commit the transaction for insert/update/delete/alter operations
-            query_lower = query.strip().lower()
-            if any(keyword in query_lower for keyword in ["insert", "update", "delete", "alter"]):
+            if cursor.description is None or WRITE_STATEMENT_PATTERN.match(query):
                 self.conn.commit()
-            else:
-                # Fetch the result if it's a select operation
-                result = cursor.fetchall()
         except psycopg2.Error as e:
             print("Error executing query:", e)
         finally:
@@ -58,3 +244,23 @@ class DBConnector:
             if cursor:
                 cursor.close()
         return result
+
+    def execute_transaction(self, queries) -> bool:
+        """
+        Execute (query, params) pairs in one transaction. Returns False and rolls
+        everything back if any of them fails.
+        """
+        cursor = None
+        try:
+            cursor = self.conn.cursor()
+            for query, params in queries:
+                cursor.execute(query, params)
+            self.conn.commit()
+            return True
+        except psycopg2.Error as e:
+            print("Error executing transaction:", e)
+            self.conn.rollback()
+            return False
+        finally:
+            if cursor:
+                cursor.close()
@@ -0,0 +1,76 @@
+from datetime import datetime
+from . import connector
+
+class FileTransfer:
+    def __init__(self, db: connector.DBConnector) -> None:
+        self.db = db
+
+    def create_transfer(self, transfer_id: str, server_id: str, username: str, remote_path: str, size: int, sha256: str = None) -> bool:
+        query = """
+            INSERT INTO tbl_file_transfer (transfer_id, server_id, username, remote_path, size, transferred, sha256, status, created_at, modified_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        now = datetime.now()
+        values = (transfer_id, server_id, username, remote_path, size, 0, sha256, "uploading", now, now)
+
+        try:
+            self.db.execute_query(query, values)
+            return True
+        except Exception as e:
+            print("Error creating file transfer:", e)
+            return False
+
+    def get_transfer(self, transfer_id: str):
+        query = """
+            SELECT transfer_id, server_id, username, remote_path, size, transferred, sha256, status, created_at, modified_at
+            FROM tbl_file_transfer WHERE transfer_id = %s
+        """
+        values = (transfer_id,)
+
+        try:
+            result = self.db.execute_query(query, values)
+            if not result:
+                return None
+            row = result[0]
+            return {
+                "transfer_id": row[0],
+                "server_id": row[1],
+                "username": row[2],
+                "remote_path": row[3],
+                "size": row[4],
+                "offset": row[5],
+                "sha256": row[6],
+                "status": row[7],
+                "created_at": row[8],
+                "modified_at": row[9]
+            }
+        except Exception as e:
+            print("Error getting file transfer:", e)
+            return None
+
+    def advance_offset(self, transfer_id: str, expected_offset: int, new_offset: int) -> bool:
+        # Only moves forward from the offset the chunk was written at, a stale chunk leaves the row untouched
+        query = """
+            UPDATE tbl_file_transfer SET transferred = %s, modified_at = %s
+            WHERE transfer_id = %s AND transferred = %s
+        """
+        values = (new_offset, datetime.now(), transfer_id, expected_offset)
+
+        try:
+            self.db.execute_query(query, values)
+            result = self.db.execute_query("SELECT transferred FROM tbl_file_transfer WHERE transfer_id = %s", (transfer_id,))
+            return bool(result) and result[0][0] == new_offset
+        except Exception as e:
+            print("Error updating file transfer offset:", e)
+            return False
+
+    def update_status(self, transfer_id: str, status: str) -> bool:
+        query = """UPDATE tbl_file_transfer SET status = %s, modified_at = %s WHERE transfer_id = %s"""
+        values = (status, datetime.now(), transfer_id)
+
+        try:
+            self.db.execute_query(query, values)
+            return True
+        except Exception as e:
+            print("Error updating file transfer status:", e)
+            return False
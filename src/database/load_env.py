@@ -14,3 +14,15 @@ class LoadDBEnv():
 
         return db_env
 
+    def load_db_pool_enabled():
+        return os.environ.get("DATABASE_POOL_ENABLED", "true").lower() in ["true", "1", "yes"]
+
+    def load_db_pool_env():
+        pool_min_size = int(os.environ.get("DATABASE_POOL_MIN_SIZE", 1))
+        pool_max_size = int(os.environ.get("DATABASE_POOL_MAX_SIZE", 10))
+        pool_timeout = float(os.environ.get("DATABASE_POOL_TIMEOUT", 10))
+        pool_idle_timeout = float(os.environ.get("DATABASE_POOL_IDLE_TIMEOUT", 300))
+
+        pool_env = [pool_min_size, pool_max_size, pool_timeout, pool_idle_timeout]
+
+        return pool_env
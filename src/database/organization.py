@@ -1,5 +1,6 @@
 from ..const import const
-from . import connector
+from . import acl, connector
+from .server import forget_server_rows
 from ..models.organization import Organization as Org
 from ..models.auth import Auth 
 
@@ -44,6 +45,7 @@ class Organization:
         try:
             self.db.execute_query(query, values)
             print("Add organization successful!")
+            self.acl_changed(username)
             return True
         except Exception as e:
             print("Error adding organization:", e)
@@ -93,6 +95,8 @@ class Organization:
             print("Error querying organization:", e)
 
     def check_user_access(self, username: str, organization_id: str) -> bool:
+        if acl.acl_enabled:
+            return acl.acl_index.has_organization_access(username, organization_id, lambda: self.get_user_organization_ids(username))
         query = """ SELECT COUNT(*) FROM tbl_organization WHERE organization_id = %s AND  %s = ANY(org_member) """
         values = (organization_id, username,)
         try:
@@ -103,14 +107,31 @@ class Organization:
             print("Error checking user access:", e)
             return False
 
+    def get_user_organization_ids(self, username: str):
+        query = """SELECT organization_id FROM tbl_organization WHERE %s = ANY(org_member)"""
+        values = (username,)
+        try:
+            result = self.db.execute_query(query, values)
+            if result is None:
+                return None
+            return {row[0] for row in result}
+        except Exception as e:
+            print("Error getting user organizations:", e)
+            return None
+
+    def acl_changed(self, username: str = None) -> None:
+        if acl.acl_enabled:
+            acl.acl_index.changed(self.db, username)
+
     def change_organization_status(self, organization_id: str, status: str) -> bool:
         try:
             query = """UPDATE tbl_organization SET organization_status = %s WHERE organization_id = %s"""
             if status.upper() == const.STATUS_INACTIVE:
                 status = const.STATUS_INACTIVE
-                query_server = """UPDATE tbl_server SET status = %s WHERE organization_id = %s""" 
+                query_server = """UPDATE tbl_server SET status = %s WHERE organization_id = %s RETURNING server_id"""
                 value_server = (status, organization_id)
-                self.db.execute_query(query_server, value_server)
+                # Cached rows would keep the disabled servers reachable until they expire
+                forget_server_rows(row[0] for row in self.db.execute_query(query_server, value_server) or [])
             elif status.upper() == const.STATUS_ACTIVE:
                 status = const.STATUS_ACTIVE
             values = (status, organization_id)
@@ -155,6 +176,7 @@ class Organization:
                 update_query = "UPDATE tbl_organization SET org_member = %s WHERE organization_id = %s"
                 update_values = (current_member_list, organization_id)
                 self.db.execute_query(update_query, update_values)
+                self.acl_changed(new_user)
 
                 msg = "Users added to organization successfully!"
                 return True, msg
@@ -198,6 +220,7 @@ class Organization:
                 update_query = "UPDATE tbl_organization SET org_member = %s WHERE organization_id = %s"
                 update_values = (org_member_list, organization_id)
                 self.db.execute_query(update_query, update_values)
+                self.acl_changed(remove_username)
                 
                 msg = "User removed from organization successfully!"
                 return True, msg
@@ -331,9 +354,10 @@ class Organization:
         try:
             self.db.execute_query(query, (organization_id,))
             print("Organization deleted successfully!")
-            query_server = """DELETE FROM tbl_server WHERE organization_id = %s"""
-            self.db.execute_query(query_server, (organization_id,))
+            query_server = """DELETE FROM tbl_server WHERE organization_id = %s RETURNING server_id"""
+            forget_server_rows(row[0] for row in self.db.execute_query(query_server, (organization_id,)) or [])
             print("Server in organization deleted successfully!")
+            self.acl_changed()
             return True
         except Exception as e:
             print("Error deleting organization:", e)
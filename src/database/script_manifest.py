@@ -0,0 +1,47 @@
+from datetime import datetime
+import json
+from . import connector
+
+class ScriptManifest:
+    def __init__(self, db: connector.DBConnector) -> None:
+        self.db = db
+
+    def get_manifest(self, server_id: str, script_directory: str):
+        query = """SELECT manifest FROM tbl_server_script WHERE server_id = %s AND script_directory = %s"""
+        values = (server_id, script_directory,)
+
+        try:
+            result = self.db.execute_query(query, values)
+            if not result:
+                return None
+            return json.loads(result[0][0])
+        except Exception as e:
+            print("Error getting script manifest:", e)
+            return None
+
+    def save_manifest(self, server_id: str, script_directory: str, manifest: dict) -> bool:
+        query = """
+            INSERT INTO tbl_server_script (server_id, script_directory, manifest, deployed_at)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (server_id, script_directory)
+            DO UPDATE SET manifest = EXCLUDED.manifest, deployed_at = EXCLUDED.deployed_at
+        """
+        values = (server_id, script_directory, json.dumps(manifest), datetime.now())
+
+        try:
+            self.db.execute_query(query, values)
+            return True
+        except Exception as e:
+            print("Error saving script manifest:", e)
+            return False
+
+    def delete_manifest(self, server_id: str, script_directory: str) -> bool:
+        query = """DELETE FROM tbl_server_script WHERE server_id = %s AND script_directory = %s"""
+        values = (server_id, script_directory,)
+
+        try:
+            self.db.execute_query(query, values)
+            return True
+        except Exception as e:
+            print("Error deleting script manifest:", e)
+            return False
@@ -4,8 +4,11 @@ from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 import ast
+import hashlib
 import json
-from . import connector
+from . import acl, connector
+from .server_member import ServerMember
+from ..cache import TTLCache
 from ..const import const
 from ..models.server import Server as ServerModel
 from ..models.auth import Auth 
@@ -14,11 +17,64 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# PBKDF2 output per (passphrase, server_id salt); deriving a key costs ~100ms of CPU
+_derived_key_cache = TTLCache(max_size=int(os.environ.get("SERVER_KEY_CACHE_SIZE", 512)),
+                              ttl=float(os.environ.get("SERVER_KEY_CACHE_TTL", 3600)))
+# Decrypted password / rsa_key per server, stored next to the ciphertext they came from
+_credential_cache = TTLCache(max_size=int(os.environ.get("SERVER_KEY_CACHE_SIZE", 512)),
+                             ttl=float(os.environ.get("SERVER_CREDENTIAL_CACHE_TTL", 600)))
+# Full tbl_server rows shared across requests; every write through Server drops the row
+_server_row_cache = TTLCache(max_size=int(os.environ.get("SERVER_ROW_CACHE_SIZE", 1024)),
+                             ttl=float(os.environ.get("SERVER_ROW_CACHE_TTL", 5)))
+
+def forget_server_rows(server_ids) -> None:
+    # For writes to tbl_server made outside Server, e.g. by organization status changes
+    for server_id in server_ids:
+        _server_row_cache.pop(server_id)
+
+# "json" keeps members in the tbl_server.member array, "table" in tbl_server_member
+member_storage = os.environ.get("SERVER_MEMBER_STORAGE", "json").lower()
+
+SERVER_COLUMNS = ("server_id", "server_name", "hostname", "organization_id", "username", "password",
+                  "rsa_key", "authen_key_time", "status", "member", "port")
+
 class Server:
     def __init__(self, db: connector.DBConnector):
         self.db = db
         self.server = ServerModel()
         self.auth = Auth()
+        self.members = ServerMember(db) if member_storage == "table" else None
+        # Rows read during this request, a Server is created per request
+        self.rows = {}
+
+    def load_server_row(self, server_id: str, refresh: bool = False):
+        """
+        Return the full tbl_server row of server_id as a dict, or None if there is none.
+        The row is read once per Server instance and shared briefly across requests;
+        refresh forces a read from the database.
+        """
+        if not refresh:
+            row = self.rows.get(server_id)
+            if row is None:
+                row = _server_row_cache.get(server_id)
+            if row is not None:
+                self.rows[server_id] = row
+                return row
+
+        query = f"SELECT {', '.join(SERVER_COLUMNS)} FROM tbl_server WHERE server_id = %s"
+        result = self.db.execute_query(query, (server_id,))
+        if not result:
+            return None
+        row = dict(zip(SERVER_COLUMNS, result[0]))
+        row["member"] = tuple(row["member"] or ())
+        self.rows[server_id] = row
+        if _server_row_cache.ttl > 0:
+            _server_row_cache.set(server_id, row)
+        return row
+
+    def invalidate_server_row(self, server_id: str) -> None:
+        self.rows.pop(server_id, None)
+        _server_row_cache.pop(server_id)
 
     def add_server(self, user_create_server: str, server_name: str, hostname: str, organization_id: str,
                username: str, password: str, rsa_key: str, port: str) -> bool:
@@ -53,6 +109,9 @@ class Server:
         values = (str(server_id), server_name, str(hostname), str(organization_id), username, str(password), str(rsa_key), authen_key_time,status, server_member, port,)
         try:
             self.db.execute_query(query, values)
+            if self.members is not None:
+                self.members.add_member(server_id, user_create_server, [const.ROLE_ID_SUPER_USER])
+            self.acl_changed(user_create_server)
             return True
         except Exception as e:
             print("Error adding server:", e)
@@ -65,6 +124,8 @@ class Server:
         values = (str(encrypted_password_key), server_id)
         try:
             self.db.execute_query(query, values)
+            self.invalidate_server_row(server_id)
+            self.invalidate_credentials(server_id)
             new_authen_key_time = datetime.now() + timedelta(days=30)
             self.update_authen_key_time(server_id, new_authen_key_time)
             return True
@@ -79,6 +140,8 @@ class Server:
         values = (str(encrypted_rsa_key), server_id)
         try:
             self.db.execute_query(query, values)
+            self.invalidate_server_row(server_id)
+            self.invalidate_credentials(server_id)
             new_authen_key_time = datetime.now() + timedelta(days=30)
             self.update_authen_key_time(server_id, new_authen_key_time)
             return True
@@ -91,16 +154,15 @@ class Server:
         values = (new_authen_key_time, server_id)
         try:
             self.db.execute_query(query, values)
+            self.invalidate_server_row(server_id)
             return True
         except Exception as e:
             print("Error updating RSA key time:", e)
             return False
 
     def check_authen_key_time_due(self, server_id: str) -> bool:
-        query = "SELECT authen_key_time FROM tbl_server WHERE server_id = %s"
-        values = (server_id,)
         try:
-            authen_key_time_str = self.db.execute_query(query, values)[0][0]
+            authen_key_time_str = self.load_server_row(server_id)["authen_key_time"]
             authen_key_time = datetime.fromisoformat(authen_key_time_str)
             current_time = datetime.now()
             if current_time > authen_key_time:
@@ -116,6 +178,10 @@ class Server:
         values = (server_id,)
         try:
             self.db.execute_query(query, values)
+            self.invalidate_server_row(server_id)
+            self.invalidate_credentials(server_id)
+            _derived_key_cache.pop_matching(lambda key: key[1] == server_id.encode())
+            self.acl_changed()
             return True
         except Exception as e:
             print("Error deleting server:", e)
@@ -130,6 +196,7 @@ class Server:
         values = (server_name, hostname, username, server_id, port)
         try:
             self.db.execute_query(query, values)
+            self.invalidate_server_row(server_id)
             print("Server information updated successfully!")
             return True
         except Exception as e:
@@ -144,12 +211,17 @@ class Server:
             values = (const.STATUS_ACTIVE, server_id)
         try:
             self.db.execute_query(query, values)
+            self.invalidate_server_row(server_id)
             return True
         except Exception as e:
             print("Error updating status:", e)
             return False
 
     def derive_key(self, passphrase: bytes, salt: bytes) -> bytes:
+        cache_key = (hashlib.sha256(passphrase).digest(), salt)
+        key = _derived_key_cache.get(cache_key)
+        if key is not None:
+            return key
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
@@ -157,7 +229,9 @@ class Server:
             iterations=100000,
             backend=default_backend()
         )
-        return kdf.derive(passphrase)
+        key = kdf.derive(passphrase)
+        _derived_key_cache.set(cache_key, key)
+        return key
 
     def encrypt_rsa_key(self, passphrase: bytes, salt: bytes, rsa_key: str) -> bytes:
         nonce = os.environ.get("NONCE")
@@ -175,6 +249,20 @@ class Server:
         rsa_key_decrypted = decryptor.update(rsa_key_encrypted) + decryptor.finalize()
         return rsa_key_decrypted.decode()
 
+    def decrypt_credential(self, passphrase: str, server_id: str, field: str, value_from_db: str) -> str:
+        # Reuse the plaintext only while the stored ciphertext is unchanged
+        cached = _credential_cache.get((server_id, field))
+        if cached is not None and cached[0] == value_from_db:
+            return cached[1]
+        value_encrypted = ast.literal_eval(value_from_db)
+        value = self.decrypt_rsa_key(passphrase.encode(), server_id.encode(), value_encrypted)
+        _credential_cache.set((server_id, field), (value_from_db, value))
+        return value
+
+    def invalidate_credentials(self, server_id: str) -> None:
+        _credential_cache.pop((server_id, "password"))
+        _credential_cache.pop((server_id, "rsa_key"))
+
     def check_server_slot(self, organization_id: str):
         try:
             total_slot = self.get_total_slot(organization_id)
@@ -246,66 +334,49 @@ class Server:
             return None
 
     def get_rsa_key(self, server_id: str):
-        query = """SELECT rsa_key FROM tbl_server WHERE server_id = %s"""
-        values = (server_id,)
-
         try:
-            result = self.db.execute_query(query, values)
+            row = self.load_server_row(server_id)
             print("Query server successful!")
-            if len(result) == 0:
+            if row is None:
                 return None
-            server_info = result[0]
             passphrase = os.environ.get("RSA_PASSPHRASE")
 
-            return self.decrypt_rsa_key(passphrase.encode(), server_id.encode(), server_info[0])
+            return self.decrypt_rsa_key(passphrase.encode(), server_id.encode(), row["rsa_key"])
         except Exception as e:
             print("Error querying server:", e)
 
     def get_server_data(self, server_id: str):
-        query = """SELECT server_id, server_name, hostname, organization_id, username, password, rsa_key, authen_key_time, status, member, port FROM tbl_server WHERE server_id = %s"""
-        values = (server_id,)
-
         try:
-            result = self.db.execute_query(query, values)
+            row = self.load_server_row(server_id)
             print("Query server successful!")
-            if len(result) == 0:
+            if row is None:
                 return None
-            server_info = result[0]
-            
-            server = {
-                "server_id": server_info[0],
-                "server_name": server_info[1],
-                "hostname": server_info[2],
-                "organization_id": server_info[3],
-                "username": server_info[4],
-                "password": server_info[5],
-                "rsa_key": server_info[6],
-                "authen_key_time": server_info[7],
-                "status": server_info[8],
-                "member": server_info[9],
-                "port": server_info[10]
-            }
 
+            server = dict(row)
+            if self.members is not None:
+                # tbl_server.member is no longer written in table mode, serialize the rows the same way
+                member_list = self.members.get_members(server_id)
+                if member_list is None:
+                    return None
+                server["member"] = [json.dumps(member) for member in member_list]
+            else:
+                server["member"] = list(row["member"])
             return server
         except Exception as e:
             print("Error querying server:", e)
 
     def get_server_by_id(self, server_id: str):
-        query = """SELECT server_name, status, hostname FROM tbl_server WHERE server_id = %s"""
-        values = (server_id,)
-
         try:
-            result = self.db.execute_query(query, values)
+            row = self.load_server_row(server_id)
             print("Query server successful!")
-            if len(result) == 0:
+            if row is None:
                 return None
-            server_info = result[0]
             
             server = {
                 "server_id": server_id,
-                "server_name": server_info[0],
-                "status": server_info[1],
-                "hostname": server_info[2]
+                "server_name": row["server_name"],
+                "status": row["status"],
+                "hostname": row["hostname"]
             }
                 
             return server
@@ -341,6 +412,16 @@ class Server:
             print("Error getting server number:", e)
             return None
     
+    def get_active_server_ids(self):
+        query = "SELECT server_id FROM tbl_server WHERE status = %s"
+        values = (const.STATUS_ACTIVE,)
+        try:
+            result = self.db.execute_query(query, values)
+            return [row[0] for row in result]
+        except Exception as e:
+            print("Error getting active servers:", e)
+            return None
+
     def check_server_name_exist(self, name: str, organization_id: str) -> bool:
         query = "SELECT COUNT(*) FROM tbl_server WHERE server_name = %s AND organization_id = %s"
         values = (name, organization_id,)
@@ -352,16 +433,18 @@ class Server:
             return False
 
     def check_user_access(self, username: str, server_id: str) -> bool:
+        if acl.acl_enabled:
+            return acl.acl_index.has_server_access(username, server_id, lambda: self.get_user_servers(username))
+        if self.members is not None:
+            return self.members.has_member(server_id, username)
         try:
             # Fetch the server's member list
-            select_query = "SELECT member FROM tbl_server WHERE server_id = %s"
-            select_values = (server_id,)
-            current_members = self.db.execute_query(select_query, select_values)
+            row = self.load_server_row(server_id)
 
-            if not current_members:
+            if row is None:
                 return False
             
-            member_data = current_members[0][0]
+            member_data = row["member"]
 
             current_member_list = [json.loads(member) for member in member_data]
 
@@ -374,18 +457,49 @@ class Server:
             print("Error checking user access:", e)
             return False
 
+    def get_user_servers(self, username: str):
+        """
+        {server_id: role ids} of every server username is a member of, or None on error.
+        """
+        if self.members is not None:
+            return self.members.get_user_servers(username)
+        query = """
+            SELECT server_id, m.value FROM tbl_server
+            CROSS JOIN LATERAL unnest(member) AS m(value)
+            WHERE m.value::json->>'member' = %s
+        """
+        values = (username,)
+        try:
+            result = self.db.execute_query(query, values)
+            if result is None:
+                return None
+            return {server_id: json.loads(member)["role"] for server_id, member in result}
+        except Exception as e:
+            print("Error getting user servers:", e)
+            return None
+
+    def acl_changed(self, username: str = None) -> None:
+        if acl.acl_enabled:
+            acl.acl_index.changed(self.db, username)
+
     def add_member(self, server_id: str, new_user: str) -> bool:
+        success, msg = self._add_member(server_id, new_user)
+        if success:
+            self.acl_changed(new_user)
+        return success, msg
+
+    def _add_member(self, server_id: str, new_user: str) -> bool:
+        if self.members is not None:
+            return self.add_member_row(server_id, new_user)
         try:
-            # Fetch the server's member list
-            select_query = "SELECT member FROM tbl_server WHERE server_id = %s"
-            select_values = (server_id,)
-            current_members = self.db.execute_query(select_query, select_values)
+            # Read-modify-write, so start from the current row rather than a cached one
+            row = self.load_server_row(server_id, refresh=True)
 
-            if not current_members:
+            if row is None:
                 return False, f"Can not get information from table server"
 
             # Convert retrieved member list to Python list
-            member_data = current_members[0][0]
+            member_data = row["member"]
             current_member_list = [json.loads(member) for member in member_data]
 
             # Check if user already exists
@@ -407,6 +521,7 @@ class Server:
             update_query = "UPDATE tbl_server SET member = %s WHERE server_id = %s"
             update_values = (current_member_list, server_id)
             self.db.execute_query(update_query, update_values)
+            self.invalidate_server_row(server_id)
 
             return True, f"User '{new_user}' added to server successfully!"
 
@@ -414,17 +529,23 @@ class Server:
             return False, f"Error adding user to server: {e}"
 
     def remove_member(self, server_id: str, remove_username: str) -> bool:
+        success, msg = self._remove_member(server_id, remove_username)
+        if success:
+            self.acl_changed(remove_username)
+        return success, msg
+
+    def _remove_member(self, server_id: str, remove_username: str) -> bool:
+        if self.members is not None:
+            return self.remove_member_row(server_id, remove_username)
         try:
-            # Fetch the server's member list
-            select_query = "SELECT member FROM tbl_server WHERE server_id = %s"
-            select_values = (server_id,)
-            current_members = self.db.execute_query(select_query, select_values)
+            # Read-modify-write, so start from the current row rather than a cached one
+            row = self.load_server_row(server_id, refresh=True)
 
-            if not current_members:
+            if row is None:
                 # Server not found
                 return False, f"Can not get information from table server"
             
-            member_data = current_members[0][0]
+            member_data = row["member"]
             member_list = [json.loads(member) for member in member_data]
 
             # Check if user to be removed is the creator
@@ -448,6 +569,7 @@ class Server:
             update_query = "UPDATE tbl_server SET member = %s WHERE server_id = %s"
             update_values = (member_list, server_id)
             self.db.execute_query(update_query, update_values)
+            self.invalidate_server_row(server_id)
 
             return True, f"User '{remove_username}' removed from server successfully!"
 
@@ -455,17 +577,23 @@ class Server:
             return False, f"Error removing user from server: {e}"
         
     def update_member_roles(self, server_id: str, username: str, new_roles: list[str]) -> bool:
+        success, msg = self._update_member_roles(server_id, username, new_roles)
+        if success:
+            self.acl_changed(username)
+        return success, msg
+
+    def _update_member_roles(self, server_id: str, username: str, new_roles: list[str]) -> bool:
+        if self.members is not None:
+            return self.update_member_roles_row(server_id, username, new_roles)
         try:
-            # Fetch the server's member list
-            select_query = "SELECT member FROM tbl_server WHERE server_id = %s"
-            select_values = (server_id,)
-            current_members = self.db.execute_query(select_query, select_values)
+            # Read-modify-write, so start from the current row rather than a cached one
+            row = self.load_server_row(server_id, refresh=True)
 
-            if not current_members:
+            if row is None:
                 return False, f"Can not get information from table server"
 
             # Convert retrieved member list to Python list
-            member_data = current_members[0][0]
+            member_data = row["member"]
             member_list = [json.loads(member) for member in member_data]
 
             # Find the member to update
@@ -484,35 +612,64 @@ class Server:
             update_query = "UPDATE tbl_server SET member = %s WHERE server_id = %s"
             update_values = (member_list, server_id)
             self.db.execute_query(update_query, update_values)
+            self.invalidate_server_row(server_id)
 
             return True, f"Roles for user '{username}' updated successfully!"
 
         except Exception as e:
             return False, f"Error updating roles for user: {e}"
         
+    def add_member_row(self, server_id: str, new_user: str):
+        if self.load_server_row(server_id) is None:
+            return False, f"Can not get information from table server"
+        if self.members.has_member(server_id, new_user):
+            return False, f"User '{new_user}' already exists in the server."
+        if not self.members.add_member(server_id, new_user, [const.ROLE_ID_USER]):
+            return False, f"Error adding user to server"
+        return True, f"User '{new_user}' added to server successfully!"
+
+    def remove_member_row(self, server_id: str, remove_username: str):
+        member_list = self.members.get_members(server_id)
+        if not member_list:
+            return False, f"Can not get information from table server"
+
+        # Check if user to be removed is the creator
+        if len(member_list) > 1 and remove_username == member_list[0]["member"]:
+            return False, f"Cannot remove the creator of the server."
+
+        if remove_username not in [member["member"] for member in member_list]:
+            return False, f"User '{remove_username}' is not a member of the server."
+
+        if not self.members.remove_member(server_id, remove_username):
+            return False, f"Error removing user from server"
+        return True, f"User '{remove_username}' removed from server successfully!"
+
+    def update_member_roles_row(self, server_id: str, username: str, new_roles: list[str]):
+        if not new_roles:
+            return False, f"At least one role is required."
+        if not self.members.set_roles(server_id, username, new_roles):
+            return False, f"User '{username}' not found in the server."
+        return True, f"Roles for user '{username}' updated successfully!"
+
     def get_info_to_connect(self, server_id: str):
-        query = "SELECT hostname, username, password, rsa_key FROM tbl_server WHERE server_id = %s"
-        values = (server_id,)
         try:
-            result = self.db.execute_query(query, values)
+            row = self.load_server_row(server_id)
             passphrase = os.environ.get("RSA_PASSPHRASE")
-            if result[0][2] != const.NULL_VALUE:
-                pass_from_db = result[0][2]
-                pass_encrypted = ast.literal_eval(pass_from_db)
-                password = self.decrypt_rsa_key(passphrase.encode(), server_id.encode(), pass_encrypted)
+            if row["password"] != const.NULL_VALUE:
+                pass_from_db = row["password"]
+                password = self.decrypt_credential(passphrase, server_id, "password", pass_from_db)
             else:
                 password = None
-            if result[0][3] != const.NULL_VALUE:
-                rsa_key_from_db = result[0][3]
-                rsa_key_encrypted = ast.literal_eval(rsa_key_from_db)
-                rsa_key = self.decrypt_rsa_key(passphrase.encode(), server_id.encode(), rsa_key_encrypted)
+            if row["rsa_key"] != const.NULL_VALUE:
+                rsa_key_from_db = row["rsa_key"]
+                rsa_key = self.decrypt_credential(passphrase, server_id, "rsa_key", rsa_key_from_db)
             else:
                 rsa_key = None
 
             server = {
                 "server_id": server_id,
-                "hostname": result[0][0],
-                "username": result[0][1],
+                "hostname": row["hostname"],
+                "username": row["username"],
                 "password": password,
                 "rsa_key": rsa_key,
             }
@@ -547,16 +704,15 @@ class Server:
         return member_list
 
     def get_server_members(self, server_id: str) -> list:
-        # Query to fetch the current member list of the server
-        select_query = "SELECT member FROM tbl_server WHERE server_id = %s"
-        select_values = (server_id,)
-
         try:
-            # Fetch the current member list from the database
-            current_members = self.db.execute_query(select_query, select_values)
-            member_data = current_members[0][0]
+            if self.members is not None:
+                member_list = self.members.get_members(server_id)
+                return self.update_member_list_with_role_names(member_list) if member_list else []
+            # Fetch the current member list of the server
+            row = self.load_server_row(server_id)
+            member_data = row["member"]
             member_list = [json.loads(member) for member in member_data]
-            if current_members:
+            if row:
                 return self.update_member_list_with_role_names(member_list)
             else:
                 return []  # Return an empty list if server not found or no members
@@ -565,17 +721,23 @@ class Server:
             return []
         
     def get_roles_server(self, server_id: str, username: str):
+        if self.members is not None:
+            member_list = self.members.get_members(server_id)
+            if member_list is None:
+                return False, f"Can not get information from table server"
+            member = next((member for member in member_list if member["member"] == username), None)
+            if not member:
+                return False, f"User '{username}' not found in the server."
+            return True, self.update_member_list_with_role_names([member])
         try:
             # Fetch the server's member list
-            select_query = "SELECT member FROM tbl_server WHERE server_id = %s"
-            select_values = (server_id,)
-            current_members = self.db.execute_query(select_query, select_values)
+            row = self.load_server_row(server_id)
 
-            if not current_members:
+            if row is None:
                 return False, f"Can not get information from table server"
 
             # Convert retrieved member list to Python list
-            member_data = current_members[0][0]
+            member_data = row["member"]
             member_list = [json.loads(member) for member in member_data]
 
             # Find the member to update
@@ -0,0 +1,72 @@
+from datetime import datetime
+import json
+from . import connector
+
+class ServerJob:
+    def __init__(self, db: connector.DBConnector) -> None:
+        self.db = db
+
+    def create_job(self, job_id: str, server_id: str, username: str, action: str) -> bool:
+        query = """
+            INSERT INTO tbl_server_job (job_id, server_id, username, action, status, progress, output, result, created_at, modified_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        now = datetime.now()
+        values = (job_id, server_id, username, action, "queued", 0, "", None, now, now)
+
+        try:
+            self.db.execute_query(query, values)
+            return True
+        except Exception as e:
+            print("Error creating server job:", e)
+            return False
+
+    def update_job(self, job_id: str, status: str, progress: float, output: str) -> bool:
+        query = """UPDATE tbl_server_job SET status = %s, progress = %s, output = %s, modified_at = %s WHERE job_id = %s"""
+        values = (status, progress, output, datetime.now(), job_id)
+
+        try:
+            self.db.execute_query(query, values)
+            return True
+        except Exception as e:
+            print("Error updating server job:", e)
+            return False
+
+    def finish_job(self, job_id: str, status: str, output: str, result: dict) -> bool:
+        query = """UPDATE tbl_server_job SET status = %s, progress = %s, output = %s, result = %s, modified_at = %s WHERE job_id = %s"""
+        values = (status, 100, output, json.dumps(result), datetime.now(), job_id)
+
+        try:
+            self.db.execute_query(query, values)
+            return True
+        except Exception as e:
+            print("Error finishing server job:", e)
+            return False
+
+    def get_job(self, job_id: str):
+        query = """
+            SELECT job_id, server_id, username, action, status, progress, output, result, created_at, modified_at
+            FROM tbl_server_job WHERE job_id = %s
+        """
+        values = (job_id,)
+
+        try:
+            result = self.db.execute_query(query, values)
+            if not result:
+                return None
+            row = result[0]
+            return {
+                "job_id": row[0],
+                "server_id": row[1],
+                "username": row[2],
+                "action": row[3],
+                "status": row[4],
+                "progress": row[5],
+                "output": row[6].split("\n") if row[6] else [],
+                "result": json.loads(row[7]) if row[7] else None,
+                "created_at": row[8],
+                "modified_at": row[9]
+            }
+        except Exception as e:
+            print("Error getting server job:", e)
+            return None
@@ -0,0 +1,133 @@
+from . import connector
+from ..const import const
+
+class ServerMember:
+    """
+    Server membership in tbl_server_member, one row per (server, member, role).
+    Used instead of the tbl_server.member JSON array when SERVER_MEMBER_STORAGE=table.
+    """
+    def __init__(self, db: connector.DBConnector) -> None:
+        self.db = db
+
+    def has_member(self, server_id: str, username: str) -> bool:
+        query = """SELECT EXISTS (SELECT 1 FROM tbl_server_member WHERE server_id = %s AND username = %s)"""
+        values = (server_id, username)
+
+        try:
+            result = self.db.execute_query(query, values)
+            return bool(result and result[0][0])
+        except Exception as e:
+            print("Error checking server member:", e)
+            return False
+
+    def get_members(self, server_id: str):
+        """
+        Members of server_id as [{"member": username, "role": [role ids]}], creator first,
+        or None on error.
+        """
+        query = """
+            SELECT username, role_id FROM tbl_server_member
+            WHERE server_id = %s ORDER BY position, role_id
+        """
+        values = (server_id,)
+
+        try:
+            result = self.db.execute_query(query, values)
+            if result is None:
+                return None
+            members = {}
+            for username, role_id in result:
+                members.setdefault(username, {"member": username, "role": []})["role"].append(role_id)
+            return list(members.values())
+        except Exception as e:
+            print("Error getting server members:", e)
+            return None
+
+    def get_user_servers(self, username: str):
+        query = """SELECT server_id, role_id FROM tbl_server_member WHERE username = %s"""
+        values = (username,)
+
+        try:
+            result = self.db.execute_query(query, values)
+            if result is None:
+                return None
+            servers = {}
+            for server_id, role_id in result:
+                servers.setdefault(server_id, []).append(role_id)
+            return servers
+        except Exception as e:
+            print("Error getting user servers:", e)
+            return None
+
+    def add_member(self, server_id: str, username: str, roles: list[str]) -> bool:
+        # The NOT EXISTS guard keeps concurrent adds of the same user from creating two entries
+        query = """
+            INSERT INTO tbl_server_member (server_id, username, role_id, position)
+            SELECT %s, %s, role_id, (SELECT COALESCE(MAX(position) + 1, 0) FROM tbl_server_member WHERE server_id = %s)
+            FROM unnest(%s::varchar[]) AS role_id
+            WHERE NOT EXISTS (SELECT 1 FROM tbl_server_member WHERE server_id = %s AND username = %s)
+            ON CONFLICT DO NOTHING
+        """
+        values = (server_id, username, server_id, list(roles), server_id, username)
+
+        try:
+            self.db.execute_query(query, values)
+            return True
+        except Exception as e:
+            print("Error adding server member:", e)
+            return False
+
+    def remove_member(self, server_id: str, username: str) -> bool:
+        query = """DELETE FROM tbl_server_member WHERE server_id = %s AND username = %s"""
+        values = (server_id, username)
+
+        try:
+            self.db.execute_query(query, values)
+            return True
+        except Exception as e:
+            print("Error removing server member:", e)
+            return False
+
+    def set_roles(self, server_id: str, username: str, roles: list[str]) -> bool:
+        query = """SELECT MIN(position) FROM tbl_server_member WHERE server_id = %s AND username = %s"""
+        values = (server_id, username)
+
+        try:
+            result = self.db.execute_query(query, values)
+            if not result or result[0][0] is None:
+                return False
+            position = result[0][0]
+        except Exception as e:
+            print("Error getting server member:", e)
+            return False
+
+        # Replace the role rows in one transaction, keeping the member's position
+        queries = [
+            ("""DELETE FROM tbl_server_member WHERE server_id = %s AND username = %s""", (server_id, username)),
+            ("""INSERT INTO tbl_server_member (server_id, username, role_id, position)
+                SELECT %s, %s, role_id, %s FROM unnest(%s::varchar[]) AS role_id""",
+             (server_id, username, position, list(roles))),
+        ]
+        return self.db.execute_transaction(queries)
+
+    def migrate_from_json(self) -> bool:
+        """
+        Copy every tbl_server.member array into tbl_server_member. Safe to run again;
+        members without roles are migrated as ROLE_ID_USER.
+        """
+        query = """
+            INSERT INTO tbl_server_member (server_id, username, role_id, position)
+            SELECT s.server_id, m.value::json->>'member', COALESCE(r.role_id, %s), m.position - 1
+            FROM tbl_server s
+            CROSS JOIN LATERAL unnest(s.member) WITH ORDINALITY AS m(value, position)
+            LEFT JOIN LATERAL json_array_elements_text(m.value::json->'role') AS r(role_id) ON TRUE
+            ON CONFLICT DO NOTHING
+        """
+        values = (const.ROLE_ID_USER,)
+
+        try:
+            self.db.execute_query(query, values)
+            return True
+        except Exception as e:
+            print("Error migrating server members:", e)
+            return False
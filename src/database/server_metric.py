@@ -0,0 +1,75 @@
+import json
+from . import connector
+
+# Numeric columns of tbl_server_metric, in the order of metrics.METRIC_FIELDS
+METRIC_COLUMNS = ("cpu_percent", "ram_used_bytes", "ram_total_bytes", "disk_used_bytes", "disk_total_bytes")
+
+class ServerMetric:
+    """
+    get_info samples in tbl_server_metric, shared by every API process.
+    collected_at is a unix timestamp in seconds.
+    """
+    def __init__(self, db: connector.DBConnector) -> None:
+        self.db = db
+
+    def add_sample(self, server_id: str, collected_at: float, values: list, data: dict) -> bool:
+        query = f"""
+            INSERT INTO tbl_server_metric (server_id, collected_at, {', '.join(METRIC_COLUMNS)}, data)
+            VALUES (%s, %s, {', '.join(['%s'] * len(METRIC_COLUMNS))}, %s)
+        """
+        values = (server_id, collected_at, *values, json.dumps(data))
+
+        try:
+            self.db.execute_query(query, values)
+            return True
+        except Exception as e:
+            print("Error adding server metric:", e)
+            return False
+
+    def get_latest(self, server_id: str):
+        """
+        (collected_at, get_info data) of the newest sample of server_id, or None.
+        """
+        query = """
+            SELECT collected_at, data FROM tbl_server_metric
+            WHERE server_id = %s ORDER BY collected_at DESC LIMIT 1
+        """
+        values = (server_id,)
+
+        try:
+            result = self.db.execute_query(query, values)
+            if not result:
+                return None
+            return result[0][0], json.loads(result[0][1])
+        except Exception as e:
+            print("Error getting latest server metric:", e)
+            return None
+
+    def get_samples(self, server_id: str, start: float = None, end: float = None):
+        """
+        [(collected_at, *metric columns)] of server_id between start and end, oldest
+        first, or None on error.
+        """
+        query = f"""
+            SELECT collected_at, {', '.join(METRIC_COLUMNS)} FROM tbl_server_metric
+            WHERE server_id = %s AND collected_at >= %s AND collected_at <= %s
+            ORDER BY collected_at
+        """
+        values = (server_id, float("-inf") if start is None else start, float("inf") if end is None else end)
+
+        try:
+            return self.db.execute_query(query, values)
+        except Exception as e:
+            print("Error getting server metrics:", e)
+            return None
+
+    def delete_before(self, collected_at: float) -> bool:
+        query = """DELETE FROM tbl_server_metric WHERE collected_at < %s"""
+        values = (collected_at,)
+
+        try:
+            self.db.execute_query(query, values)
+            return True
+        except Exception as e:
+            print("Error deleting old server metrics:", e)
+            return False
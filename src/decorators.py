@@ -12,8 +12,8 @@ def token_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         db_env = LoadDBEnv.load_db_env()
+        # Connected lazily, only when the blacklist filter cannot rule the token out
         db = connector.DBConnector(*db_env)
-        db.connect()
         blacklist_token = BlackListToken(db)
 
         token = request.headers.get("Authorization")
@@ -43,8 +43,8 @@ def multiple_tokens_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         db_env = LoadDBEnv.load_db_env()
+        # Connected lazily, only when the blacklist filter cannot rule the token out
         db = connector.DBConnector(*db_env)
-        db.connect()
         blacklist_token = BlackListToken(db)
 
         tokens = []
@@ -65,6 +65,7 @@ def multiple_tokens_required(f):
             # Decode each token and store the payload
             for token in tokens:
                 if blacklist_token.is_token_blacklisted(token):
+                    db.close()
                     return jsonify({"message": "One or more tokens are blacklisted"}), 401
                 payload = jwt.decode(token, secret_key, algorithms=["HS256"])
                 payloads.append(payload)
@@ -9,6 +9,13 @@ cpu=$(cat /proc/stat | grep cpu | tail -1 | awk '{usage=($2+$4)*100/($2+$4+$5)}
 # Get disk space information
 disk_space=$(df -h --total | grep 'total' | awk '{print $3 " of " $2}')
 
+# Numeric samples for the metrics history
+cpu_percent=$(cat /proc/stat | grep cpu | tail -1 | awk '{usage=($2+$4)*100/($2+$4+$5)} END {print usage}')
+ram_total_bytes=$(free -b | awk 'NR==2{print $2}')
+ram_used_bytes=$(free -b | awk 'NR==2{print $3}')
+disk_total_bytes=$(df -B1 --total | grep 'total' | awk '{print $2}')
+disk_used_bytes=$(df -B1 --total | grep 'total' | awk '{print $3}')
+
 # Get operating system information
 os=$(cat /etc/os-release | grep "^PRETTY_NAME" | cut -d= -f2-)
 
@@ -21,7 +28,12 @@ response='{
     "CPU": "'"$cpu"'",
     "Disk_Space": "'"$disk_space"'",
     "Operating_System": '"$os"',
-    "Version": '"$version"'
+    "Version": '"$version"',
+    "CPU_Percent": '"${cpu_percent:-null}"',
+    "RAM_Used_Bytes": '"${ram_used_bytes:-null}"',
+    "RAM_Total_Bytes": '"${ram_total_bytes:-null}"',
+    "Disk_Used_Bytes": '"${disk_used_bytes:-null}"',
+    "Disk_Total_Bytes": '"${disk_total_bytes:-null}"'
 }'
 
 echo $response
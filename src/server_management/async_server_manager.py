@@ -0,0 +1,145 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import os
+import threading
+from .server_manager import ServerManager
+
+# Handshakes and SFTP calls stay blocking in paramiko, they are confined to this pool.
+# It is as large as a batch may fan out, so cold connects and script deploys of every
+# host in flight run side by side; threads are only started when needed.
+blocking_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("ASYNC_SSH_BLOCKING_WORKERS") or os.environ.get("BATCH_MAX_CONCURRENCY", 256)),
+    thread_name_prefix="async-ssh")
+
+class EventLoopThread:
+    """
+    One asyncio loop running in a daemon thread, shared by every request of the
+    process. Flask views hand coroutines to it with submit() or run().
+    """
+    def __init__(self, name: str = "async-ssh-loop"):
+        self.name = name
+        self.loop = None
+        self._lock = threading.Lock()
+
+    def get_loop(self):
+        with self._lock:
+            if self.loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name=self.name, daemon=True).start()
+                self.loop = loop
+            return self.loop
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.get_loop())
+
+    def run(self, coroutine, timeout: float = None):
+        return self.submit(coroutine).result(timeout)
+
+event_loop = EventLoopThread()
+
+class AsyncServerManager:
+    """
+    Awaitable counterpart of ServerManager. Remote commands are driven by the event
+    loop from the channel's file descriptor, so a waiting command holds no thread;
+    connection setup and SFTP transfers run on blocking_executor.
+    """
+    def __init__(self, hostname, username, password=None, private_key=None, server_id=None, timeout=None):
+        self.manager = ServerManager(hostname, username, password, private_key, server_id=server_id, timeout=timeout)
+        self.server_id = server_id
+        self.timeout = timeout
+
+    async def _blocking(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(blocking_executor, functools.partial(function, *args, **kwargs))
+
+    async def connect(self):
+        return await self._blocking(self.manager.connect)
+
+    async def disconnect(self, discard=False):
+        return await self._blocking(self.manager.disconnect, discard)
+
+    async def execute_script_in_remote_server(self, script_relative_path, *args, chunk_size=32768, redeploy=True):
+        try:
+            script_full_path = f"{script_relative_path} {' '.join(args)}"
+            output = await self.execute_command(f"bash {script_full_path}", chunk_size)
+            if output is not None and redeploy:
+                script_directory = self.manager.missing_deployed_script(script_relative_path, None, len(output[0]), output[1])
+                if script_directory is not None and await self._blocking(self.manager.redeploy_scripts, script_directory):
+                    return await self.execute_script_in_remote_server(script_relative_path, *args, chunk_size=chunk_size,
+                                                                      redeploy=False)
+            return output
+        except Exception as e:
+            print(f"Error executing script: {e}")
+
+    async def execute_command(self, command, chunk_size=32768):
+        """
+        Run command and return (stdout, stderr) once it exits, or None after self.timeout.
+        """
+        loop = asyncio.get_running_loop()
+        channel = await self._blocking(self.manager.client.get_transport().open_session)
+        ready = asyncio.Event()
+        # The channel's pipe becomes readable when stdout data or EOF arrives
+        fd = channel.fileno()
+        loop.add_reader(fd, ready.set)
+        watching = True
+        stdout, stderr = bytearray(), bytearray()
+        deadline = None if self.timeout is None else loop.time() + self.timeout
+        try:
+            await self._blocking(channel.exec_command, command)
+            while True:
+                while channel.recv_ready():
+                    stdout += channel.recv(chunk_size)
+                while channel.recv_stderr_ready():
+                    stderr += channel.recv_stderr(chunk_size)
+                if channel.eof_received and channel.exit_status_ready() \
+                        and not channel.recv_ready() and not channel.recv_stderr_ready():
+                    break
+                if deadline is not None and loop.time() >= deadline:
+                    print(f"Command timed out after {self.timeout} seconds.")
+                    return None
+                if channel.eof_received and watching:
+                    # The pipe stays readable after EOF, only the exit status is left to wait for
+                    loop.remove_reader(fd)
+                    watching = False
+                ready.clear()
+                try:
+                    # stderr does not signal the pipe, so never sleep long
+                    await asyncio.wait_for(ready.wait(), 0.2 if watching else 0.05)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if watching:
+                loop.remove_reader(fd)
+            channel.close()
+        return stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+    async def grant_permission(self, script_relative_path, role):
+        return await self._blocking(self.manager.grant_permission, script_relative_path, role)
+
+    async def path_info(self, remote_path, use_cache=True):
+        return await self._blocking(self.manager.path_info, remote_path, use_cache)
+
+    async def check_script_exists_on_remote(self, remote_file_path):
+        return await self._blocking(self.manager.check_script_exists_on_remote, remote_file_path)
+
+    async def check_file_type(self, remote_file_path):
+        return await self._blocking(self.manager.check_file_type, remote_file_path)
+
+    async def ensure_scripts_deployed(self, script_directory, manifest_store=None):
+        return await self._blocking(self.manager.ensure_scripts_deployed, script_directory, manifest_store)
+
+    async def upload_file_to_remote(self, local_file_path, remote_file_path):
+        return await self._blocking(self.manager.upload_file_to_remote, local_file_path, remote_file_path)
+
+    async def download_file_from_remote(self, remote_file_path, local_file_path):
+        return await self._blocking(self.manager.download_file_from_remote, remote_file_path, local_file_path)
+
+    async def upload_folder(self, local_folder, remote_folder, progress=None):
+        return await self._blocking(self.manager.upload_folder, local_folder, remote_folder, progress)
+
+    async def download_folder(self, remote_folder, local_zip_file):
+        return await self._blocking(self.manager.download_folder, remote_folder, local_zip_file)
+
+    def get_file_name(self, file_path):
+        return self.manager.get_file_name(file_path)
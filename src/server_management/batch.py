@@ -0,0 +1,196 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import functools
+import os
+import queue
+import time
+from .server_manager import ServerManager
+from .async_server_manager import AsyncServerManager, blocking_executor, event_loop
+from ..database import connector
+from ..database.load_env import LoadDBEnv
+from ..database.script_manifest import ScriptManifest
+
+# action: (script env variable, fixed leading arguments, whether the caller must pass an argument)
+BATCH_ACTIONS = {
+    "get_server_info": ("SCRIPT_PATH_GET_INFO", [], False),
+    "get_all_proxy": ("SCRIPT_PATH_GET_ALL_PROXY", [], False),
+    "lib_status": ("SCRIPT_PATH_LIB_INSTALL", [], False),
+    "firewall_rules": ("SCRIPT_PATH_SHOW_STATUS", [], False),
+    "allow_ip": ("SCRIPT_PATH_ALLOW_IP", [], True),
+    "deny_ip": ("SCRIPT_PATH_DENY_IP", [], True),
+    "allow_port": ("SCRIPT_PATH_ALLOW_PORT", [], True),
+    "deny_port": ("SCRIPT_PATH_DENY_PORT", [], True),
+    "enable_firewall": ("SCRIPT_PATH_ENABLE_FIREWALL", [], False),
+    "disable_firewall": ("SCRIPT_PATH_DISABLE_FIREWALL", [], False),
+    "reset_firewall": ("SCRIPT_PATH_RESET_FIREWALL", [], False),
+    "allow_ssh": ("SCRIPT_PATH_ALLOW_SSH", [], False),
+    "deny_ssh": ("SCRIPT_PATH_DENY_SSH", [], False),
+    "allow_telnet": ("SCRIPT_PATH_ALLOW_TELNET", [], False),
+    "deny_telnet": ("SCRIPT_PATH_DENY_TELNET", [], False),
+    "docker_list_images": ("SCRIPT_PATH_DOCKER_CONTROL", ["list-images"], False),
+    "docker_list_containers": ("SCRIPT_PATH_DOCKER_CONTROL", ["list-containers"], False),
+}
+
+batch_async = os.environ.get("BATCH_ASYNC", "true").lower() == "true"
+
+def _deploy_scripts(server: ServerManager, script_directory: str):
+    # Each worker borrows its own pooled connection, psycopg2 connections are not shared across threads here
+    db = connector.DBConnector(*LoadDBEnv.load_db_env())
+    db.connect()
+    try:
+        return server.ensure_scripts_deployed(script_directory, ScriptManifest(db))
+    finally:
+        db.close()
+
+def _script_result(result: dict, output, timeout: float, elapsed: float) -> dict:
+    result["elapsed"] = elapsed
+    if output is None:
+        if timeout is not None and elapsed >= timeout:
+            result.update({"status": "timeout", "message": f"No result within {timeout} seconds"})
+        else:
+            result.update({"status": "error", "message": "Can not execute script on server"})
+        return result
+
+    stdout, stderr = output
+    result.update({
+        "status": "ok" if stdout or not stderr else "error",
+        "lines": stdout.split("\n") if stdout else [],
+        "stderr": stderr.split("\n") if stderr else []
+    })
+    return result
+
+def run_script_on_server(server_info: dict, script_path: str, args: list, script_directory: str, timeout: float) -> dict:
+    started = time.monotonic()
+    result = {"server_id": server_info["server_id"], "hostname": server_info["hostname"]}
+
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"],
+                           server_id=server_info["server_id"], timeout=timeout)
+    if not server.connect():
+        result.update({"status": "error", "message": "Can not connect server", "elapsed": time.monotonic() - started})
+        return result
+
+    try:
+        if not _deploy_scripts(server, script_directory):
+            result.update({"status": "error", "message": "Can not deploy scripts to server", "elapsed": time.monotonic() - started})
+            return result
+        file_in_server = f"{script_directory}/{server.get_file_name(script_path)}"
+        output = server.execute_script_in_remote_server(file_in_server, *args)
+    finally:
+        server.disconnect()
+
+    return _script_result(result, output, timeout, time.monotonic() - started)
+
+async def run_script_on_server_async(server_info: dict, script_path: str, args: list, script_directory: str, timeout: float) -> dict:
+    started = time.monotonic()
+    result = {"server_id": server_info["server_id"], "hostname": server_info["hostname"]}
+
+    server = AsyncServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"],
+                                server_id=server_info["server_id"], timeout=timeout)
+    loop = asyncio.get_running_loop()
+    abandoned = []
+
+    async def blocking(function, *function_args):
+        work = loop.run_in_executor(blocking_executor, functools.partial(function, *function_args))
+        try:
+            return await asyncio.shield(work)
+        except asyncio.CancelledError:
+            # A thread can not be interrupted, the connection is dropped once the call returns
+            abandoned.append(work)
+            work.add_done_callback(lambda _: blocking_executor.submit(server.manager.disconnect, True))
+            raise
+
+    if not await blocking(server.manager.connect):
+        result.update({"status": "error", "message": "Can not connect server", "elapsed": time.monotonic() - started})
+        return result
+
+    try:
+        if not await blocking(_deploy_scripts, server.manager, script_directory):
+            result.update({"status": "error", "message": "Can not deploy scripts to server", "elapsed": time.monotonic() - started})
+            return result
+        file_in_server = f"{script_directory}/{server.get_file_name(script_path)}"
+        output = await server.execute_script_in_remote_server(file_in_server, *args)
+    finally:
+        if not abandoned:
+            await server.disconnect()
+
+    return _script_result(result, output, timeout, time.monotonic() - started)
+
+def run_batch(servers: list, script_path: str, args: list, script_directory: str, timeout: float = None, max_workers: int = None):
+    """
+    Run one script on every server concurrently and yield each server's result as
+    soon as it finishes. Closing the generator cancels servers not yet started.
+    """
+    if not servers:
+        return
+    if batch_async:
+        yield from run_batch_async(servers, script_path, args, script_directory, timeout)
+        return
+    if max_workers is None:
+        max_workers = int(os.environ.get("BATCH_MAX_WORKERS", 16))
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(servers))), thread_name_prefix="batch")
+    try:
+        futures = {
+            executor.submit(run_script_on_server, server_info, script_path, args, script_directory, timeout): server_info
+            for server_info in servers
+        }
+        for future in as_completed(futures):
+            server_info = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                print(f"Error running batch on server {server_info['server_id']}: {e}")
+                yield {"server_id": server_info["server_id"], "hostname": server_info["hostname"], "status": "error", "message": str(e)}
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def run_batch_async(servers: list, script_path: str, args: list, script_directory: str, timeout: float = None, max_concurrency: int = None):
+    """
+    run_batch on the shared event loop: up to max_concurrency servers are in flight
+    at once while their commands wait without holding a thread each. timeout is one
+    deadline per server covering connect, deploy and the script run.
+    """
+    if max_concurrency is None:
+        max_concurrency = int(os.environ.get("BATCH_MAX_CONCURRENCY", 256))
+    results = queue.Queue()
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def run_one(server_info):
+            async with semaphore:
+                started = time.monotonic()
+                try:
+                    result = await asyncio.wait_for(
+                        run_script_on_server_async(server_info, script_path, args, script_directory, timeout), timeout)
+                except asyncio.TimeoutError:
+                    result = {"server_id": server_info["server_id"], "hostname": server_info["hostname"], "status": "timeout",
+                              "message": f"No result within {timeout} seconds", "elapsed": time.monotonic() - started}
+                except Exception as e:
+                    print(f"Error running batch on server {server_info['server_id']}: {e}")
+                    result = {"server_id": server_info["server_id"], "hostname": server_info["hostname"], "status": "error", "message": str(e)}
+            results.put(result)
+
+        await asyncio.gather(*(run_one(server_info) for server_info in servers))
+
+    future = event_loop.submit(run_all())
+    reported = set()
+    try:
+        while len(reported) < len(servers):
+            try:
+                result = results.get(timeout=1)
+            except queue.Empty:
+                if not future.done() or not results.empty():
+                    continue
+                # run_all ended without a result for every server, e.g. it was cancelled
+                error = "Batch was cancelled" if future.cancelled() else f"Batch failed: {future.exception()}"
+                print(error)
+                for server_info in servers:
+                    if server_info["server_id"] not in reported:
+                        reported.add(server_info["server_id"])
+                        yield {"server_id": server_info["server_id"], "hostname": server_info["hostname"],
+                               "status": "error", "message": error}
+                return
+            reported.add(result["server_id"])
+            yield result
+    finally:
+        future.cancel()
@@ -0,0 +1,182 @@
+from contextlib import contextmanager
+import hashlib
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class _PooledClient:
+    def __init__(self, client):
+        self.client = client
+        self.leases = 0
+        self.last_used = time.monotonic()
+
+class SSHConnectionPool:
+    """
+    Keeps live paramiko SSHClient transports keyed by server_id and credential
+    fingerprint. Callers lease the shared client and open their own channels on it.
+    """
+    def __init__(self, max_sessions_per_host: int = 8, max_idle: float = 300, keepalive: int = 30, acquire_timeout: float = 30):
+        self.max_sessions_per_host = max(1, max_sessions_per_host)
+        self.max_idle = max_idle
+        self.keepalive = keepalive
+        self.acquire_timeout = acquire_timeout
+        self._entries = {}
+        # Clients replaced or discarded while still leased, closed on their last release
+        self._retired = {}
+        self._host_slots = {}
+        # {key: [lock, number of acquire calls using it]}, dropped with the key's client
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(hostname: str, username: str, password: str = None, private_key: str = None) -> str:
+        digest = hashlib.sha256()
+        for part in (hostname, username, password, private_key):
+            digest.update(str(part).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def acquire(self, key, hostname: str, open_client):
+        """
+        Lease the client for key, reconnecting with open_client() when there is no
+        live transport. Returns None when the host has no free session slot or the
+        connection cannot be established.
+        """
+        slots = self._host_slot(hostname)
+        if not slots.acquire(timeout=self.acquire_timeout):
+            print(f"Timed out waiting for an SSH session slot on '{hostname}'.")
+            return None
+
+        try:
+            with self._key_lock(key):
+                self.reap_idle()
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None and self._is_alive(entry.client):
+                        entry.leases += 1
+                        entry.last_used = time.monotonic()
+                        return entry.client
+                    to_close = None
+                    if entry is not None:
+                        # Dead transport, drop it and reconnect below
+                        to_close = self._retire(key)
+                if to_close is not None:
+                    to_close.close()
+
+                client = open_client()
+                if client is None:
+                    slots.release()
+                    return None
+                transport = client.get_transport()
+                if transport is not None and self.keepalive:
+                    transport.set_keepalive(self.keepalive)
+
+                entry = _PooledClient(client)
+                entry.leases = 1
+                with self._lock:
+                    self._entries[key] = entry
+                return client
+        except Exception:
+            slots.release()
+            raise
+
+    def release(self, key, hostname: str, client, discard: bool = False):
+        to_close = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.client is client:
+                entry.leases = max(0, entry.leases - 1)
+                entry.last_used = time.monotonic()
+                if discard or not self._is_alive(client):
+                    to_close = self._retire(key)
+            else:
+                entry = self._retired.get(id(client))
+                if entry is not None:
+                    entry.leases = max(0, entry.leases - 1)
+                    if entry.leases == 0:
+                        del self._retired[id(client)]
+                        to_close = client
+        if to_close is not None:
+            to_close.close()
+        self._host_slot(hostname).release()
+
+    def reap_idle(self):
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.leases == 0 and now - entry.last_used >= self.max_idle:
+                    expired.append(entry.client)
+                    del self._entries[key]
+                    self._drop_key_lock(key)
+        for client in expired:
+            client.close()
+
+    def closeall(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            for key in list(self._entries):
+                self._drop_key_lock(key)
+            self._entries.clear()
+        for entry in entries:
+            entry.client.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "connections": len(self._entries),
+                "leases": sum(entry.leases for entry in self._entries.values())
+            }
+
+    def _retire(self, key):
+        # Caller holds self._lock. Returns the client when it can be closed right away.
+        entry = self._entries.pop(key)
+        self._drop_key_lock(key)
+        if entry.leases == 0:
+            return entry.client
+        self._retired[id(entry.client)] = entry
+        return None
+
+    def _is_alive(self, client) -> bool:
+        transport = client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def _host_slot(self, hostname: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            slots = self._host_slots.get(hostname)
+            if slots is None:
+                slots = threading.BoundedSemaphore(self.max_sessions_per_host)
+                self._host_slots[hostname] = slots
+            return slots
+
+    @contextmanager
+    def _key_lock(self, key):
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:
+                yield
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if key not in self._entries:
+                    self._drop_key_lock(key)
+
+    def _drop_key_lock(self, key):
+        # Caller holds self._lock. A lock still used by an acquire is dropped by its last user.
+        key_lock = self._key_locks.get(key)
+        if key_lock is not None and key_lock[1] == 0:
+            del self._key_locks[key]
+
+ssh_pool_enabled = os.environ.get("SSH_POOL_ENABLED", "true").lower() in ["true", "1", "yes"]
+
+ssh_pool = SSHConnectionPool(
+    max_sessions_per_host=int(os.environ.get("SSH_POOL_MAX_SESSIONS_PER_HOST", 8)),
+    max_idle=float(os.environ.get("SSH_POOL_MAX_IDLE", 300)),
+    keepalive=int(os.environ.get("SSH_POOL_KEEPALIVE", 30)),
+    acquire_timeout=float(os.environ.get("SSH_POOL_ACQUIRE_TIMEOUT", 30))
+)
@@ -0,0 +1,102 @@
+import json
+import os
+import secrets
+import threading
+from ..cache import TTLCache
+
+class ExecutionJob:
+    """
+    Output of one remote execution, kept so that clients can reattach and replay
+    from the last event id they saw. Only the newest max_buffer characters are kept.
+    """
+    def __init__(self, job_id: str, server_id: str, username: str, max_buffer: int = 16 * 1024 * 1024):
+        self.job_id = job_id
+        self.server_id = server_id
+        self.username = username
+        self.max_buffer = max_buffer
+        self.events = []
+        self.first_index = 0
+        self.buffered = 0
+        self.done = False
+        self.exit_status = None
+        self._cond = threading.Condition()
+
+    def append(self, event: str, data: str):
+        with self._cond:
+            self.events.append((event, data))
+            self.buffered += len(data)
+            while self.buffered > self.max_buffer and len(self.events) > 1:
+                _, dropped = self.events.pop(0)
+                self.buffered -= len(dropped)
+                self.first_index += 1
+            self._cond.notify_all()
+
+    def finish(self, exit_status):
+        with self._cond:
+            self.done = True
+            self.exit_status = exit_status
+            self._cond.notify_all()
+
+    def read(self, offset: int, timeout: float):
+        """
+        Wait up to timeout for events at or after offset. Returns (events, done) where
+        events are (index, event, data) tuples.
+        """
+        with self._cond:
+            if offset >= self.first_index + len(self.events) and not self.done:
+                self._cond.wait(timeout)
+            start = max(offset, self.first_index)
+            events = [(index, event, data) for index, (event, data)
+                      in enumerate(self.events[start - self.first_index:], start)]
+            done = self.done and start + len(events) >= self.first_index + len(self.events)
+            return events, done
+
+# Jobs live in this process only: a reattach that reaches another worker finds nothing,
+# see "Deployment" in README.md
+jobs = TTLCache(max_size=int(os.environ.get("EXECUTION_JOB_CACHE_SIZE", 256)),
+                ttl=float(os.environ.get("EXECUTION_JOB_TTL", 3600)))
+
+def _pump(job: ExecutionJob, server, script_path: str, args: tuple):
+    try:
+        for event, data in server.stream_script_in_remote_server(script_path, *args):
+            if event == "exit":
+                job.finish(data)
+            else:
+                job.append(event, data)
+    except Exception as e:
+        print(f"Error streaming script: {e}")
+        job.append("error", str(e))
+    finally:
+        if not job.done:
+            job.finish(None)
+        server.disconnect()
+        # Completed jobs stay replayable for a full TTL after they finish
+        jobs.set(job.job_id, job)
+
+def start_execution(server, script_path: str, args: tuple, server_id: str, username: str) -> ExecutionJob:
+    """
+    Run the script on a connected ServerManager in a background thread. The thread
+    owns the connection from here on and disconnects it when the script exits.
+    """
+    job = ExecutionJob(secrets.token_urlsafe(16), server_id, username)
+    jobs.set(job.job_id, job)
+    worker = threading.Thread(target=_pump, args=(job, server, script_path, args), name=f"execute-{job.job_id}", daemon=True)
+    worker.start()
+    return job
+
+def get_execution(job_id: str):
+    return jobs.get(job_id)
+
+def sse_events(job: ExecutionJob, offset: int = 0, keepalive: float = 15):
+    yield f"event: job\ndata: {json.dumps({'job_id': job.job_id})}\n\n"
+    while True:
+        events, done = job.read(offset, keepalive)
+        for index, event, data in events:
+            yield f"id: {index}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+            offset = index + 1
+        if done:
+            yield f"event: exit\ndata: {json.dumps({'exit_status': job.exit_status})}\n\n"
+            return
+        if not events:
+            # Comment line, keeps proxies from closing an idle stream
+            yield ": keepalive\n\n"
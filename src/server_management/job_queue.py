@@ -0,0 +1,197 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import secrets
+import shutil
+import threading
+import time
+import zipfile
+from .server_manager import ServerManager
+from ..database import connector
+from ..database.load_env import LoadDBEnv
+from ..database.script_manifest import ScriptManifest
+from ..database.server_job import ServerJob
+
+def save_job(update):
+    """
+    Run update(ServerJob) on a short-lived pooled connection, so a job only holds
+    Postgres while it is writing its state and never for the whole SSH operation.
+    """
+    db = connector.DBConnector(*LoadDBEnv.load_db_env())
+    db.connect()
+    try:
+        return update(ServerJob(db))
+    finally:
+        db.close()
+
+class JobContext:
+    """
+    Handed to a running job. Output and progress are kept in memory and written to
+    tbl_server_job at most once per flush_interval.
+    """
+    def __init__(self, job_id: str, save, output_limit: int, flush_interval: float):
+        self.job_id = job_id
+        self.save = save
+        self.output_limit = output_limit
+        self.flush_interval = flush_interval
+        self.output = ""
+        self.progress = 0
+        self.last_flush = 0
+
+    def write(self, text: str):
+        self.output = (self.output + text)[-self.output_limit:]
+        self.flush()
+
+    def set_progress(self, progress: float):
+        self.progress = min(100, max(0, progress))
+        self.flush()
+
+    def flush(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.last_flush < self.flush_interval:
+            return
+        self.last_flush = now
+        self.save(lambda jobs: jobs.update_job(self.job_id, "running", self.progress, self.output))
+
+class JobQueue:
+    """
+    Bounded pool for long SSH operations. work(context) returns (status, result) where
+    result is the JSON body the synchronous endpoint used to return.
+    """
+    def __init__(self, max_workers: int = 4, max_pending: int = 64, output_limit: int = 1024 * 1024,
+                 flush_interval: float = 1, save=save_job):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="server-job")
+        # Running plus waiting jobs, submit refuses new work beyond this
+        self.slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self.output_limit = output_limit
+        self.flush_interval = flush_interval
+        self.save = save
+
+    def submit(self, server_id: str, username: str, action: str, work):
+        if not self.slots.acquire(blocking=False):
+            return None
+        job_id = secrets.token_urlsafe(16)
+        if not self.save(lambda jobs: jobs.create_job(job_id, server_id, username, action)):
+            self.slots.release()
+            return None
+        try:
+            self.executor.submit(self._run, job_id, work)
+        except RuntimeError as e:
+            print(f"Error submitting server job: {e}")
+            self.slots.release()
+            return None
+        return job_id
+
+    def _run(self, job_id: str, work):
+        context = JobContext(job_id, self.save, self.output_limit, self.flush_interval)
+        try:
+            context.flush(force=True)
+            status, result = work(context)
+        except Exception as e:
+            print(f"Error running server job {job_id}: {e}")
+            status, result = "failed", {"message": str(e)}
+        finally:
+            self.slots.release()
+        self.save(lambda jobs: jobs.finish_job(job_id, status, context.output, result))
+
+job_queue = JobQueue(
+    max_workers=int(os.environ.get("JOB_MAX_WORKERS", 4)),
+    max_pending=int(os.environ.get("JOB_QUEUE_SIZE", 64)),
+    output_limit=int(os.environ.get("JOB_OUTPUT_LIMIT", 1024 * 1024)),
+    flush_interval=float(os.environ.get("JOB_PROGRESS_INTERVAL", 1))
+)
+
+def _connect(server_info: dict, server_id: str):
+    server = ServerManager(server_info["hostname"], server_info["username"], server_info["password"], server_info["rsa_key"], server_id=server_id)
+    if not server.connect():
+        return None
+    return server
+
+def script_job(server_info: dict, server_id: str, script_path: str, args: tuple = (), required_paths: list = ()):
+    """
+    Job that deploys the script bundle and runs one script, capturing its output as
+    it arrives. required_paths are (remote path, error message) pairs checked first.
+    """
+    def work(context: JobContext):
+        server = _connect(server_info, server_id)
+        if server is None:
+            return "failed", {"message": "Can not connect server"}
+        stdout, stderr = [], []
+        try:
+            for remote_path, message in required_paths:
+                info = server.path_info(remote_path)
+                if info["error"]:
+                    return "failed", {"message": f"Can not check {remote_path} on server: {info['error']}"}
+                if not info["exists"]:
+                    return "failed", {"message": message}
+
+            script_directory = os.environ.get("SERVER_DIRECTORY")
+            if not save_job(lambda jobs: server.ensure_scripts_deployed(script_directory, ScriptManifest(jobs.db))):
+                return "failed", {"message": "Can not deploy scripts to server"}
+            file_in_server = f"{script_directory}/{server.get_file_name(script_path)}"
+
+            for event, data in server.stream_script_in_remote_server(file_in_server, *args):
+                if event == "stdout":
+                    stdout.append(data)
+                elif event == "stderr":
+                    stderr.append(data)
+                else:
+                    continue
+                context.write(data)
+        finally:
+            server.disconnect()
+
+        stdout, stderr = "".join(stdout), "".join(stderr)
+        if stdout:
+            return "succeeded", {"lines": stdout.split("\n")}
+        if stderr:
+            return "failed", {"stderr": stderr.split("\n")}
+        return "failed", {"message": "Something is wrong"}
+    return work
+
+def upload_folder_job(server_info: dict, server_id: str, local_filepath: str, remote_folder: str, sync: bool = False):
+    """
+    Job that extracts an uploaded zip file and copies the folder to the server,
+    reporting progress per uploaded file. With sync an existing remote folder is
+    updated in place instead of refused. The local files are removed afterwards.
+    """
+    def work(context: JobContext):
+        extracted_folder = os.path.splitext(os.path.basename(local_filepath))[0]
+        extract_path = os.path.join(os.path.dirname(local_filepath), extracted_folder)
+        try:
+            server = _connect(server_info, server_id)
+            if server is None:
+                return "failed", {"message": "Can not connect server"}
+            try:
+                if not sync:
+                    info = server.path_info(os.path.join(remote_folder, extracted_folder))
+                    if info["error"]:
+                        return "failed", {"message": f"Can not check folder on server: {info['error']}"}
+                    if info["exists"]:
+                        return "failed", {"message": "Folder exists on server"}
+
+                with zipfile.ZipFile(local_filepath, "r") as zip_ref:
+                    os.makedirs(extract_path, exist_ok=True)
+                    zip_ref.extractall(extract_path)
+
+                total = sum(len(files) for _, _, files in os.walk(extract_path)) or 1
+                uploaded = [0]
+                def progress(local_path):
+                    uploaded[0] += 1
+                    context.set_progress(uploaded[0] * 100 / total)
+
+                if sync:
+                    stats = server.sync_folder(extract_path, remote_folder, progress)
+                else:
+                    stats = server.upload_folder(extract_path, remote_folder, progress)
+            finally:
+                server.disconnect()
+        finally:
+            try:
+                os.remove(local_filepath)
+                shutil.rmtree(extract_path, ignore_errors=True)
+            except OSError as e:
+                print(f"Error deleting local file: {e}")
+        if stats is None or stats["errors"]:
+            return "failed", {"message": "Upload file failed", "transfer": stats}
+        return "succeeded", {"message": "Upload file success", "transfer": stats}
+    return work
@@ -0,0 +1,124 @@
+from datetime import datetime
+import numpy as np
+from scipy import stats
+
+# One firewall event per row, text fields as codes into UfwEvents.strings
+UFW_EVENT_DTYPE = np.dtype([("time", "f8"), ("src", "i4"), ("dst", "i4"), ("proto", "i4"),
+                            ("dpt", "i4"), ("action", "i4")])
+UFW_TEXT_FIELDS = ("src", "dst", "proto", "action")
+
+class UfwEvents:
+    """
+    Parsed ufw log lines as a NumPy structured array, so the aggregates below are
+    whole-column operations rather than loops over records. Built from LogSegments,
+    which own the encoding of parsed records.
+    """
+    def __init__(self, events: np.ndarray, strings: list):
+        self.events = events
+        self.strings = strings
+        self.lookup = {value: code for code, value in enumerate(strings)}
+
+    @classmethod
+    def from_segments(cls, segments: list):
+        """
+        Merge LogSegments of the ufw index, translating each segment's string codes
+        into one shared table.
+        """
+        lookup = {"": 0}
+        parts = []
+        for segment in segments:
+            translate = np.array([lookup.setdefault(value, len(lookup)) for value in segment.strings], dtype=np.int32)
+            events = np.empty(len(segment), dtype=UFW_EVENT_DTYPE)
+            events["time"] = segment.time
+            events["dpt"] = segment.port
+            for field in UFW_TEXT_FIELDS:
+                events[field] = translate[segment.codes[field]]
+            parts.append(events)
+        events = np.concatenate(parts) if parts else np.empty(0, dtype=UFW_EVENT_DTYPE)
+        return cls(events, list(lookup))
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def code(self, value: str) -> int:
+        return self.lookup.get(value, -1)
+
+    def select(self, start: float = None, end: float = None):
+        mask = np.ones(len(self.events), dtype=bool)
+        if start is not None:
+            mask &= self.events["time"] >= start
+        if end is not None:
+            mask &= self.events["time"] <= end
+        return UfwEvents(self.events[mask], self.strings)
+
+    def counts(self, field: str) -> dict:
+        counts = np.bincount(self.events[field], minlength=len(self.strings))
+        return {self.strings[code]: int(counts[code]) for code in np.flatnonzero(counts) if code != 0}
+
+    def top_talkers(self, top: int = 10) -> list:
+        """
+        Source IPs with the most events, with how many of those were blocked.
+        """
+        counts = np.bincount(self.events["src"], minlength=len(self.strings))
+        counts[0] = 0
+        blocked = np.bincount(self.events["src"][self.events["action"] == self.code("BLOCK")],
+                              minlength=len(self.strings))
+        return [{"ip": self.strings[code], "count": int(counts[code]), "blocked": int(blocked[code])}
+                for code in _top(counts, top)]
+
+    def port_histogram(self, top: int = 10, action: str = "BLOCK") -> list:
+        """
+        Destination ports hit by events of action (every action when None), most hit first.
+        """
+        mask = self.events["dpt"] >= 0
+        if action is not None:
+            mask &= self.events["action"] == self.code(action)
+        ports, counts = np.unique(self.events["dpt"][mask], return_counts=True)
+        return [{"port": int(ports[index]), "count": int(counts[index])} for index in _top(counts, top)]
+
+    def rate_series(self, interval: int = 60):
+        """
+        Events per interval seconds as (first bucket's unix time, counts), empty
+        buckets included. Events without a time are left out.
+        """
+        times = self.events["time"]
+        times = times[~np.isnan(times)]
+        if times.size == 0:
+            return None, np.zeros(0, dtype=np.int64)
+        buckets = (times // interval).astype(np.int64)
+        first = buckets.min()
+        return float(first * interval), np.bincount(buckets - first)
+
+    def bursts(self, interval: int = 60, threshold: float = 3.0) -> list:
+        """
+        Intervals whose event count is more than threshold standard deviations
+        above the mean of the series.
+        """
+        start, counts = self.rate_series(interval)
+        if counts.size < 2 or counts.std() == 0:
+            return []
+        scores = stats.zscore(counts)
+        return [{"time": datetime.fromtimestamp(start + index * interval).isoformat(),
+                 "count": int(counts[index]), "z": round(float(scores[index]), 2)}
+                for index in np.flatnonzero(scores > threshold)]
+
+    def summary(self, top: int = 10, interval: int = 60, threshold: float = 3.0) -> dict:
+        start, counts = self.rate_series(interval)
+        return {
+            "events": len(self.events),
+            "actions": self.counts("action"),
+            "protocols": self.counts("proto"),
+            "top_talkers": self.top_talkers(top),
+            "blocked_ports": self.port_histogram(top),
+            "rate": {
+                "start": None if start is None else datetime.fromtimestamp(start).isoformat(),
+                "interval": interval,
+                "counts": counts.tolist()
+            },
+            "bursts": self.bursts(interval, threshold)
+        }
+
+def _top(counts: np.ndarray, top: int) -> np.ndarray:
+    # Indices of the top largest non-zero counts, largest first; ties keep code order
+    candidates = np.flatnonzero(counts)
+    return candidates[np.argsort(-counts[candidates], kind="stable")[:top]]
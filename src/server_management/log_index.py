@@ -0,0 +1,244 @@
+from datetime import datetime, timedelta
+import functools
+import os
+import shutil
+import threading
+import numpy as np
+from ..cache import TTLCache
+from .log_parser import ufw_fields
+
+# Dictionary-encoded text columns; every segment has its own string table
+TEXT_COLUMNS = ("action", "src", "dst", "proto", "user", "tty")
+# Columns with an inverted index (value -> rows)
+INDEXED_COLUMNS = ("src", "dst", "user")
+UNDATED = "undated"
+
+@functools.lru_cache(maxsize=65536)
+def record_epoch(time: str) -> float:
+    try:
+        return datetime.fromisoformat(time).timestamp()
+    except (TypeError, ValueError):
+        return float("nan")
+
+def ufw_row(record: dict) -> dict:
+    # Records from parse_ufw_line carry only the kernel message, the fields are read here
+    if "action" not in record:
+        record = dict(record, **ufw_fields(record["log"]))
+    try:
+        port = int(record.get("dpt"))
+    except (TypeError, ValueError):
+        port = -1
+    return {"time": record_epoch(record.get("time")), "port": port, "action": record.get("action") or "",
+            "src": record.get("src") or "", "dst": record.get("dst") or "", "proto": record.get("proto") or "",
+            "user": "", "tty": ""}
+
+def lastlog_row(record: dict) -> dict:
+    user = record.get("user") or ""
+    return {"time": record_epoch(record.get("time")), "port": -1,
+            "action": user if user in ("reboot", "wtmp") else "login",
+            "src": record.get("from_ip") or "", "dst": "", "proto": "", "user": user, "tty": record.get("info") or ""}
+
+ROW_BUILDERS = {"ufw": ufw_row, "lastlog": lastlog_row}
+
+class LogSegment:
+    """
+    One time partition of a server's log in columns: float64 epoch times, int32 ports
+    and int32 codes into a shared string table, sorted by time. Indexed columns carry
+    a CSR-style inverted index: rows of value code c are order[offsets[c]:offsets[c + 1]].
+    """
+    def __init__(self, time: np.ndarray, port: np.ndarray, codes: dict, strings: list):
+        order = np.argsort(time, kind="stable")
+        self.time = time[order]
+        self.port = port[order]
+        self.codes = {column: codes[column][order] for column in TEXT_COLUMNS}
+        self.strings = list(strings)
+        self.lookup = {value: code for code, value in enumerate(self.strings)}
+        self.index = {}
+        for column in INDEXED_COLUMNS:
+            column_order = np.argsort(self.codes[column], kind="stable")
+            offsets = np.searchsorted(self.codes[column][column_order], np.arange(len(self.strings) + 1))
+            self.index[column] = (column_order.astype(np.int32), offsets.astype(np.int32))
+
+    @classmethod
+    def from_rows(cls, rows: list, strings: list = None):
+        strings = list(strings or [""])
+        lookup = {value: code for code, value in enumerate(strings)}
+
+        def encode(value):
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(strings)
+                strings.append(value)
+            return code
+
+        time = np.array([row["time"] for row in rows], dtype=np.float64)
+        port = np.array([row["port"] for row in rows], dtype=np.int32)
+        codes = {column: np.array([encode(row[column]) for row in rows], dtype=np.int32) for column in TEXT_COLUMNS}
+        return cls(time, port, codes, strings)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            codes = {column: data[column] for column in TEXT_COLUMNS}
+            return cls(data["time"], data["port"], codes, data["strings"].tolist())
+
+    def save(self, path: str):
+        with open(f"{path}.tmp", "wb") as segment_file:
+            np.savez(segment_file, time=self.time, port=self.port, strings=np.array(self.strings, dtype=str),
+                     **self.codes)
+        os.replace(f"{path}.tmp", path)
+
+    def extend(self, rows: list):
+        # New rows share this segment's string table, so existing codes stay valid
+        added = LogSegment.from_rows(rows, self.strings)
+        return LogSegment(np.concatenate([self.time, added.time]), np.concatenate([self.port, added.port]),
+                          {column: np.concatenate([self.codes[column], added.codes[column]]) for column in TEXT_COLUMNS},
+                          added.strings)
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def rows_with(self, column: str, value: str) -> np.ndarray:
+        code = self.lookup.get(value)
+        if code is None:
+            return np.empty(0, dtype=np.int32)
+        order, offsets = self.index[column]
+        return order[offsets[code]:offsets[code + 1]]
+
+    def select(self, start: float = None, end: float = None, ip: str = None, port: int = None,
+               user: str = None, action: str = None) -> np.ndarray:
+        """
+        Row numbers matching every given filter, in time order.
+        """
+        mask = np.ones(len(self.time), dtype=bool)
+        if ip is not None:
+            # Only the rows listed in the inverted index are considered
+            candidates = np.zeros(len(self.time), dtype=bool)
+            candidates[self.rows_with("src", ip)] = True
+            candidates[self.rows_with("dst", ip)] = True
+            mask &= candidates
+        if user is not None:
+            candidates = np.zeros(len(self.time), dtype=bool)
+            candidates[self.rows_with("user", user)] = True
+            mask &= candidates
+        if start is not None:
+            mask &= self.time >= start
+        if end is not None:
+            mask &= self.time <= end
+        if port is not None:
+            mask &= self.port == port
+        if action is not None:
+            code = self.lookup.get(action)
+            mask &= self.codes["action"] == (-1 if code is None else code)
+        return np.flatnonzero(mask)
+
+    def record(self, row: int) -> dict:
+        time = self.time[row]
+        record = {"time": None if np.isnan(time) else datetime.fromtimestamp(time).isoformat(),
+                  "port": int(self.port[row]) if self.port[row] >= 0 else None}
+        for column in TEXT_COLUMNS:
+            record[column] = self.strings[self.codes[column][row]] or None
+        return record
+
+class LogIndex:
+    """
+    Per-server columnar store of parsed log events under root/<server_id>/index/<kind>,
+    one segment file per day so time-range queries only open the days they cover.
+    """
+    def __init__(self, root: str, retention_days: int = 30, cache_size: int = 64):
+        self.root = root
+        self.retention_days = retention_days
+        # Loaded segments, keyed by path, modification time and size
+        self.segments = TTLCache(max_size=cache_size, ttl=None)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def lock(self, server_id: str, kind: str):
+        with self._locks_lock:
+            return self._locks.setdefault((server_id, kind), threading.Lock())
+
+    def _directory(self, server_id: str, kind: str) -> str:
+        return os.path.join(self.root, server_id, "index", kind)
+
+    def _load(self, path: str):
+        info = os.stat(path)
+        key = (path, info.st_mtime_ns, info.st_size)
+        segment = self.segments.get(key)
+        if segment is None:
+            segment = LogSegment.load(path)
+            self.segments.set(key, segment)
+        return segment
+
+    def ingest(self, server_id: str, kind: str, records: list):
+        rows = [ROW_BUILDERS[kind](record) for record in records]
+        if not rows:
+            return
+        partitions = {}
+        for row in rows:
+            day = UNDATED if np.isnan(row["time"]) else datetime.fromtimestamp(row["time"]).date().isoformat()
+            partitions.setdefault(day, []).append(row)
+        directory = self._directory(server_id, kind)
+        with self.lock(server_id, kind):
+            os.makedirs(directory, exist_ok=True)
+            for day, day_rows in partitions.items():
+                path = os.path.join(directory, f"{day}.npz")
+                if os.path.exists(path):
+                    segment = self._load(path).extend(day_rows)
+                else:
+                    segment = LogSegment.from_rows(day_rows)
+                segment.save(path)
+            self._prune(directory)
+
+    def replace(self, server_id: str, kind: str, records: list):
+        with self.lock(server_id, kind):
+            shutil.rmtree(self._directory(server_id, kind), ignore_errors=True)
+        self.ingest(server_id, kind, records)
+
+    def _prune(self, directory: str):
+        if not self.retention_days:
+            return
+        oldest = (datetime.now() - timedelta(days=self.retention_days)).date().isoformat()
+        for name in os.listdir(directory):
+            if name.endswith(".npz") and name[:-4] != UNDATED and name[:-4] < oldest:
+                os.remove(os.path.join(directory, name))
+
+    def partitions(self, server_id: str, kind: str, start: float = None, end: float = None) -> list:
+        directory = self._directory(server_id, kind)
+        try:
+            names = sorted(name[:-4] for name in os.listdir(directory) if name.endswith(".npz"))
+        except OSError:
+            return []
+        first = datetime.fromtimestamp(start).date().isoformat() if start is not None else None
+        last = datetime.fromtimestamp(end).date().isoformat() if end is not None else None
+        days = [day for day in names if day != UNDATED
+                and (first is None or day >= first) and (last is None or day <= last)]
+        if UNDATED in names and start is None and end is None:
+            days.append(UNDATED)
+        return [os.path.join(directory, f"{day}.npz") for day in days]
+
+    def segments_between(self, server_id: str, kind: str, start: float = None, end: float = None) -> list:
+        segments = []
+        for path in self.partitions(server_id, kind, start, end):
+            try:
+                segments.append(self._load(path))
+            except (OSError, ValueError) as e:
+                print(f"Error loading log segment '{path}': {e}")
+        return segments
+
+    def query(self, server_id: str, kind: str, start: float = None, end: float = None, ip: str = None,
+              port: int = None, user: str = None, action: str = None, offset: int = 0, limit: int = 100):
+        """
+        Matching events in time order as (total matches, records[offset:offset + limit]).
+        """
+        total = 0
+        records = []
+        for segment in self.segments_between(server_id, kind, start, end):
+            rows = segment.select(start, end, ip, port, user, action)
+            skip = max(0, offset - total)
+            for row in rows[skip:skip + max(0, limit - len(records))]:
+                records.append(segment.record(row))
+            total += len(rows)
+        return total, records
+
+log_index = LogIndex(os.path.join(os.environ.get("TMP_FOLDER") or "tmp", "log_store"),
+                     retention_days=int(os.environ.get("LOG_INDEX_RETENTION_DAYS", 30)))
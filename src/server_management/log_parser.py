@@ -0,0 +1,143 @@
+from datetime import date, datetime, timedelta
+import functools
+import re
+
+# bash `history`: "  42  ls -la"
+HISTORY_PATTERN = re.compile(r"\s*(?P<no>\d+)\s+(?P<command_line>.*)")
+
+# /var/log/ufw.log: "Jun  3 10:22:01 host kernel: [UFW BLOCK] IN=eth0 ... SRC=1.2.3.4 ..."
+# The host is lazily matched up to the first "kernel" so long lines need no backtracking
+UFW_PATTERN = re.compile(r"(?P<timestamp>\w+\s+\d+\s\d+:\d+:\d+)(?P<host>\s.*?\s)(?P<log>kernel.*)")
+# Netfilter always prints SRC, DST, PROTO, SPT, DPT in this order; one search reads them all
+UFW_FIELDS_PATTERN = re.compile(r"\[UFW (?P<action>\w+)\].*? SRC=(?P<src>\S*) DST=(?P<dst>\S*)"
+                                r"(?:.*? PROTO=(?P<proto>\S*))?(?:.*? SPT=(?P<spt>\S*))?(?:.*? DPT=(?P<dpt>\S*))?")
+UFW_ACTION_PATTERN = re.compile(r"\[UFW (\w+)\]")
+UFW_EMPTY_FIELDS = {"src": None, "dst": None, "proto": None, "spt": None, "dpt": None}
+
+# `last`: one alternation for login sessions, reboots and the "wtmp begins" trailer.
+# Each branch is wrapped in a named group so match.lastgroup tells which one matched.
+LASTLOG_PATTERN = re.compile(
+    r"(?P<session>(?P<s_user>\w+)\s+(?P<s_info>pts/\d+\s+)(?P<s_from>\S+)?\s+(?P<s_time>\S+\s+\S+\s+.+))$"
+    r"|(?P<reboot>(?P<r_user>reboot)\s+(?P<r_info>\S+\s+boot)\s+(?P<r_from>[^ ]+)(?:\s+|\t+)(?P<r_time>.+))$"
+    r"|(?P<wtmp>(?P<w_user>wtmp)\s(?P<w_info>begins)\s(?P<w_time>.*))$"
+)
+LASTLOG_TIME_PATTERN = re.compile(r"\w{3}\s+(\w{3})\s+(\d+)\s+(\d+:\d+(?::\d+)?)(?:\s+(\d{4}))?")
+
+MONTHS = {name: index for index, name in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1)}
+
+def iter_lines(chunks):
+    """
+    Yield the lines of a string, or of an iterable of text chunks as they arrive,
+    without building the whole list. Empty lines are dropped.
+    """
+    if isinstance(chunks, str):
+        chunks = (chunks,)
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            if line:
+                yield line.rstrip("\r")
+    if pending:
+        yield pending.rstrip("\r")
+
+def syslog_time(month: str, day: str, clock: str, year: str = None):
+    """
+    ISO 8601 form of a syslog-style date, or None. Lines of a log share few distinct
+    timestamps, so each one is converted once. Syslog has no year: a date more than a
+    day ahead of today belongs to last year.
+    """
+    # Today is part of the cache key so yearless dates are not reused across a new year
+    return _syslog_time(month, day, clock, year, None if year else date.today())
+
+@functools.lru_cache(maxsize=65536)
+def _syslog_time(month: str, day: str, clock: str, year: str, today: date):
+    try:
+        parts = clock.split(":")
+        value = datetime(int(year) if year else today.year, MONTHS[month], int(day),
+                         int(parts[0]), int(parts[1]), int(parts[2]) if len(parts) > 2 else 0)
+    except (KeyError, ValueError, IndexError):
+        return None
+    if year is None and value.date() > today + timedelta(days=1):
+        value = value.replace(year=value.year - 1)
+    return value.isoformat()
+
+def parse_history_line(line: str):
+    match = HISTORY_PATTERN.match(line)
+    if match is None:
+        return None
+    return {"no": match.group("no"), "command_line": match.group("command_line").strip()}
+
+def parse_ufw_line(line: str):
+    match = UFW_PATTERN.match(line)
+    if match is None:
+        return None
+    log = match.group("log").strip()
+    timestamp = match.group("timestamp")
+    record = {
+        "timestamp": timestamp,
+        "host": match.group("host").strip(),
+        "log": log,
+        "time": syslog_time(*timestamp.split())
+    }
+    return record
+
+def ufw_fields(log: str) -> dict:
+    """
+    action, src, dst, proto, spt and dpt of a ufw kernel message (the "log" of a
+    parsed line). Reports do not need them, so only the index and the analytics
+    pay for this search.
+    """
+    fields = UFW_FIELDS_PATTERN.search(log)
+    if fields is not None:
+        return fields.groupdict()
+    action = UFW_ACTION_PATTERN.search(log)
+    return dict(UFW_EMPTY_FIELDS, action=action.group(1) if action else None)
+
+def parse_lastlog_line(line: str):
+    match = LASTLOG_PATTERN.match(line)
+    if match is None:
+        return None
+    prefix = match.lastgroup[0]
+    timestamp = match.group(f"{prefix}_time").strip()
+    record = {
+        "user": match.group(f"{prefix}_user"),
+        "info": match.group(f"{prefix}_info").strip(),
+        "from_ip": (match.group(f"{prefix}_from") or "").strip() if prefix != "w" else "",
+        "timestamp": timestamp
+    }
+    time = LASTLOG_TIME_PATTERN.match(timestamp)
+    record["time"] = syslog_time(*time.groups()) if time else None
+    return record
+
+LOG_PARSERS = {
+    "history": parse_history_line,
+    "ufw": parse_ufw_line,
+    "lastlog": parse_lastlog_line
+}
+
+def parse_log(kind: str, lines):
+    """
+    Yield (record, None) for each line of kind's format that parses and
+    (None, line) for each line that does not, so callers can skip bad lines.
+    """
+    parse_line = LOG_PARSERS[kind]
+    for line in lines:
+        record = parse_line(line)
+        yield (record, None) if record is not None else (None, line)
+
+def parse_log_output(kind: str, chunks):
+    """
+    Parse script output (a string or text chunks) into (records, unparsed line count).
+    """
+    records = []
+    unparsed = 0
+    for record, _ in parse_log(kind, iter_lines(chunks)):
+        if record is None:
+            unparsed += 1
+        else:
+            records.append(record)
+    return records, unparsed
@@ -0,0 +1,209 @@
+from contextlib import contextmanager
+import fcntl
+import json
+import os
+import re
+from .log_parser import parse_log_output
+
+# Remote files read incrementally, by log type. lastlog comes from the binary wtmp,
+# which is only watched for changes and re-read with `last`.
+LOG_FILES = {
+    "ufw": os.environ.get("LOG_UFW_PATH", "/var/log/ufw.log"),
+    "history": os.environ.get("LOG_HISTORY_PATH", "~/.bash_history"),
+    "lastlog": os.environ.get("LOG_WTMP_PATH", "/var/log/wtmp")
+}
+HISTORY_TIMESTAMP_PATTERN = re.compile(r"#\d+$")
+
+class LogStore:
+    """
+    Parsed log records and the remote cursor of each (server, log type), kept on local
+    disk under root/<server_id>/logs as an append-only JSON lines file and a cursor file.
+    """
+    def __init__(self, root: str, max_records: int = 100000):
+        self.root = root
+        self.max_records = max_records
+
+    @contextmanager
+    def lock(self, server_id: str, kind: str):
+        """
+        Exclusive flock for one log, held across processes (and threads) sharing root.
+        The cursor file is swapped with os.replace, so a separate lock file is locked.
+        """
+        with open(self._path(server_id, kind, "lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _path(self, server_id: str, kind: str, suffix: str) -> str:
+        directory = os.path.join(self.root, server_id, "logs")
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{kind}.{suffix}")
+
+    def load_cursor(self, server_id: str, kind: str):
+        try:
+            with open(self._path(server_id, kind, "cursor.json"), encoding="utf-8") as cursor_file:
+                return json.load(cursor_file)
+        except (OSError, ValueError):
+            return None
+
+    def save_cursor(self, server_id: str, kind: str, cursor: dict):
+        path = self._path(server_id, kind, "cursor.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as cursor_file:
+            json.dump(cursor, cursor_file)
+        os.replace(f"{path}.tmp", path)
+
+    def append(self, server_id: str, kind: str, records: list, cursor: dict):
+        """
+        Append records and then move the cursor, so a crash in between re-reads
+        the same bytes rather than losing them.
+        """
+        path = self._path(server_id, kind, "jsonl")
+        with open(path, "a", encoding="utf-8") as records_file:
+            for record in records:
+                records_file.write(json.dumps(record) + "\n")
+        cursor["records"] = cursor.get("records", 0) + len(records)
+        if cursor["records"] > self.max_records:
+            kept = self.read(server_id, kind, self.max_records // 2)
+            self.replace(server_id, kind, kept, cursor)
+            return
+        self.save_cursor(server_id, kind, cursor)
+
+    def replace(self, server_id: str, kind: str, records: list, cursor: dict):
+        path = self._path(server_id, kind, "jsonl")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as records_file:
+            for record in records:
+                records_file.write(json.dumps(record) + "\n")
+        os.replace(f"{path}.tmp", path)
+        cursor["records"] = len(records)
+        self.save_cursor(server_id, kind, cursor)
+
+    def read(self, server_id: str, kind: str, limit: int = None) -> list:
+        try:
+            with open(self._path(server_id, kind, "jsonl"), encoding="utf-8") as records_file:
+                lines = records_file.readlines()
+        except OSError:
+            return []
+        if limit is not None:
+            lines = lines[-limit:] if limit > 0 else []
+        return [json.loads(line) for line in lines]
+
+def complete_lines(data: bytes):
+    # Only whole lines are consumed, a line still being written is read next time
+    end = data.rfind(b"\n") + 1
+    return data[:end].decode("utf-8", errors="replace"), end
+
+def read_log_end(server, kind: str, max_bytes: int):
+    """
+    Text of the last max_bytes of kind's remote log, from its first complete line,
+    or None when the file can not be read.
+    """
+    result = server.read_remote_log(LOG_FILES[kind], 0, 0)
+    if result is None:
+        return None
+    offset = max(0, result[1] - max_bytes)
+    result = server.read_remote_log(LOG_FILES[kind], offset, max_bytes)
+    if result is None:
+        return None
+    data = result[2]
+    if offset > 0:
+        data = data[data.find(b"\n") + 1:]
+    return complete_lines(data)[0]
+
+def tail_log(server, server_id: str, kind: str, store: LogStore, initial_bytes: int, max_bytes: int,
+             script_path: str = None, index=None):
+    """
+    Bring the local store of one log up to date with only the bytes written since the
+    last call, and the LogIndex index when given. lastlog needs the deployed script_path
+    that runs `last`. Returns (number of new records, unparsed lines) or None on error.
+
+    History records are numbered from the first line this store tailed, not from the
+    top of the file as `history` does, and the numbering restarts when bash rewrites
+    the file.
+    """
+    with store.lock(server_id, kind):
+        cursor = store.load_cursor(server_id, kind)
+        if kind == "lastlog":
+            return _refresh_lastlog(server, server_id, store, cursor, script_path, index)
+
+        offset = cursor["offset"] if cursor is not None else None
+        # Without a cursor only the size is needed to pick where to start
+        result = server.read_remote_log(LOG_FILES[kind], offset or 0, max_bytes if cursor is not None else 0)
+        if result is None:
+            return None
+        inode, size, data = result
+
+        if cursor is None or (kind == "history" and (cursor["inode"] != inode or size < offset)):
+            # First read, or bash rewrote its history file: start over near the end
+            if cursor is not None:
+                store.replace(server_id, kind, [], cursor)
+            cursor = {"inode": inode, "offset": max(0, size - initial_bytes), "lines": 0, "records": 0}
+        elif cursor["inode"] != inode or size < offset:
+            # Rotated or truncated: everything in the new file is new
+            cursor.update({"inode": inode, "offset": 0})
+            cursor.pop("overlong", None)
+
+        if cursor["offset"] != offset:
+            result = server.read_remote_log(LOG_FILES[kind], cursor["offset"], max_bytes)
+            if result is None:
+                return None
+            data = result[2]
+            if cursor["offset"] > 0:
+                # Started mid-file, drop the partial first line
+                start = data.find(b"\n") + 1
+                cursor["offset"] += start
+                data = data[start:]
+
+        if cursor.pop("overlong", False):
+            # Rest of the line skipped by the last call
+            start = data.find(b"\n") + 1
+            if start == 0:
+                start = len(data)
+                cursor["overlong"] = True
+            cursor["offset"] += start
+            data = data[start:]
+
+        text, consumed = complete_lines(data)
+        skipped = 0
+        if consumed == 0 and len(data) >= max_bytes:
+            # A line longer than max_bytes would hold the cursor here for good, skip it as unparsed
+            consumed, skipped = len(data), 1
+            cursor["overlong"] = True
+        cursor["offset"] += consumed
+
+        if kind == "history":
+            records, unparsed = [], 0
+            for line in text.split("\n"):
+                if not line or HISTORY_TIMESTAMP_PATTERN.match(line):
+                    continue
+                cursor["lines"] += 1
+                records.append({"no": str(cursor["lines"]), "command_line": line.strip()})
+        else:
+            records, unparsed = parse_log_output(kind, text)
+            if index is not None:
+                index.ingest(server_id, kind, records)
+        store.append(server_id, kind, records, cursor)
+        return len(records), unparsed + skipped
+
+def _refresh_lastlog(server, server_id: str, store: LogStore, cursor, script_path: str, index=None):
+    # wtmp is binary, its inode and size only tell whether `last` has anything new
+    result = server.read_remote_log(LOG_FILES["lastlog"], 0, 0)
+    if result is None:
+        return None
+    inode, size, _ = result
+    if cursor is not None and cursor["inode"] == inode and cursor["offset"] == size:
+        return 0, 0
+    output = server.execute_script_in_remote_server(script_path, compress=True)
+    if output is None:
+        return None
+    records, unparsed = parse_log_output("lastlog", output[0])
+    if index is not None:
+        index.replace(server_id, "lastlog", records)
+    store.replace(server_id, "lastlog", records, {"inode": inode, "offset": size})
+    return len(records), unparsed
+
+tail_initial_bytes = int(os.environ.get("LOG_TAIL_INITIAL_BYTES", 1024 * 1024))
+tail_max_bytes = int(os.environ.get("LOG_TAIL_MAX_BYTES", 16 * 1024 * 1024))
+log_store = LogStore(os.path.join(os.environ.get("TMP_FOLDER") or "tmp", "log_store"),
+                     max_records=int(os.environ.get("LOG_TAIL_MAX_RECORDS", 100000)))
@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+from .batch import run_batch_async
+from ..database import connector
+from ..database.load_env import LoadDBEnv
+from ..database.server import Server
+from ..database.server_metric import ServerMetric
+
+# Numeric fields printed by get_info.sh, one column per field in the time series
+METRIC_FIELDS = ("CPU_Percent", "RAM_Used_Bytes", "RAM_Total_Bytes", "Disk_Used_Bytes", "Disk_Total_Bytes")
+
+def sample_values(data: dict) -> np.ndarray:
+    values = np.full(len(METRIC_FIELDS), np.nan)
+    for index, field in enumerate(METRIC_FIELDS):
+        try:
+            values[index] = float(data[field])
+        except (KeyError, TypeError, ValueError):
+            pass
+    if np.isnan(values[0]):
+        # Scripts deployed before the numeric fields only report "12.3%"
+        try:
+            values[0] = float(str(data.get("CPU", "")).rstrip("%"))
+        except ValueError:
+            pass
+    return values
+
+class MetricSeries:
+    """
+    Samples of one server in columns: a float64 timestamp column, sorted, and one
+    float64 column per metric field (NaN where a sample lacked the field).
+    """
+    def __init__(self, timestamps: np.ndarray, values: np.ndarray):
+        self.timestamps = timestamps
+        self.values = values
+
+    @classmethod
+    def from_rows(cls, rows: list):
+        # Rows of (timestamp, *field values) ordered by timestamp, as ServerMetric returns them
+        array = np.array(rows, dtype=np.float64).reshape(len(rows), len(METRIC_FIELDS) + 1)
+        return cls(array[:, 0], array[:, 1:])
+
+    def range(self, start: float = None, end: float = None):
+        # Timestamps are sorted, so the window is found by binary search
+        low = 0 if start is None else np.searchsorted(self.timestamps, start, side="left")
+        high = len(self.timestamps) if end is None else np.searchsorted(self.timestamps, end, side="right")
+        return self.timestamps[low:high], self.values[low:high]
+
+    def downsample(self, start: float, end: float, buckets: int):
+        """
+        Mean, min and max per field over `buckets` equal time slices of [start, end].
+        Empty slices are NaN.
+        """
+        timestamps, values = self.range(start, end)
+        edges = np.linspace(start, end, buckets + 1)
+        index = np.clip(np.searchsorted(edges, timestamps, side="right") - 1, 0, buckets - 1)
+        counts = np.bincount(index, minlength=buckets).astype(float)
+        mean = np.full((buckets, len(METRIC_FIELDS)), np.nan)
+        low = np.full((buckets, len(METRIC_FIELDS)), np.nan)
+        high = np.full((buckets, len(METRIC_FIELDS)), np.nan)
+        for column in range(len(METRIC_FIELDS)):
+            column_values = values[:, column]
+            valid = ~np.isnan(column_values)
+            sums = np.bincount(index[valid], weights=column_values[valid], minlength=buckets)
+            valid_counts = np.bincount(index[valid], minlength=buckets)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean[:, column] = np.where(valid_counts > 0, sums / valid_counts, np.nan)
+            column_low = np.full(buckets, np.inf)
+            column_high = np.full(buckets, -np.inf)
+            np.minimum.at(column_low, index[valid], column_values[valid])
+            np.maximum.at(column_high, index[valid], column_values[valid])
+            low[:, column] = np.where(valid_counts > 0, column_low, np.nan)
+            high[:, column] = np.where(valid_counts > 0, column_high, np.nan)
+        return (edges[:-1] + edges[1:]) / 2, counts, mean, low, high
+
+class MetricsStore:
+    """
+    Metric samples of every server in tbl_server_metric, so all API processes see what
+    the one collector gathered. Created per request around its DBConnector.
+    """
+    def __init__(self, db: connector.DBConnector):
+        self.samples = ServerMetric(db)
+
+    def record(self, server_id: str, data: dict, timestamp: float = None) -> bool:
+        timestamp = time.time() if timestamp is None else timestamp
+        values = [None if np.isnan(value) else float(value) for value in sample_values(data)]
+        return self.samples.add_sample(server_id, timestamp, values, data)
+
+    def get_latest(self, server_id: str, max_age: float = None):
+        latest = self.samples.get_latest(server_id)
+        if latest is None or (max_age is not None and time.time() - latest[0] > max_age):
+            return None
+        return latest
+
+    def history(self, server_id: str, start: float = None, end: float = None, buckets: int = None):
+        """
+        JSON-ready samples of one server between start and end (unix seconds), either raw
+        or averaged into `buckets` slices with per-slice min and max. None on error.
+        """
+        if buckets:
+            end = time.time() if end is None else end
+            start = end - 3600 if start is None else start
+        rows = self.samples.get_samples(server_id, start, end)
+        if rows is None:
+            return None
+        series = MetricSeries.from_rows(rows)
+
+        def column(array, index):
+            return [None if np.isnan(value) else float(value) for value in array[:, index]]
+
+        if buckets:
+            centers, counts, mean, low, high = series.downsample(start, end, buckets)
+            return {
+                "timestamps": centers.tolist(),
+                "counts": counts.astype(int).tolist(),
+                "values": {field: {"mean": column(mean, i), "min": column(low, i), "max": column(high, i)}
+                           for i, field in enumerate(METRIC_FIELDS)}
+            }
+        return {
+            "timestamps": series.timestamps.tolist(),
+            "values": {field: column(series.values, i) for i, field in enumerate(METRIC_FIELDS)}
+        }
+
+    def prune(self, retention: float) -> bool:
+        return self.samples.delete_before(time.time() - retention)
+
+class MetricsCollector:
+    """
+    Polls every ACTIVE server with the get_info script every `interval` seconds,
+    at most max_concurrency at a time, and records the samples in tbl_server_metric.
+    Every API process may start one, but only the process holding the Postgres
+    advisory lock lock_key collects; the others retry taking it every interval, so a
+    new leader takes over when the old one's connection goes away.
+    """
+    def __init__(self, interval: float = 60, max_concurrency: int = 32, timeout: float = 30,
+                 retention: float = 86400, targets_ttl: float = 600, lock_key: int = 16016):
+        self.interval = interval
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retention = retention
+        self.targets_ttl = targets_ttl
+        self.lock_key = lock_key
+        self.thread = None
+        self.leader = None
+        self.targets = None
+        self.targets_loaded_at = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def ensure_started(self):
+        with self._lock:
+            if self.thread is None or not self.thread.is_alive():
+                self._stop.clear()
+                self.thread = threading.Thread(target=self.run, name="metrics-collector", daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                if self.is_leader():
+                    self.collect_once(self.leader)
+            except Exception as e:
+                print(f"Error collecting server metrics: {e}")
+            self._stop.wait(max(0, self.interval - (time.monotonic() - started)))
+        self.resign()
+
+    def is_leader(self) -> bool:
+        """
+        Whether this process holds the collector lock, trying to take it when not.
+        The lock lives as long as self.leader's own (unpooled) connection.
+        """
+        if self.leader is not None:
+            if self.leader.execute_query("SELECT 1"):
+                return True
+            # Connection lost, and the lock with it
+            self.resign()
+        db = connector.DBConnector(*LoadDBEnv.load_db_env(), pooled=False)
+        db.connect()
+        if db.conn is None:
+            return False
+        # Autocommit so the idle leader connection does not sit inside a transaction
+        db.conn.autocommit = True
+        result = db.execute_query("SELECT pg_try_advisory_lock(%s)", (self.lock_key,))
+        if not result or not result[0][0]:
+            db.close()
+            return False
+        print("This process collects server metrics")
+        self.leader = db
+        return True
+
+    def resign(self):
+        if self.leader is not None:
+            try:
+                self.leader.close()
+            except Exception as e:
+                print(f"Error closing metrics collector connection: {e}")
+            self.leader = None
+
+    def load_targets(self, db: connector.DBConnector) -> list:
+        # Credentials are decrypted once per targets_ttl, not on every poll
+        if self.targets is not None and time.monotonic() - self.targets_loaded_at < self.targets_ttl:
+            return self.targets
+        server_manager = Server(db)
+        targets = []
+        for server_id in server_manager.get_active_server_ids() or []:
+            server_info = server_manager.get_info_to_connect(server_id)
+            if server_info is not None:
+                targets.append(server_info)
+        self.targets = targets
+        self.targets_loaded_at = time.monotonic()
+        return targets
+
+    def collect_once(self, db: connector.DBConnector):
+        targets = self.load_targets(db)
+        store = MetricsStore(db)
+        script_path = os.environ.get("SCRIPT_PATH_GET_INFO")
+        script_directory = os.environ.get("SERVER_DIRECTORY")
+        for result in run_batch_async(targets, script_path, [], script_directory, self.timeout, self.max_concurrency):
+            if result.get("status") != "ok":
+                continue
+            try:
+                data = json.loads("\n".join(result["lines"]))
+            except ValueError:
+                continue
+            data["script_directory"] = script_directory
+            store.record(result["server_id"], data)
+        store.prune(self.retention)
+
+metrics_enabled = os.environ.get("METRICS_COLLECTOR_ENABLED", "true").lower() == "true"
+metrics_interval = float(os.environ.get("METRICS_INTERVAL", 60))
+metrics_collector = MetricsCollector(
+    interval=metrics_interval,
+    max_concurrency=int(os.environ.get("METRICS_MAX_CONCURRENCY", 32)),
+    timeout=float(os.environ.get("METRICS_SERVER_TIMEOUT", 30)),
+    retention=float(os.environ.get("METRICS_RETENTION", 86400)),
+    targets_ttl=float(os.environ.get("METRICS_TARGETS_TTL", 600)),
+    lock_key=int(os.environ.get("METRICS_LOCK_KEY", 16016))
+)
+
+if __name__ == "__main__":
+    # A dedicated collector process, for deployments whose API processes do not live long
+    metrics_collector.run()
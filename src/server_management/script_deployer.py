@@ -0,0 +1,44 @@
+import hashlib
+import os
+from dotenv import load_dotenv
+from ..cache import TTLCache
+
+load_dotenv()
+
+class ScriptFile:
+    def __init__(self, local_path: str, content: bytes):
+        self.local_path = local_path
+        self.name = os.path.basename(local_path)
+        self.content = content
+        self.digest = hashlib.sha256(content).hexdigest()
+
+def load_script_bundle() -> dict:
+    """
+    Read every SCRIPT_PATH_* script once, with CRLF normalized the same way
+    remove_carriage_return does, and hash it. Keyed by the remote file name.
+    """
+    bundle = {}
+    for env_name, local_path in sorted(os.environ.items()):
+        if not env_name.startswith("SCRIPT_PATH_") or not local_path:
+            continue
+        try:
+            with open(local_path, "rb") as script_file:
+                content = script_file.read().replace(b"\r\n", b"\n")
+        except OSError as e:
+            print(f"Error reading script '{local_path}': {e}")
+            continue
+        script = ScriptFile(local_path, content)
+        bundle[script.name] = script
+    return bundle
+
+script_bundle = load_script_bundle()
+
+# Deployed {script name: digest} per (server_id, script directory), plus the directory's
+# fingerprint when the manifest was saved
+FINGERPRINT_KEY = "__directory__"
+deployed_manifests = TTLCache(max_size=int(os.environ.get("SCRIPT_MANIFEST_CACHE_SIZE", 1024)),
+                              ttl=float(os.environ.get("SCRIPT_MANIFEST_CACHE_TTL", 3600)))
+
+def stale_scripts(manifest: dict) -> list:
+    manifest = manifest or {}
+    return [script for name, script in script_bundle.items() if manifest.get(name) != script.digest]
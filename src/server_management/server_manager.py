@@ -1,28 +1,165 @@
 import paramiko
 from getpass import getpass
+import codecs
+import hashlib
+import itertools
 import os
+import select
+import shlex
 import stat
+import time
 import zipfile
+import zlib
 import tempfile
+from .connection_pool import ssh_pool, ssh_pool_enabled
+from ..cache import TTLCache
+from .script_deployer import FINGERPRINT_KEY, deployed_manifests, script_bundle, stale_scripts
+from ..database import connector
+from ..database.load_env import LoadDBEnv
+from ..database.script_manifest import ScriptManifest
+from .transfer import FolderUploader
+
+def normalize_line_endings(chunks):
+    """
+    Turn CRLF into LF across a stream of byte chunks, including a CRLF split between
+    two chunks. Binary data (a NUL byte or invalid UTF-8 in the first chunk) is passed
+    through unchanged, the same files remove_carriage_return could not decode.
+    """
+    chunks = iter(chunks)
+    first = b""
+    for first in chunks:
+        if first:
+            break
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(first)
+        binary = b"\0" in first
+    except UnicodeDecodeError:
+        binary = True
+    if binary:
+        yield first
+        yield from chunks
+        return
+
+    pending_cr = False
+    for chunk in itertools.chain((first,), chunks):
+        if not chunk:
+            continue
+        if pending_cr:
+            chunk = b"\r" + chunk
+        pending_cr = chunk.endswith(b"\r")
+        if pending_cr:
+            chunk = chunk[:-1]
+        yield chunk.replace(b"\r\n", b"\n")
+    if pending_cr:
+        yield b"\r"
+
+def gzip_stream(chunks, level=6):
+    """
+    Gzip a stream of byte chunks on the fly, yielding compressed data as zlib emits it.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+class RawDecoder:
+    # Stands in for an incremental decoder when bytes are passed through as they are
+    def decode(self, data, final=False):
+        return data
+
+sftp_transfer_channels = int(os.environ.get("SFTP_TRANSFER_CHANNELS", 4))
+path_metadata_ttl = float(os.environ.get("PATH_METADATA_TTL", 5))
+# Script output streamed as a download: bytes read from the channel at a time, gzip level
+raw_log_chunk_size = int(os.environ.get("RAW_LOG_CHUNK_SIZE", 256 * 1024))
+raw_log_gzip_level = int(os.environ.get("RAW_LOG_GZIP_LEVEL", 6))
+# SSH transport compression for every connection; pays off on slow links, costs CPU on fast ones
+ssh_compression = os.environ.get("SSH_COMPRESSION", "false").lower() == "true"
+# Output of scripts run with compress=True is piped through gzip on the server
+# unless its last run printed less than the threshold
+remote_compress_enabled = os.environ.get("REMOTE_COMPRESS_ENABLED", "true").lower() == "true"
+remote_compress_threshold = int(os.environ.get("REMOTE_COMPRESS_THRESHOLD", 64 * 1024))
+remote_compress_level = int(os.environ.get("REMOTE_COMPRESS_LEVEL", 1))
+# Uncompressed output size of the last run, keyed by (server, script)
+script_output_sizes = TTLCache(max_size=4096, ttl=float(os.environ.get("REMOTE_COMPRESS_SIZE_TTL", 3600)))
+# Servers where gzip is missing
+gzip_unavailable = TTLCache(max_size=1024, ttl=3600)
+
+class ZipStreamBuffer:
+    """
+    Write-only file object for zipfile. It has no tell/seek, so zipfile writes
+    data descriptors after each entry instead of seeking back to patch headers.
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
 
 class ServerManager:
-    def __init__(self, hostname, username, password=None, private_key=None):
+    def __init__(self, hostname, username, password=None, private_key=None, server_id=None, timeout=None):
         self.hostname = hostname
         self.username = username
         self.password = password
         self.private_key = private_key
-        self.client = paramiko.SSHClient()
-        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-    def connect(self):  
+        # Seconds allowed for the handshake and for each remote script, None waits forever
+        self.timeout = timeout
+        # Servers known by id share a pooled transport instead of a new handshake per request
+        self.server_id = server_id
+        self.pooled = server_id is not None and ssh_pool_enabled
+        self.leased = False
+        # Created by connect, a pooled manager leases the shared client instead
+        self.client = None
+        # Path metadata for this connection, {path: (expires at, info)}
+        self.path_cache = {}
+        self.metadata_sftp = None
+
+    def connect(self):
+        if self.pooled:
+            client = ssh_pool.acquire(self.pool_key(), self.hostname, self._open_client)
+            if client is None:
+                return False
+            self.client = client
+            self.leased = True
+            return True
+        if self.client is None:
+            self.client = self._new_client()
+        return self._connect_client(self.client)
+
+    def pool_key(self):
+        return (self.server_id, ssh_pool.fingerprint(self.hostname, self.username, self.password, self.private_key))
+
+    def _new_client(self):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        return client
+
+    def _open_client(self):
+        client = self._new_client()
+        if not self._connect_client(client):
+            client.close()
+            return None
+        return client
+
+    def _connect_client(self, client):
         try:
             if self.private_key:
                 # Use private key authentication
                 private_key = paramiko.RSAKey(key=self.private_key)
-                self.client.connect(self.hostname, username=self.username, pkey=private_key)
+                client.connect(self.hostname, username=self.username, pkey=private_key, timeout=self.timeout, compress=ssh_compression)
             elif self.password:
                 # Use password authentication
-                self.client.connect(self.hostname, username=self.username, password=self.password)
+                client.connect(self.hostname, username=self.username, password=self.password, timeout=self.timeout, compress=ssh_compression)
             else:
                 print("No authentication method provided.")
                 return False
@@ -36,26 +173,198 @@ class ServerManager:
             print(f"Error: {e}")
             return False
 
-    def execute_script_in_remote_server(self, script_relative_path, *args):
+    def compress_remote_output(self, script_relative_path, compress):
+        """
+        Whether a run of the script should gzip its output on the server: only for
+        callers that opt in, and not when the last run printed less than the threshold.
+        """
+        if not compress or not remote_compress_enabled or gzip_unavailable.get(self.hostname):
+            return False
+        size = script_output_sizes.get((self.hostname, script_relative_path))
+        return size is None or size >= remote_compress_threshold
+
+    def script_command(self, script_full_path, compressed):
+        if not compressed:
+            return f"bash {script_full_path}"
+        # pipefail keeps the script's exit status rather than gzip's
+        return f"bash -c {shlex.quote(f'set -o pipefail; bash {script_full_path} | gzip -c -{remote_compress_level}')}"
+
+    def _compressed_run_failed(self, output_size, exit_status, stderr_data):
+        # gzip missing on the server: nothing on stdout, "gzip: command not found" and status 127
+        if output_size == 0 and exit_status == 127 and "gzip" in stderr_data:
+            print(f"gzip is not available on {self.hostname}, script output is sent uncompressed.")
+            gzip_unavailable.set(self.hostname, True)
+            return True
+        return False
+
+    def missing_deployed_script(self, script_relative_path, exit_status, output_size, stderr_data):
+        """
+        Directory of a bundled script that bash could not find (exit 127), or None.
+        exit_status None means it is not known.
+        """
+        if exit_status not in (127, None) or output_size or os.path.basename(script_relative_path) not in script_bundle:
+            return None
+        if f"{script_relative_path}: No such file or directory" not in stderr_data:
+            return None
+        return os.path.dirname(script_relative_path)
+
+    def execute_script_in_remote_server(self, script_relative_path, *args, compress=False, redeploy=True):
         try:
             # Construct the full path of the script on the server
             script_full_path = f"{script_relative_path} {' '.join(args)}"
+            compressed = self.compress_remote_output(script_relative_path, compress)
             
-            stdin, stdout, stderr = self.client.exec_command(f"bash {script_full_path}")
+            stdin, stdout, stderr = self.client.exec_command(self.script_command(script_full_path, compressed), timeout=self.timeout)
             # Execute script on the remote server
             
-            stdout.channel.recv_exit_status()
+            if self.timeout is not None and not stdout.channel.status_event.wait(self.timeout):
+                stdout.channel.close()
+                print(f"Script '{script_relative_path}' timed out after {self.timeout} seconds.")
+                return None
+            exit_status = stdout.channel.recv_exit_status()
             stderr.channel.recv_stderr_ready()
 
             # Read stdout and stderr
-            stdout_data = stdout.read().decode()
+            stdout_data = stdout.read()
             stderr_data = stderr.read().decode(encoding="utf-8")
+            if compressed:
+                if self._compressed_run_failed(len(stdout_data), exit_status, stderr_data):
+                    # Only read-only scripts opt in, so running it again is safe
+                    return self.execute_script_in_remote_server(script_relative_path, *args)
+                stdout_data = zlib.decompress(stdout_data, 31) if stdout_data else b""
+            script_directory = self.missing_deployed_script(script_relative_path, exit_status, len(stdout_data), stderr_data)
+            if redeploy and script_directory is not None and self.redeploy_scripts(script_directory):
+                # The script never ran, so running it once more is safe
+                return self.execute_script_in_remote_server(script_relative_path, *args, compress=compress, redeploy=False)
+            script_output_sizes.set((self.hostname, script_relative_path), len(stdout_data))
+            stdout_data = stdout_data.decode()
             
             # Return stdout and stderr data
             return stdout_data, stderr_data
         except Exception as e:
             print(f"Error executing script: {e}")
 
+    def stream_script_in_remote_server(self, script_relative_path, *args, chunk_size=32768, decode=True, compress=False,
+                                       inflate=True, redeploy=True):
+        """
+        Run a script and yield ("stdout" | "stderr", text) chunks as they arrive on the
+        channel, then ("exit", exit_status). Nothing is buffered beyond one chunk, except
+        up to 4 KB of stderr printed before any stdout, held back so that a run failing
+        because the script is missing can be redeployed and retried without a trace.
+        With decode=False the chunks are the raw bytes. With compress=True the output may
+        cross the connection gzipped, it is inflated here chunk by chunk; on a server
+        without gzip the script is run again uncompressed. With inflate=False as well,
+        gzipped output is yielded as the raw gzip bytes, announced by ("encoding", "gzip")
+        right before the first stdout chunk.
+        """
+        script_full_path = f"{script_relative_path} {' '.join(args)}"
+        compressed = self.compress_remote_output(script_relative_path, compress)
+        decompressor = zlib.decompressobj(31) if compressed else None
+        passthrough = compressed and not inflate
+        pending = []
+        trailer = b""
+        announced = False
+        received_bytes = 0
+        output_size = 0
+        held_stderr = []
+        held_size = 0
+        channel = self.client.get_transport().open_session()
+        decoders = {
+            "stdout": codecs.getincrementaldecoder("utf-8")(errors="replace") if decode else RawDecoder(),
+            "stderr": codecs.getincrementaldecoder("utf-8")(errors="replace") if decode else RawDecoder()
+        }
+        try:
+            channel.exec_command(self.script_command(script_full_path, compressed))
+            while True:
+                received = False
+                if channel.recv_ready():
+                    received = True
+                    data = channel.recv(chunk_size)
+                    received_bytes += len(data)
+                    if passthrough:
+                        pending.append(data)
+                        trailer = (trailer + data)[-4:]
+                        if output_size == 0:
+                            # Inflated only until the output proves non-empty, then passed on as is
+                            output_size = len(decompressor.decompress(data))
+                        text = b"".join(pending) if output_size else b""
+                    else:
+                        if decompressor is not None:
+                            data = decompressor.decompress(data)
+                        output_size += len(data)
+                        text = decoders["stdout"].decode(data)
+                    if text:
+                        for held in held_stderr:
+                            yield "stderr", held
+                        held_stderr = []
+                        if passthrough and not announced:
+                            announced = True
+                            yield "encoding", "gzip"
+                        pending = []
+                        yield "stdout", text
+                if channel.recv_stderr_ready():
+                    received = True
+                    text = decoders["stderr"].decode(channel.recv_stderr(chunk_size))
+                    if text and output_size == 0 and held_size < 4096:
+                        held_stderr.append(text)
+                        held_size += len(text)
+                    elif text:
+                        for held in held_stderr:
+                            yield "stderr", held
+                        held_stderr = []
+                        yield "stderr", text
+                if received:
+                    continue
+                if channel.exit_status_ready() and channel.eof_received:
+                    break
+                # The channel fd only signals stdout, so keep the wait short for stderr
+                select.select([channel], [], [], 0.2)
+
+            if passthrough:
+                if output_size == 0:
+                    output_size = len(decompressor.flush())
+                if output_size:
+                    # ISIZE, the uncompressed length modulo 2**32, ends the gzip stream
+                    output_size = max(output_size, int.from_bytes(trailer, "little"))
+                if output_size and pending:
+                    if not announced:
+                        yield "encoding", "gzip"
+                    yield "stdout", b"".join(pending)
+            elif decompressor is not None:
+                data = decompressor.flush()
+                output_size += len(data)
+                text = decoders["stdout"].decode(data)
+                if text:
+                    yield "stdout", text
+            exit_status = channel.recv_exit_status()
+            stderr_head = "".join(held if isinstance(held, str) else held.decode("utf-8", errors="replace")
+                                  for held in held_stderr)
+            script_directory = self.missing_deployed_script(script_relative_path, exit_status, output_size, stderr_head)
+            if redeploy and script_directory is not None and self.redeploy_scripts(script_directory):
+                channel.close()
+                yield from self.stream_script_in_remote_server(script_relative_path, *args, chunk_size=chunk_size,
+                                                               decode=decode, compress=compress, inflate=inflate,
+                                                               redeploy=False)
+                return
+
+            if compressed and self._compressed_run_failed(received_bytes, exit_status, stderr_head):
+                # Nothing was yielded yet and only read-only scripts opt in, so run it again plainly
+                channel.close()
+                yield from self.stream_script_in_remote_server(script_relative_path, *args, chunk_size=chunk_size,
+                                                               decode=decode, redeploy=redeploy)
+                return
+
+            for held in held_stderr:
+                yield "stderr", held
+            for stream, decoder in decoders.items():
+                text = decoder.decode(b"", final=True)
+                if text:
+                    yield stream, text
+            script_output_sizes.set((self.hostname, script_relative_path), output_size)
+            yield "exit", exit_status
+        finally:
+            channel.close()
+
     def grant_permission(self, script_relative_path, role):
         try:
             # Execute script on the remote server
@@ -67,36 +376,61 @@ class ServerManager:
         except Exception as e:
             print(f"Error executing script: {e}")
 
-    def check_script_exists_on_remote(self, remote_file_path):
+    def path_info(self, remote_path, use_cache=True):
+        """
+        Existence, type ("file", "directory" or "other"), size, mode and mtime of a
+        remote path from one SFTP stat. Symlinks are followed, so a link reports its
+        target. When the path can not be checked (permission denied, connection lost)
+        "exists" is None and "error" carries the reason. Successful results are cached
+        on this connection for PATH_METADATA_TTL seconds and dropped whenever this
+        manager writes remotely.
+        """
+        now = time.monotonic()
+        cached = self.path_cache.get(remote_path)
+        if use_cache and cached is not None and cached[0] > now:
+            return cached[1]
+
+        info = {"exists": False, "type": None, "size": None, "mode": None, "mtime": None, "error": None}
+        # SFTP paths are relative to the home directory already, "~" is a shell expansion
+        sftp_path = remote_path[2:] if remote_path.startswith("~/") else remote_path
         try:
-            # Check if the remote script file exists
-            stdin, stdout, stderr = self.client.exec_command(f'stat {remote_file_path}')
-            
-            # Read the output stream to get the command result
-            output = stdout.read().decode().strip()
-            error = stderr.read().decode().strip()
-            if error:
-                return "No such file or directory" not in error
-            return "No such file or directory" not in output
-
+            if self.metadata_sftp is None:
+                self.metadata_sftp = self.client.open_sftp()
+            attributes = self.metadata_sftp.stat(sftp_path)
+            if stat.S_ISDIR(attributes.st_mode):
+                path_type = "directory"
+            elif stat.S_ISREG(attributes.st_mode):
+                path_type = "file"
+            else:
+                path_type = "other"
+            info = {
+                "exists": True,
+                "type": path_type,
+                "size": attributes.st_size,
+                "mode": stat.S_IMODE(attributes.st_mode),
+                "mtime": attributes.st_mtime,
+                "error": None
+            }
+        except FileNotFoundError:
+            pass
         except Exception as e:
-            print(f"Error in checking script: {e}")
-            return False
-        
-    def check_file_type(self, remote_file_path):
-        try:
-            stdin, stdout, stderr = self.client.exec_command(f'ls -ld {remote_file_path}')
-            type_output = stdout.read().decode().strip().split()[0]
+            print(f"Error in checking path: {e}")
+            return dict(info, exists=None, error=str(e) or type(e).__name__)
 
-            # Check first character of type output (could differ based on system)
-            if type_output[0] == "d":
-                return True, "directory"
-            else:
-                return True, "file"
+        self.path_cache[remote_path] = (now + path_metadata_ttl, info)
+        return info
 
-        except Exception as e:
-            print(f"Error in checking script: {e}")
+    def invalidate_path_info(self):
+        self.path_cache.clear()
+
+    def check_script_exists_on_remote(self, remote_file_path):
+        return self.path_info(remote_file_path)["exists"]
+        
+    def check_file_type(self, remote_file_path):
+        info = self.path_info(remote_file_path)
+        if not info["exists"]:
             return False, None
+        return True, "directory" if info["type"] == "directory" else "file"
       
     def execute_script(self, script_path, *args):
         try:
@@ -141,6 +475,88 @@ class ServerManager:
         except Exception as e:
             print(f"Error executing script: {e}")
 
+    def ensure_scripts_deployed(self, script_directory, manifest_store=None):
+        """
+        Push every bundled script whose hash differs from what this server last
+        received, in one SFTP session. Up-to-date servers cost no SSH round trip.
+        """
+        cache_key = (self.server_id, script_directory)
+        manifest = None
+        if self.server_id is not None:
+            manifest = deployed_manifests.get(cache_key)
+            if manifest is None and manifest_store is not None:
+                manifest = manifest_store.get_manifest(self.server_id, script_directory)
+                # Checked once per cache lifetime: a reinstalled server or a wiped directory
+                # no longer matches the fingerprint recorded with the manifest
+                if manifest is not None and manifest.get(FINGERPRINT_KEY) != self.directory_fingerprint(script_directory):
+                    print(f"'{script_directory}' changed since scripts were deployed, deploying again.")
+                    manifest = None
+
+        stale = stale_scripts(manifest)
+        if stale:
+            if not self.upload_script_bundle(stale, script_directory):
+                return False
+            manifest = dict(manifest or {})
+            manifest.update({script.name: script.digest for script in stale})
+            if self.server_id is not None and manifest_store is not None:
+                manifest[FINGERPRINT_KEY] = self.directory_fingerprint(script_directory)
+                manifest_store.save_manifest(self.server_id, script_directory, manifest)
+
+        if self.server_id is not None:
+            deployed_manifests.set(cache_key, manifest)
+        return True
+
+    def directory_fingerprint(self, remote_directory):
+        # "inode mtime" of the directory, None when it is missing or can not be read
+        try:
+            stdin, stdout, stderr = self.client.exec_command(f"stat -L -c '%i %Y' -- {shlex.quote(remote_directory)}",
+                                                             timeout=self.timeout)
+            fingerprint = stdout.read().decode().strip()
+            return fingerprint or None
+        except Exception as e:
+            print(f"Error: {e}")
+            return None
+
+    def redeploy_scripts(self, script_directory):
+        """
+        Scripts recorded as deployed are missing on the server: forget the cached and
+        stored manifest and push the whole bundle again.
+        """
+        print(f"Scripts are missing from '{script_directory}', deploying again.")
+        if self.server_id is None:
+            return self.ensure_scripts_deployed(script_directory)
+        deployed_manifests.pop((self.server_id, script_directory))
+        db = connector.DBConnector(*LoadDBEnv.load_db_env())
+        db.connect()
+        try:
+            manifest_store = ScriptManifest(db)
+            manifest_store.delete_manifest(self.server_id, script_directory)
+            return self.ensure_scripts_deployed(script_directory, manifest_store)
+        finally:
+            db.close()
+
+    def upload_script_bundle(self, scripts, remote_directory):
+        self.invalidate_path_info()
+        try:
+            sftp = self.client.open_sftp()
+            try:
+                try:
+                    sftp.stat(remote_directory)
+                except FileNotFoundError:
+                    sftp.mkdir(remote_directory)
+                for script in scripts:
+                    remote_path = f"{remote_directory}/{script.name}"
+                    with sftp.open(remote_path, "wb") as remote_file:
+                        remote_file.write(script.content)
+                    sftp.chmod(remote_path, 0o700)
+            finally:
+                sftp.close()
+            print(f"Deployed {len(scripts)} script(s) to '{remote_directory}'.")
+            return True
+        except Exception as e:
+            print(f"Error deploying scripts: {e}")
+            return False
+
     def get_file_name(self, file_path):
         return os.path.basename(file_path)
 
@@ -159,6 +575,7 @@ class ServerManager:
             print(f"Error: {e}")
 
     def upload_file_to_remote(self, local_file_path, remote_file_path):
+        self.invalidate_path_info()
         try:
             self.remove_carriage_return(local_file_path)
 
@@ -175,7 +592,42 @@ class ServerManager:
         except Exception as e:
             print(f"Error: {e}")
        
+    def upload_stream_to_remote(self, chunks, remote_file_path, normalize_newlines=False, buffer_size=1024 * 1024):
+        """
+        Write an iterable of byte chunks straight into a remote file, without a local
+        copy. Writes are pipelined, so SFTP acknowledgements are not waited on per block.
+        The data goes to "<remote_file_path>.part", renamed into place after the last
+        chunk, so a failed upload leaves nothing behind at remote_file_path.
+        """
+        self.invalidate_path_info()
+        part_path = f"{remote_file_path}.part"
+        sftp = None
+        try:
+            if normalize_newlines:
+                chunks = normalize_line_endings(chunks)
+            sftp = self.client.open_sftp()
+            with sftp.open(part_path, "wb", bufsize=buffer_size) as remote_file:
+                remote_file.set_pipelined(True)
+                for chunk in chunks:
+                    remote_file.write(chunk)
+            sftp.posix_rename(part_path, remote_file_path)
+
+            print(f"Stream uploaded to '{remote_file_path}' successfully.")
+            return True
+        except Exception as e:
+            print(f"Error: {e}")
+            if sftp is not None:
+                try:
+                    sftp.remove(part_path)
+                except Exception as remove_error:
+                    print(f"Error removing partial upload '{part_path}': {remove_error}")
+            return False
+        finally:
+            if sftp is not None:
+                sftp.close()
+
     def create_remote_directory_if_not_exists(self, remote_directory):
+        self.invalidate_path_info()
         try:
             # Check if the directory exists
             sftp = self.client.open_sftp()
@@ -190,43 +642,194 @@ class ServerManager:
 
     def download_file_from_remote(self, remote_file_path, local_file_path):
         try:
-            # Download the file from the remote server
-            sftp = self.client.open_sftp()
+            # Download the file from the remote server, continuing a partial local copy
             file_name = self.get_file_name(remote_file_path)
             local_file_path = f"{local_file_path}/{file_name}"
 
-            sftp.get(remote_file_path, local_file_path)
+            if self.download_file_resumable(remote_file_path, local_file_path):
+                print(f"File '{remote_file_path}' downloaded to '{local_file_path}' successfully.")
+            else:
+                print(f"Error: checksum of '{local_file_path}' does not match '{remote_file_path}'")
+
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def download_file_resumable(self, remote_file_path, local_file_path, chunk_size=4 * 1024 * 1024):
+        """
+        Download into local_file_path starting after the bytes already there, hashing as
+        data arrives. A result that does not match the remote sha256sum is downloaded
+        again from the start once.
+        """
+        for attempt in range(2):
+            offset = os.path.getsize(local_file_path) if attempt == 0 and os.path.exists(local_file_path) else 0
+            digest = hashlib.sha256()
+            if offset:
+                with open(local_file_path, "rb") as local_file:
+                    for data in iter(lambda: local_file.read(chunk_size), b""):
+                        digest.update(data)
+            with open(local_file_path, "ab" if offset else "wb") as local_file:
+                for data in self.read_remote_range(remote_file_path, offset, chunk_size=chunk_size):
+                    local_file.write(data)
+                    digest.update(data)
+            if digest.hexdigest() == self.remote_sha256(remote_file_path):
+                return True
+        return False
+
+    def read_remote_range(self, remote_file_path, start=0, end=None, chunk_size=4 * 1024 * 1024):
+        """
+        Yield the bytes of a remote file from start up to end (exclusive). Each window of
+        chunk_size is fetched with pipelined requests, so memory stays at one window.
+        """
+        sftp = self.client.open_sftp()
+        try:
+            with sftp.open(remote_file_path, "rb") as remote_file:
+                if end is None:
+                    end = remote_file.stat().st_size
+                offset = start
+                while offset < end:
+                    window = min(chunk_size, end - offset)
+                    for data in remote_file.readv([(offset, window)]):
+                        if not data:
+                            return
+                        yield data
+                    offset += window
+        finally:
             sftp.close()
 
-            print(f"File '{remote_file_path}' downloaded to '{local_file_path}' successfully.")
+    def write_remote_chunk(self, remote_file_path, offset, chunks, buffer_size=1024 * 1024):
+        """
+        Write byte chunks into a remote file at offset with pipelined writes. Returns
+        (bytes written, sha256 of the written bytes) computed as the data streams.
+        """
+        self.invalidate_path_info()
+        digest = hashlib.sha256()
+        written = 0
+        sftp = self.client.open_sftp()
+        try:
+            with sftp.open(remote_file_path, "r+b" if offset else "wb", bufsize=buffer_size) as remote_file:
+                remote_file.seek(offset)
+                remote_file.set_pipelined(True)
+                for chunk in chunks:
+                    remote_file.write(chunk)
+                    digest.update(chunk)
+                    written += len(chunk)
+        finally:
+            sftp.close()
+        return written, digest.hexdigest()
 
+    def truncate_remote_file(self, remote_file_path, size):
+        self.invalidate_path_info()
+        try:
+            sftp = self.client.open_sftp()
+            try:
+                sftp.truncate(remote_file_path, size)
+            finally:
+                sftp.close()
+            return True
         except Exception as e:
             print(f"Error: {e}")
+            return False
 
-    def upload_folder(self, local_folder, remote_folder):
+    def rename_remote_file(self, remote_file_path, new_remote_file_path):
+        self.invalidate_path_info()
         try:
             sftp = self.client.open_sftp()
-            for root, dirs, files in os.walk(local_folder):
-                # Construct the remote directory path
-                remote_dir = f"{remote_folder}{os.path.basename(local_folder)}"
-      
-                if os.path.basename(remote_dir) not in sftp.listdir(os.path.dirname(remote_dir)):
-                    # Create the remote directory if it doesn't exist
-                    sftp.mkdir(remote_dir)
-
-                for file in files:
-                    if os.path.dirname(os.path.join(root, file)) == local_folder:
-                        local_path = f"{local_folder}/{os.path.basename(file)}"
-                        remote_path = f"{remote_dir}/{os.path.basename(file)}"
-                        # Upload the file
-                        sftp.put(local_path, remote_path)
-                # Recursively upload subfolders
-                for subdir in dirs:
-                    self.upload_folder(f"{local_folder}/{subdir}", f"{remote_dir}/")
-            sftp.close()
+            try:
+                sftp.posix_rename(remote_file_path, new_remote_file_path)
+            finally:
+                sftp.close()
+            return True
+        except Exception as e:
+            print(f"Error: {e}")
+            return False
+
+    def remote_sha256(self, remote_file_path, offset=0, length=None):
+        """
+        sha256 hex digest computed on the server with sha256sum, of the whole file or of
+        length bytes starting at offset. None when it could not be computed.
+        """
+        path = shlex.quote(remote_file_path)
+        if offset or length is not None:
+            command = f"tail -c +{int(offset) + 1} -- {path}"
+            if length is not None:
+                command += f" | head -c {int(length)}"
+            command += " | sha256sum"
+        else:
+            command = f"sha256sum -- {path}"
+        try:
+            _, stdout, _ = self.client.exec_command(command)
+            output = stdout.read().decode().split()
+            if stdout.channel.recv_exit_status() != 0 or not output:
+                return None
+            return output[0]
+        except Exception as e:
+            print(f"Error: {e}")
+            return None
+
+    def read_remote_log(self, remote_file_path, offset=0, max_bytes=None):
+        """
+        Inode, size and the bytes from offset on (at most max_bytes) of a remote file,
+        in one round trip, as (inode, size, data). max_bytes=0 only stats the file.
+        None when the file can not be read.
+        """
+        if remote_file_path.startswith("~/"):
+            path = '"$HOME"/' + shlex.quote(remote_file_path[2:])
+        else:
+            path = shlex.quote(remote_file_path)
+        command = f"stat -L -c '%i %s' -- {path}"
+        if max_bytes != 0:
+            command += f" && tail -c +{int(offset) + 1} -- {path}"
+            if max_bytes is not None:
+                command += f" | head -c {int(max_bytes)}"
+        try:
+            _, stdout, _ = self.client.exec_command(command)
+            output = stdout.read()
+            if stdout.channel.recv_exit_status() != 0:
+                return None
+            header, _, data = output.partition(b"\n")
+            inode, size = header.split()
+            return inode.decode(), int(size), data
+        except Exception as e:
+            print(f"Error: {e}")
+            return None
+
+    def upload_folder(self, local_folder, remote_folder, progress=None):
+        """
+        Upload local_folder into remote_folder over several SFTP channels. progress, when
+        given, is called with each local path once it has been uploaded. Returns the
+        transfer stats as a dict, or None when the upload could not run.
+        """
+        self.invalidate_path_info()
+        try:
+            local_folder = local_folder.rstrip("/\\")
+            remote_root = f"{remote_folder}{os.path.basename(local_folder)}"
+            uploader = FolderUploader(self.client, sftp_transfer_channels)
+            stats = uploader.upload(local_folder, remote_root, progress).as_dict()
+            print(f"Uploaded {stats['files']} files ({stats['bytes']} bytes) to '{remote_root}' "
+                  f"in {stats['elapsed']}s, {stats['throughput']} bytes/s.")
+            return stats
         except Exception as e:
             print(f"Error: {e}")
+            return None
  
+    def sync_folder(self, local_folder, remote_folder, progress=None, delete=True):
+        """
+        Like upload_folder, but only files that are new or differ from the copy already on
+        the server are sent, and with delete remote files missing locally are removed.
+        """
+        self.invalidate_path_info()
+        try:
+            local_folder = local_folder.rstrip("/\\")
+            remote_root = f"{remote_folder}{os.path.basename(local_folder)}"
+            uploader = FolderUploader(self.client, sftp_transfer_channels)
+            stats = uploader.sync(local_folder, remote_root, progress, delete).as_dict()
+            print(f"Synced '{remote_root}': {stats['files']} uploaded ({stats['bytes']} bytes), "
+                  f"{stats['skipped']} unchanged, {stats['deleted']} deleted in {stats['elapsed']}s.")
+            return stats
+        except Exception as e:
+            print(f"Error: {e}")
+            return None
+
     def download_folder(self, remote_folder, local_zip_file):
         try:
             sftp = self.client.open_sftp()
@@ -253,6 +856,62 @@ class ServerManager:
         except Exception as e:
             print(f"Error: {e}")
 
+    def stream_folder_as_zip(self, remote_folder, chunk_size=1024 * 1024):
+        """
+        Yield a zip archive of remote_folder piece by piece while the remote files are
+        read, so nothing is staged on local disk. Entry names are relative to the folder.
+        """
+        sftp = self.client.open_sftp()
+        buffer = ZipStreamBuffer()
+        try:
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
+                pending = [(remote_folder.rstrip("/"), "")]
+                while pending:
+                    remote_dir, relative_dir = pending.pop()
+                    for entry in sftp.listdir_attr(remote_dir):
+                        remote_path = f"{remote_dir}/{entry.filename}"
+                        relative_path = f"{relative_dir}{entry.filename}"
+                        if stat.S_ISDIR(entry.st_mode):
+                            pending.append((remote_path, f"{relative_path}/"))
+                            continue
+
+                        date_time = time.localtime(entry.st_mtime)[:6] if entry.st_mtime else (1980, 1, 1, 0, 0, 0)
+                        zinfo = zipfile.ZipInfo(relative_path, date_time=max(date_time, (1980, 1, 1, 0, 0, 0)))
+                        zinfo.compress_type = zipfile.ZIP_DEFLATED
+                        zinfo.external_attr = (entry.st_mode & 0xFFFF) << 16
+                        # Known up front so zipfile picks ZIP64 headers for large files
+                        zinfo.file_size = entry.st_size or 0
+                        with sftp.open(remote_path, "rb") as remote_file, zipf.open(zinfo, "w") as dest:
+                            # One window of pipelined reads at a time rather than prefetching the
+                            # whole file, so memory stays bounded however slow the client is
+                            offset = 0
+                            while offset < zinfo.file_size:
+                                window = min(chunk_size, zinfo.file_size - offset)
+                                read = 0
+                                for data in remote_file.readv([(offset, window)]):
+                                    dest.write(data)
+                                    read += len(data)
+                                offset += read
+                                if buffer.chunks:
+                                    yield buffer.drain()
+                                if read < window:
+                                    break
+                            # Whatever was appended after the listing
+                            remote_file.seek(offset)
+                            while True:
+                                data = remote_file.read(chunk_size)
+                                if not data:
+                                    break
+                                dest.write(data)
+                                if buffer.chunks:
+                                    yield buffer.drain()
+                        if buffer.chunks:
+                            yield buffer.drain()
+            # Central directory
+            yield buffer.drain()
+        finally:
+            sftp.close()
+
     def _download_recursive(self, sftp, remote_folder, local_folder):
         # Download all files and directories from the remote folder to the local folder
         for entry in sftp.listdir_attr(remote_folder):
@@ -266,6 +925,28 @@ class ServerManager:
                 # If it's a file, download it to the local directory
                 sftp.get(remote_path, local_path)
 
-    def disconnect(self):
-        self.client.close()
-        print("Disconnected from the server.")
\ No newline at end of file
+    def disconnect(self, discard=False):
+        self.invalidate_path_info()
+        if self.metadata_sftp is not None:
+            try:
+                self.metadata_sftp.close()
+            except Exception as e:
+                print(f"Error: {e}")
+            self.metadata_sftp = None
+        if self.client is None:
+            # Already disconnected; the pooled transport may now belong to another request
+            return
+        client = self.client
+        self.client = None
+        if self.leased:
+            # Keep the transport alive for the next request, only hand back the lease
+            self.leased = False
+            ssh_pool.release(self.pool_key(), self.hostname, client, discard=discard)
+            return
+        client.close()
+        print("Disconnected from the server.")
+
+    def __del__(self):
+        # Endpoints that return early without disconnect() must not hold a pool slot forever
+        if getattr(self, "leased", False):
+            self.disconnect()
\ No newline at end of file
@@ -0,0 +1,284 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import shlex
+import threading
+import time
+
+# Remote command lines stay well below ARG_MAX when directories are created in batches
+MKDIR_BATCH_BYTES = 64 * 1024
+
+def plan_upload(local_folder: str, remote_root: str):
+    """
+    Walk local_folder once and return (remote directories, [(local path, remote path, size)]).
+    Directories are listed parents first; files are ordered largest first so big files
+    start early and small ones fill in the gaps across channels.
+    """
+    local_folder = local_folder.rstrip("/\\")
+    directories = [remote_root]
+    files = []
+    for root, dirs, names in os.walk(local_folder):
+        dirs.sort()
+        relative = os.path.relpath(root, local_folder)
+        remote_dir = remote_root if relative == "." else f"{remote_root}/{relative.replace(os.sep, '/')}"
+        if relative != ".":
+            directories.append(remote_dir)
+        for name in names:
+            local_path = os.path.join(root, name)
+            files.append((local_path, f"{remote_dir}/{name}", os.path.getsize(local_path)))
+    files.sort(key=lambda item: item[2], reverse=True)
+    return directories, files
+
+def mkdir_commands(directories: list, batch_bytes: int = MKDIR_BATCH_BYTES) -> list:
+    return batched_commands("mkdir -p", directories, batch_bytes)
+
+def batched_commands(command: str, paths: list, batch_bytes: int = MKDIR_BATCH_BYTES) -> list:
+    commands = []
+    batch = []
+    size = 0
+    for path in paths:
+        quoted = shlex.quote(path)
+        if batch and size + len(quoted) > batch_bytes:
+            commands.append(f"{command} -- " + " ".join(batch))
+            batch, size = [], 0
+        batch.append(quoted)
+        size += len(quoted) + 1
+    if batch:
+        commands.append(f"{command} -- " + " ".join(batch))
+    return commands
+
+def remote_listing_command(remote_root: str) -> str:
+    """
+    One command printing "size mtime path" for every file under remote_root.
+    Prints nothing when remote_root does not exist yet.
+    """
+    root = shlex.quote(remote_root)
+    return f"if [ -d {root} ]; then cd {root} && find . -type f -printf '%s %T@ %P\\n'; fi"
+
+def remote_hash_commands(remote_root: str, paths: list, batch_bytes: int = MKDIR_BATCH_BYTES) -> list:
+    """
+    sha256sum commands for the given paths relative to remote_root, batched like mkdir_commands.
+    """
+    return batched_commands(f"cd {shlex.quote(remote_root)} && sha256sum", [f"./{path}" for path in paths], batch_bytes)
+
+def parse_remote_listing(output: str) -> dict:
+    files = {}
+    for line in output.splitlines():
+        parts = line.split(" ", 2)
+        if len(parts) == 3:
+            files[parts[2]] = {"size": int(parts[0]), "mtime": float(parts[1]), "sha256": None}
+    return files
+
+def parse_remote_hashes(output: str, remote_files: dict):
+    """
+    Fill in the sha256 of remote_files from sha256sum output.
+    """
+    for line in output.splitlines():
+        digest, _, path = line.partition("  ")
+        if path.startswith("./"):
+            path = path[2:]
+        if path in remote_files:
+            remote_files[path]["sha256"] = digest
+
+def same_size_paths(files: list, remote_root: str, remote_files: dict) -> list:
+    """
+    Paths relative to remote_root of the planned files whose remote copy has the same
+    size, the only ones worth hashing: any other file is uploaded anyway.
+    """
+    prefix = f"{remote_root}/"
+    paths = []
+    for _, remote_path, size in files:
+        remote = remote_files.get(remote_path[len(prefix):])
+        if remote is not None and remote["size"] == size:
+            paths.append(remote_path[len(prefix):])
+    return paths
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as local_file:
+        for data in iter(lambda: local_file.read(chunk_size), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+def plan_sync(local_folder: str, remote_root: str, remote_files: dict, planned: tuple = None):
+    """
+    Compare a local tree with a remote listing. Returns (remote directories, files to
+    upload, unchanged files, remote paths to delete). Files of equal size are compared
+    by sha256, or by mtime when the listing has no hash. planned is the result of
+    plan_upload when the caller already walked local_folder.
+    """
+    directories, files = planned or plan_upload(local_folder, remote_root)
+    uploads, unchanged = [], []
+    local_paths = set()
+    prefix = f"{remote_root}/"
+    for local_path, remote_path, size in files:
+        relative = remote_path[len(prefix):]
+        local_paths.add(relative)
+        remote = remote_files.get(relative)
+        if remote is None or remote["size"] != size:
+            uploads.append((local_path, remote_path, size))
+        elif remote["sha256"] is not None:
+            (unchanged if remote["sha256"] == file_sha256(local_path) else uploads).append((local_path, remote_path, size))
+        else:
+            (unchanged if abs(remote["mtime"] - os.path.getmtime(local_path)) < 1 else uploads).append((local_path, remote_path, size))
+    deletions = sorted(f"{prefix}{relative}" for relative in remote_files if relative not in local_paths)
+    return directories, uploads, unchanged, deletions
+
+class TransferStats:
+    def __init__(self, total_files: int, total_bytes: int):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.deleted = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.elapsed = 0
+        self._lock = threading.Lock()
+
+    def add(self, size: int):
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+
+    def fail(self, path: str, error: Exception):
+        with self._lock:
+            self.errors.append(f"{path}: {error}")
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+
+    def as_dict(self) -> dict:
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "skipped": self.skipped,
+            "deleted": self.deleted,
+            "errors": self.errors,
+            "elapsed": round(self.elapsed, 3),
+            "throughput": round(self.bytes / self.elapsed) if self.elapsed > 0 else self.bytes
+        }
+
+class FolderUploader:
+    """
+    Upload a local tree over one SSH transport: remote directories are created with
+    a few mkdir -p commands, then files are written concurrently over several SFTP
+    channels with pipelined writes.
+    """
+    def __init__(self, client, channels: int = 4, chunk_size: int = 1024 * 1024):
+        self.client = client
+        self.channels = max(1, channels)
+        self.chunk_size = chunk_size
+
+    def run_commands(self, commands: list):
+        for command in commands:
+            self.run_command(command)
+
+    def run_command(self, command: str, check: bool = True) -> str:
+        """
+        Output of command; a non-zero exit raises IOError, or with check=False is only reported.
+        """
+        _, stdout, stderr = self.client.exec_command(command)
+        output = stdout.read().decode(errors="replace")
+        if stdout.channel.recv_exit_status() != 0:
+            message = f"Remote command failed: {stderr.read().decode(errors='replace').strip()}"
+            if check:
+                raise IOError(message)
+            print(message)
+        return output
+
+    def remote_files(self, remote_root: str, files: list) -> dict:
+        """
+        Listing of remote_root, with the sha256 of the files matching one of files in size.
+        A listing that fails, e.g. on an unreadable directory, fails the sync rather than
+        have every file look new or deleted. A file that cannot be hashed is compared by mtime.
+        """
+        remote_files = parse_remote_listing(self.run_command(remote_listing_command(remote_root)))
+        for command in remote_hash_commands(remote_root, same_size_paths(files, remote_root, remote_files)):
+            parse_remote_hashes(self.run_command(command, check=False), remote_files)
+        return remote_files
+
+    def create_directories(self, directories: list):
+        self.run_commands(mkdir_commands(directories))
+
+    def upload(self, local_folder: str, remote_root: str, progress=None) -> TransferStats:
+        directories, files = plan_upload(local_folder, remote_root)
+        stats = TransferStats(len(files), sum(size for _, _, size in files))
+        self.create_directories(directories)
+        self._upload_files(files, stats, progress)
+        stats.finish()
+        return stats
+
+    def sync(self, local_folder: str, remote_root: str, progress=None, delete: bool = True) -> TransferStats:
+        """
+        Bring remote_root in line with local_folder, uploading only new or changed files
+        and, with delete, removing remote files and empty directories that are gone locally.
+        """
+        planned = plan_upload(local_folder, remote_root)
+        remote_files = self.remote_files(remote_root, planned[1])
+        directories, uploads, unchanged, deletions = plan_sync(local_folder, remote_root, remote_files, planned)
+        stats = TransferStats(len(uploads), sum(size for _, _, size in uploads))
+        stats.skipped = len(unchanged)
+
+        self.create_directories(directories)
+        if progress is not None:
+            for local_path, _, _ in unchanged:
+                progress(local_path)
+        self._upload_files(uploads, stats, progress)
+
+        # Only once every upload landed, so a failed sync never leaves files removed but not replaced
+        if delete and deletions and not stats.errors:
+            self.run_commands(batched_commands("rm -f", deletions))
+            # Directories emptied by the deletions go too, mkdir -p restores the empty local ones
+            self.run_commands([f"find {shlex.quote(remote_root)} -mindepth 1 -depth -type d -empty -delete"])
+            self.create_directories(directories)
+            stats.deleted = len(deletions)
+        stats.finish()
+        return stats
+
+    def _upload_files(self, files: list, stats: TransferStats, progress=None):
+        if not files:
+            return
+        pending = list(reversed(files))
+        pending_lock = threading.Lock()
+        progress_lock = threading.Lock()
+
+        def next_file():
+            with pending_lock:
+                return pending.pop() if pending else None
+
+        def worker():
+            sftp = self.client.open_sftp()
+            try:
+                while True:
+                    item = next_file()
+                    if item is None:
+                        return
+                    local_path, remote_path, size = item
+                    try:
+                        self._put(sftp, local_path, remote_path)
+                    except Exception as e:
+                        print(f"Error uploading '{local_path}': {e}")
+                        stats.fail(remote_path, e)
+                        continue
+                    stats.add(size)
+                    if progress is not None:
+                        with progress_lock:
+                            progress(local_path)
+            finally:
+                sftp.close()
+
+        workers = max(1, min(self.channels, len(files)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sftp-upload") as executor:
+            for future in [executor.submit(worker) for _ in range(workers)]:
+                future.result()
+
+    def _put(self, sftp, local_path: str, remote_path: str):
+        with open(local_path, "rb") as local_file, sftp.open(remote_path, "wb", bufsize=self.chunk_size) as remote_file:
+            remote_file.set_pipelined(True)
+            while True:
+                data = local_file.read(self.chunk_size)
+                if not data:
+                    break
+                remote_file.write(data)
@@ -0,0 +1,51 @@
+import unittest
+from src.database.acl import AclIndex
+
+class FakeDB:
+    def __init__(self):
+        self.notifications = []
+
+    def execute_transaction(self, queries):
+        self.notifications += [values for _, values in queries]
+        return True
+
+class TestAclIndex(unittest.TestCase):
+
+    def test_lookup_is_loaded_once(self):
+        index = AclIndex(listen=False)
+        loads = []
+
+        def load():
+            loads.append(1)
+            return {"s1": ["R01"]}
+
+        self.assertEqual(index.server_roles("alice", "s1", load), ["R01"])
+        self.assertTrue(index.has_server_access("alice", "s1", load))
+        self.assertFalse(index.has_server_access("alice", "s2", load))
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(index.stats()["hits"], 2)
+        self.assertEqual(index.stats()["misses"], 1)
+
+    def test_changed_invalidates_and_notifies(self):
+        index = AclIndex(listen=False)
+        self.assertFalse(index.has_organization_access("alice", "o1", lambda: set()))
+        index.changed(FakeDB(), "alice")
+        self.assertTrue(index.has_organization_access("alice", "o1", lambda: {"o1"}))
+
+        db = FakeDB()
+        index.listen = True
+        index.changed(db, "alice")
+        self.assertEqual(db.notifications, [("acl_changed", "alice")])
+
+    def test_invalidation_during_load_is_not_cached(self):
+        index = AclIndex(listen=False)
+
+        def load():
+            index.invalidate("alice")
+            return {"s1": ["R01"]}
+
+        self.assertTrue(index.has_server_access("alice", "s1", load))
+        self.assertFalse(index.has_server_access("alice", "s1", lambda: {}))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import threading
+import unittest
+from src.server_management.async_server_manager import AsyncServerManager, event_loop
+
+class FakeChannel:
+    def __init__(self, stdout, stderr, delay=0, exit_status=0):
+        self.stdout = list(stdout)
+        self.stderr = list(stderr)
+        self.delay = delay
+        self.exit_status = exit_status
+        self.eof_received = False
+        self.command = None
+        self.closed = False
+        self.read_fd, self.write_fd = os.pipe()
+
+    def fileno(self):
+        return self.read_fd
+
+    def exec_command(self, command):
+        self.command = command
+        # Output shows up later from another thread, like paramiko's transport thread
+        threading.Timer(self.delay, self._finish).start()
+
+    def _finish(self):
+        if self.closed:
+            return
+        self.eof_received = True
+        os.write(self.write_fd, b"x")
+
+    def recv_ready(self):
+        return self.eof_received and bool(self.stdout)
+
+    def recv(self, size):
+        return self.stdout.pop(0)
+
+    def recv_stderr_ready(self):
+        return self.eof_received and bool(self.stderr)
+
+    def recv_stderr(self, size):
+        return self.stderr.pop(0)
+
+    def exit_status_ready(self):
+        return self.eof_received
+
+    def close(self):
+        self.closed = True
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+class FakeTransport:
+    def __init__(self, channels):
+        self.channels = channels
+
+    def open_session(self):
+        return self.channels.pop(0)
+
+class FakeClient:
+    def __init__(self, channels):
+        self.transport = FakeTransport(channels)
+
+    def get_transport(self):
+        return self.transport
+
+class TestAsyncServerManager(unittest.TestCase):
+
+    def make_server(self, channels, timeout=None):
+        server = AsyncServerManager("host", "user", "password", timeout=timeout)
+        server.manager.client = FakeClient(channels)
+        return server
+
+    def test_execute_script_collects_output(self):
+        channel = FakeChannel([b"line 1\n", b"line 2\n"], [b"warn\n"], delay=0.05)
+        server = self.make_server([channel])
+        output = event_loop.run(server.execute_script_in_remote_server("/srv/get_info.sh", "a", "b"), timeout=5)
+        self.assertEqual(output, ("line 1\nline 2\n", "warn\n"))
+        self.assertEqual(channel.command, "bash /srv/get_info.sh a b")
+        self.assertTrue(channel.closed)
+
+    def test_commands_run_concurrently(self):
+        channels = [FakeChannel([f"{i}".encode()], [], delay=0.3) for i in range(20)]
+        server = self.make_server(channels)
+
+        async def run_all():
+            return await asyncio.gather(*(server.execute_command("true") for _ in range(20)))
+
+        loop = asyncio.new_event_loop()
+        try:
+            started = loop.time()
+            outputs = loop.run_until_complete(run_all())
+            elapsed = loop.time() - started
+        finally:
+            loop.close()
+        self.assertEqual(sorted(stdout for stdout, _ in outputs), sorted(str(i) for i in range(20)))
+        self.assertLess(elapsed, 3)
+
+    def test_timeout(self):
+        channel = FakeChannel([b"late"], [], delay=2)
+        server = self.make_server([channel], timeout=0.2)
+        self.assertIsNone(event_loop.run(server.execute_command("sleep 2"), timeout=5))
+        self.assertTrue(channel.closed)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import asyncio
+from concurrent.futures import Future
+import threading
+import time
+import unittest
+from unittest import mock
+from src.server_management import batch
+
+SERVERS = [{"server_id": f"s{i}", "hostname": f"10.0.0.{i}", "username": "root", "password": "secret", "rsa_key": None}
+           for i in (1, 2)]
+
+async def fake_run(server_info, script_path, args, script_directory, timeout):
+    # s2 hangs, e.g. on an SFTP deploy that never finishes
+    if server_info["server_id"] == "s2":
+        await asyncio.sleep(60)
+    return {"server_id": server_info["server_id"], "hostname": server_info["hostname"], "status": "ok"}
+
+class TestRunBatchAsync(unittest.TestCase):
+
+    def test_one_deadline_per_server(self):
+        with mock.patch.object(batch, "run_script_on_server_async", fake_run):
+            results = {result["server_id"]: result for result in batch.run_batch_async(SERVERS, "get_info.sh", [], "/srv", 0.2)}
+        self.assertEqual(results["s1"]["status"], "ok")
+        self.assertEqual(results["s2"]["status"], "timeout")
+
+    def test_handshake_past_deadline_is_released(self):
+        manager = mock.MagicMock()
+        manager.connect.side_effect = lambda: time.sleep(0.5) or True
+        released = threading.Event()
+        manager.disconnect.side_effect = lambda discard=False: released.set()
+        fake_server = mock.MagicMock(manager=manager)
+        with mock.patch.object(batch, "AsyncServerManager", return_value=fake_server):
+            results = list(batch.run_batch_async(SERVERS[:1], "get_info.sh", [], "/srv", 0.1))
+        self.assertEqual(results[0]["status"], "timeout")
+        self.assertTrue(released.wait(5))
+        manager.disconnect.assert_called_once_with(True)
+
+    def test_loop_failure_becomes_error_rows(self):
+        def submit(coroutine):
+            coroutine.close()
+            future = Future()
+            future.set_exception(RuntimeError("event loop is closed"))
+            return future
+
+        with mock.patch.object(batch.event_loop, "submit", submit):
+            results = list(batch.run_batch_async(SERVERS, "get_info.sh", [], "/srv", 5))
+        self.assertEqual([result["server_id"] for result in results], ["s1", "s2"])
+        self.assertTrue(all(result["status"] == "error" for result in results))
+        self.assertIn("event loop is closed", results[0]["message"])
+
+if __name__ == "__main__":
+    unittest.main()
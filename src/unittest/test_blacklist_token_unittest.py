@@ -0,0 +1,36 @@
+import unittest
+from datetime import datetime, timedelta
+from src.database.blacklist_token import BloomFilter, BlacklistCache
+
+class TestBlacklistCache(unittest.TestCase):
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, 0.001)
+        for i in range(1000):
+            bloom.add(f"token-{i}")
+        self.assertTrue(all(f"token-{i}" in bloom for i in range(1000)))
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 50)
+
+    def test_incremental_refresh(self):
+        start = datetime(2024, 1, 1)
+        rows = [("old", start)]
+        calls = []
+        def load_rows(since):
+            calls.append(since)
+            return [row for row in rows if since is None or row[1] >= since]
+
+        cache = BlacklistCache(capacity=100, refresh_interval=0, overlap=60)
+        self.assertTrue(cache.might_contain("old", load_rows))
+        self.assertFalse(cache.might_contain("new", load_rows))
+        rows.append(("new", start + timedelta(minutes=5)))
+        self.assertTrue(cache.might_contain("new", load_rows))
+        self.assertIsNone(calls[0])
+        self.assertEqual(calls[-1], start - timedelta(seconds=60))
+
+    def test_unloaded_cache_falls_through(self):
+        cache = BlacklistCache(refresh_interval=0)
+        self.assertTrue(cache.might_contain("token", lambda since: None))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
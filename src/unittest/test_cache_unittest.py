@@ -0,0 +1,40 @@
+import unittest
+import time
+from src.cache import TTLCache
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_get_set(self):
+        cache = TTLCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_evict_least_recently_used(self):
+        cache = TTLCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_expire(self):
+        cache = TTLCache(max_size=2, ttl=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+
+    def test_pop_matching(self):
+        cache = TTLCache(max_size=4, ttl=60)
+        cache.set(("s1", "password"), 1)
+        cache.set(("s1", "rsa_key"), 2)
+        cache.set(("s2", "password"), 3)
+        self.assertEqual(cache.pop_matching(lambda key: key[0] == "s1"), 2)
+        self.assertEqual(cache.get(("s2", "password")), 3)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
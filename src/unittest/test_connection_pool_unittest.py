@@ -0,0 +1,85 @@
+import unittest
+from src.server_management.connection_pool import SSHConnectionPool
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+        self.keepalive = None
+
+    def is_active(self):
+        return self.active
+
+    def set_keepalive(self, interval):
+        self.keepalive = interval
+
+class FakeClient:
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+        self.transport.active = False
+
+class TestSSHConnectionPool(unittest.TestCase):
+
+    def test_reuse_live_transport(self):
+        pool = SSHConnectionPool(max_sessions_per_host=2, keepalive=15)
+        opened = []
+        open_client = lambda: opened.append(FakeClient()) or opened[-1]
+        first = pool.acquire("k", "host", open_client)
+        pool.release("k", "host", first)
+        second = pool.acquire("k", "host", open_client)
+        self.assertIs(first, second)
+        self.assertEqual(len(opened), 1)
+        self.assertEqual(first.transport.keepalive, 15)
+        self.assertFalse(first.closed)
+
+    def test_reconnect_dead_transport(self):
+        pool = SSHConnectionPool()
+        first = pool.acquire("k", "host", FakeClient)
+        pool.release("k", "host", first)
+        first.transport.active = False
+        second = pool.acquire("k", "host", FakeClient)
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+
+    def test_max_sessions_per_host(self):
+        pool = SSHConnectionPool(max_sessions_per_host=1, acquire_timeout=0.05)
+        client = pool.acquire("k", "host", FakeClient)
+        self.assertIsNone(pool.acquire("other", "host", FakeClient))
+        pool.release("k", "host", client)
+        self.assertIsNotNone(pool.acquire("other", "host", FakeClient))
+
+    def test_discard_waits_for_last_lease(self):
+        pool = SSHConnectionPool()
+        client = pool.acquire("k", "host", FakeClient)
+        pool.acquire("k", "host", FakeClient)
+        pool.release("k", "host", client, discard=True)
+        self.assertFalse(client.closed)
+        pool.release("k", "host", client)
+        self.assertTrue(client.closed)
+
+    def test_reap_idle(self):
+        pool = SSHConnectionPool(max_idle=0)
+        client = pool.acquire("k", "host", FakeClient)
+        pool.release("k", "host", client)
+        pool.reap_idle()
+        self.assertTrue(client.closed)
+        self.assertEqual(pool.stats()["connections"], 0)
+        self.assertEqual(pool._key_locks, {})
+
+    def test_key_locks_go_with_their_clients(self):
+        pool = SSHConnectionPool()
+        client = pool.acquire("k", "host", FakeClient)
+        self.assertIn("k", pool._key_locks)
+        pool.release("k", "host", client, discard=True)
+        self.assertEqual(pool._key_locks, {})
+        self.assertIsNone(pool.acquire("other", "host", lambda: None))
+        self.assertEqual(pool._key_locks, {})
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
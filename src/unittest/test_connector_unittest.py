@@ -0,0 +1,95 @@
+import unittest
+from unittest import mock
+import psycopg2
+import psycopg2.pool
+from src.database import connector
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+    def cursor(self):
+        return mock.MagicMock()
+
+class TestDBConnectionPool(unittest.TestCase):
+
+    def test_reuse_connection(self):
+        with mock.patch("psycopg2.connect", side_effect=lambda **kwargs: FakeConnection()) as connect:
+            pool = connector.DBConnectionPool(min_size=0, max_size=2)
+            conn = pool.getconn()
+            pool.putconn(conn)
+            self.assertIs(pool.getconn(), conn)
+            self.assertEqual(connect.call_count, 1)
+            self.assertEqual(conn.rollbacks, 1)
+
+    def test_checkout_timeout(self):
+        with mock.patch("psycopg2.connect", side_effect=lambda **kwargs: FakeConnection()):
+            pool = connector.DBConnectionPool(min_size=0, max_size=1, timeout=0.05)
+            pool.getconn()
+            with self.assertRaises(psycopg2.pool.PoolError):
+                pool.getconn()
+
+    def test_discard_closed_connection(self):
+        with mock.patch("psycopg2.connect", side_effect=lambda **kwargs: FakeConnection()) as connect:
+            pool = connector.DBConnectionPool(min_size=0, max_size=1)
+            conn = pool.getconn()
+            pool.putconn(conn)
+            conn.closed = 1
+            self.assertIsNot(pool.getconn(), conn)
+            self.assertEqual(connect.call_count, 2)
+
+    def test_reap_idle_connection(self):
+        with mock.patch("psycopg2.connect", side_effect=lambda **kwargs: FakeConnection()):
+            pool = connector.DBConnectionPool(min_size=0, max_size=2, idle_timeout=0)
+            conn = pool.getconn()
+            pool.putconn(conn)
+            self.assertTrue(conn.closed)
+            self.assertEqual(pool._size, 0)
+
+    def test_connector_returns_connection_to_pool(self):
+        with mock.patch("psycopg2.connect", side_effect=lambda **kwargs: FakeConnection()) as connect:
+            db = connector.DBConnector("test_pool_db", pooled=True)
+            db.connect()
+            conn = db.conn
+            db.close()
+            db.close()
+            self.assertIsNone(db.conn)
+            db = connector.DBConnector("test_pool_db", pooled=True)
+            db.connect()
+            self.assertIs(db.conn, conn)
+            self.assertEqual(connect.call_count, 1)
+            db.close()
+
+class TestExecuteQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.db = connector.DBConnector("db", "user", "password", "host", 5432, pooled=False)
+        self.db.conn = mock.MagicMock()
+        self.cursor = self.db.conn.cursor.return_value
+
+    def test_select_mentioning_write_keywords_fetches(self):
+        self.cursor.description = [("updated_at",)]
+        self.cursor.fetchall.return_value = [("2024-01-01",)]
+        self.assertEqual(self.db.execute_query("SELECT updated_at, deleted FROM tbl_server_job"), [("2024-01-01",)])
+        self.db.conn.commit.assert_not_called()
+
+    def test_write_commits(self):
+        self.cursor.description = None
+        self.assertIsNone(self.db.execute_query("UPDATE tbl_server SET status = %s", ("ACTIVE",)))
+        self.db.conn.commit.assert_called_once()
+
+    def test_insert_returning_fetches_and_commits(self):
+        self.cursor.description = [("server_id",)]
+        self.cursor.fetchall.return_value = [("s1",)]
+        self.assertEqual(self.db.execute_query("INSERT INTO tbl_server VALUES (%s) RETURNING server_id", ("s1",)), [("s1",)])
+        self.db.conn.commit.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,69 @@
+import threading
+import unittest
+from src.server_management.job_queue import JobQueue
+
+class FakeJobStore:
+    def __init__(self):
+        self.jobs = {}
+        self.finished = threading.Event()
+
+    def create_job(self, job_id, server_id, username, action):
+        self.jobs[job_id] = {"status": "queued", "progress": 0, "output": "", "action": action}
+        return True
+
+    def update_job(self, job_id, status, progress, output):
+        self.jobs[job_id].update({"status": status, "progress": progress, "output": output})
+        return True
+
+    def finish_job(self, job_id, status, output, result):
+        self.jobs[job_id].update({"status": status, "progress": 100, "output": output, "result": result})
+        self.finished.set()
+        return True
+
+class TestJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.store = FakeJobStore()
+        self.save = lambda update: update(self.store)
+
+    def test_job_result_is_persisted(self):
+        queue = JobQueue(max_workers=1, max_pending=0, flush_interval=0, save=self.save)
+        def work(context):
+            context.write("line 1\n")
+            context.set_progress(50)
+            self.assertEqual(self.store.jobs[context.job_id]["progress"], 50)
+            return "succeeded", {"lines": ["line 1", ""]}
+        job_id = queue.submit("server", "user", "install_lib", work)
+        self.assertIsNotNone(job_id)
+        self.assertTrue(self.store.finished.wait(5))
+        job = self.store.jobs[job_id]
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual(job["output"], "line 1\n")
+        self.assertEqual(job["result"], {"lines": ["line 1", ""]})
+
+    def test_failed_work_is_reported(self):
+        queue = JobQueue(max_workers=1, max_pending=0, save=self.save)
+        def work(context):
+            raise RuntimeError("boom")
+        job_id = queue.submit("server", "user", "docker_build", work)
+        self.assertTrue(self.store.finished.wait(5))
+        self.assertEqual(self.store.jobs[job_id]["status"], "failed")
+        self.assertEqual(self.store.jobs[job_id]["result"], {"message": "boom"})
+
+    def test_submit_refused_when_full(self):
+        queue = JobQueue(max_workers=1, max_pending=0, save=self.save)
+        release = threading.Event()
+        first = queue.submit("server", "user", "upload_folder", lambda context: release.wait(5) and ("succeeded", {}))
+        self.assertIsNotNone(first)
+        self.assertIsNone(queue.submit("server", "user", "upload_folder", lambda context: ("succeeded", {})))
+        release.set()
+        self.assertTrue(self.store.finished.wait(5))
+
+    def test_output_keeps_tail(self):
+        queue = JobQueue(max_workers=1, max_pending=0, output_limit=4, flush_interval=0, save=self.save)
+        job_id = queue.submit("server", "user", "install_lib", lambda context: context.write("abcdef") or ("succeeded", {}))
+        self.assertTrue(self.store.finished.wait(5))
+        self.assertEqual(self.store.jobs[job_id]["output"], "cdef")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from datetime import datetime
+from src.server_management.log_analytics import UfwEvents
+from src.server_management.log_index import LogSegment, ufw_row
+
+def ufw(time, src, dpt="22", action="BLOCK", proto="TCP"):
+    return {"time": time, "action": action, "src": src, "dst": "10.0.0.1", "proto": proto, "spt": "5000", "dpt": dpt}
+
+RECORDS = [
+    ufw("2024-06-03T10:00:01", "1.1.1.1"),
+    ufw("2024-06-03T10:00:02", "1.1.1.1", dpt="23"),
+    ufw("2024-06-03T10:00:03", "1.1.1.1", action="ALLOW", dpt="80"),
+    ufw("2024-06-03T10:03:00", "2.2.2.2"),
+    ufw("2024-06-03T10:04:00", "3.3.3.3", dpt=None, proto="ICMP"),
+    ufw(None, "4.4.4.4")
+]
+
+def events(records):
+    return UfwEvents.from_segments([LogSegment.from_rows([ufw_row(record) for record in records])])
+
+class TestLogAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.events = events(RECORDS)
+
+    def test_top_talkers(self):
+        self.assertEqual(self.events.top_talkers(2), [
+            {"ip": "1.1.1.1", "count": 3, "blocked": 2},
+            {"ip": "2.2.2.2", "count": 1, "blocked": 1}
+        ])
+
+    def test_port_histogram(self):
+        self.assertEqual(self.events.port_histogram(), [{"port": 22, "count": 3}, {"port": 23, "count": 1}])
+        self.assertEqual(len(self.events.port_histogram(action=None)), 3)
+
+    def test_rate_series_and_counts(self):
+        start, counts = self.events.rate_series()
+        self.assertEqual(datetime.fromtimestamp(start).isoformat(), "2024-06-03T10:00:00")
+        self.assertEqual(counts.tolist(), [3, 0, 0, 1, 1])
+        self.assertEqual(self.events.counts("proto"), {"TCP": 5, "ICMP": 1})
+        self.assertEqual(len(self.events.select(start=start + 60)), 2)
+
+    def test_bursts(self):
+        records = [ufw(f"2024-06-03T10:{minute:02d}:00", "1.1.1.1") for minute in range(30)]
+        records += [ufw("2024-06-03T10:15:30", "5.5.5.5")] * 20
+        bursts = events(records).bursts()
+        self.assertEqual([(burst["time"], burst["count"]) for burst in bursts], [("2024-06-03T10:15:00", 21)])
+        self.assertEqual(self.events.bursts(threshold=100), [])
+
+    def test_segments_merge_string_tables(self):
+        first = LogSegment.from_rows([ufw_row(record) for record in RECORDS[:3]])
+        second = LogSegment.from_rows([ufw_row(record) for record in RECORDS[3:]])
+        merged = UfwEvents.from_segments([first, second])
+        self.assertEqual(merged.top_talkers(3), self.events.top_talkers(3))
+        self.assertEqual(merged.port_histogram(), self.events.port_histogram())
+        self.assertEqual(len(UfwEvents.from_segments([])), 0)
+
+if __name__ == "__main__":
+    unittest.main()
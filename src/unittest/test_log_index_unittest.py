@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from src.server_management.log_index import LogIndex, LogSegment, ufw_row
+
+def ufw(time, src, dpt="22", action="BLOCK"):
+    return {"time": time, "action": action, "src": src, "dst": "10.0.0.1", "proto": "TCP", "spt": "5000", "dpt": dpt}
+
+def epoch(time):
+    return datetime.fromisoformat(time).timestamp()
+
+class TestLogIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.index = LogIndex(self.directory.name, retention_days=0)
+        self.index.ingest("s1", "ufw", [
+            ufw("2024-06-03T10:00:05", "1.1.1.1"),
+            ufw("2024-06-03T10:00:01", "2.2.2.2", dpt="80", action="ALLOW"),
+            ufw("2024-06-04T09:00:00", "1.1.1.1", dpt="443"),
+            ufw(None, "3.3.3.3")
+        ])
+
+    def test_partitions_by_day(self):
+        names = sorted(os.listdir(os.path.join(self.directory.name, "s1", "index", "ufw")))
+        self.assertEqual(names, ["2024-06-03.npz", "2024-06-04.npz", "undated.npz"])
+        self.assertEqual(len(self.index.partitions("s1", "ufw", epoch("2024-06-04T00:00:00"))), 1)
+
+    def test_filters(self):
+        total, records = self.index.query("s1", "ufw", ip="1.1.1.1")
+        self.assertEqual(total, 2)
+        self.assertEqual([record["port"] for record in records], [22, 443])
+        self.assertEqual(self.index.query("s1", "ufw", ip="10.0.0.1")[0], 4)
+        self.assertEqual(self.index.query("s1", "ufw", ip="9.9.9.9"), (0, []))
+        self.assertEqual(self.index.query("s1", "ufw", port=80, action="ALLOW")[1][0]["src"], "2.2.2.2")
+        total, records = self.index.query("s1", "ufw", start=epoch("2024-06-03T10:00:02"), end=epoch("2024-06-03T23:00:00"))
+        self.assertEqual([record["time"] for record in records], ["2024-06-03T10:00:05"])
+
+    def test_pagination_across_partitions(self):
+        self.index.ingest("s1", "ufw", [ufw("2024-06-03T11:00:00", "4.4.4.4")])
+        total, records = self.index.query("s1", "ufw", offset=2, limit=2)
+        self.assertEqual(total, 5)
+        self.assertEqual([record["src"] for record in records], ["4.4.4.4", "1.1.1.1"])
+
+    def test_user_index_and_replace(self):
+        self.index.replace("s1", "lastlog", [
+            {"user": "alice", "info": "pts/0", "from_ip": "1.1.1.1", "time": "2024-06-03T10:00:00"},
+            {"user": "reboot", "info": "system boot", "from_ip": "5.15", "time": "2024-06-03T09:00:00"}
+        ])
+        self.index.replace("s1", "lastlog", [
+            {"user": "bob", "info": "pts/1", "from_ip": "2.2.2.2", "time": "2024-06-03T10:00:00"}
+        ])
+        self.assertEqual(self.index.query("s1", "lastlog", user="alice"), (0, []))
+        self.assertEqual(self.index.query("s1", "lastlog", user="bob")[1][0]["action"], "login")
+
+    def test_segment_round_trip(self):
+        segment = LogSegment.from_rows([ufw_row(ufw("2024-06-03T10:00:00", "1.1.1.1"))])
+        path = os.path.join(self.directory.name, "segment.npz")
+        segment.extend([ufw_row(ufw("2024-06-03T09:00:00", "2.2.2.2"))]).save(path)
+        loaded = LogSegment.load(path)
+        self.assertEqual([loaded.record(row)["src"] for row in range(len(loaded))], ["2.2.2.2", "1.1.1.1"])
+        self.assertEqual(list(loaded.rows_with("src", "1.1.1.1")), [1])
+
+if __name__ == "__main__":
+    unittest.main()
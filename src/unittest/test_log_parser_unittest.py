@@ -0,0 +1,55 @@
+import unittest
+from datetime import date
+from src.server_management import log_parser
+from src.server_management.log_parser import iter_lines, parse_log_output, parse_lastlog_line, parse_ufw_line, ufw_fields
+from src.server_management.log_index import ufw_row
+
+UFW_LINE = ("Jun  3 10:22:01 web-1 kernel: [12345.6] [UFW BLOCK] IN=eth0 OUT= MAC=aa:bb SRC=10.0.0.5 "
+            "DST=10.0.0.1 LEN=40 TOS=0x00 PROTO=TCP SPT=51515 DPT=22 WINDOW=1024")
+
+class TestLogParser(unittest.TestCase):
+
+    def test_iter_lines_across_chunks(self):
+        self.assertEqual(list(iter_lines(["  1  ls\n  2", "  pwd\r\n\n  3  cd"])), ["  1  ls", "  2  pwd", "  3  cd"])
+
+    def test_history_skips_bad_lines(self):
+        records, unparsed = parse_log_output("history", "    1  ls -la\ngarbage\n   2  git status  \n")
+        self.assertEqual(records, [{"no": "1", "command_line": "ls -la"}, {"no": "2", "command_line": "git status"}])
+        self.assertEqual(unparsed, 1)
+
+    def test_ufw_record(self):
+        record = parse_ufw_line(UFW_LINE)
+        self.assertEqual(record["timestamp"], "Jun  3 10:22:01")
+        self.assertEqual(record["host"], "web-1")
+        self.assertTrue(record["log"].startswith("kernel: [12345.6] [UFW BLOCK]"))
+        self.assertTrue(record["time"].endswith("-06-03T10:22:01"))
+        self.assertNotIn("src", record)
+        fields = ufw_fields(record["log"])
+        self.assertEqual((fields["action"], fields["src"], fields["dst"], fields["proto"], fields["dpt"]),
+                         ("BLOCK", "10.0.0.5", "10.0.0.1", "TCP", "22"))
+        row = ufw_row(record)
+        self.assertEqual((row["action"], row["src"], row["port"]), ("BLOCK", "10.0.0.5", 22))
+        self.assertEqual(ufw_fields("kernel: [UFW AUDIT] truncated")["action"], "AUDIT")
+
+    def test_syslog_year_follows_today(self):
+        self.assertEqual(log_parser._syslog_time("Dec", "31", "23:59:00", None, date(2024, 12, 31)), "2024-12-31T23:59:00")
+        self.assertEqual(log_parser._syslog_time("Dec", "31", "23:59:00", None, date(2025, 1, 1)), "2024-12-31T23:59:00")
+        self.assertEqual(log_parser._syslog_time("Jan", "1", "00:00:01", None, date(2025, 1, 1)), "2025-01-01T00:00:01")
+        self.assertEqual(log_parser._syslog_time("Jan", "1", "00:00:01", None, date(2024, 12, 31)), "2024-01-01T00:00:01")
+        self.assertEqual(log_parser._syslog_time("Jun", "3", "10:00", None, date(2024, 1, 1)), "2023-06-03T10:00:00")
+
+    def test_lastlog_branches(self):
+        session = parse_lastlog_line("alice    pts/0        10.0.0.7         Mon Jun  3 10:22 - 10:30  (00:08)")
+        self.assertEqual((session["user"], session["info"], session["from_ip"]), ("alice", "pts/0", "10.0.0.7"))
+        self.assertEqual(session["timestamp"], "Mon Jun  3 10:22 - 10:30  (00:08)")
+
+        reboot = parse_lastlog_line("reboot   system boot  5.15.0-91-generic Mon Jun  3 10:20   still running")
+        self.assertEqual((reboot["user"], reboot["info"], reboot["from_ip"]), ("reboot", "system boot", "5.15.0-91-generic"))
+
+        wtmp = parse_lastlog_line("wtmp begins Mon Jun  3 10:20:01 2024")
+        self.assertEqual((wtmp["user"], wtmp["info"], wtmp["from_ip"]), ("wtmp", "begins", ""))
+        self.assertEqual(wtmp["time"], "2024-06-03T10:20:01")
+        self.assertIsNone(parse_lastlog_line("not a login line"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import fcntl
+import tempfile
+import unittest
+from src.server_management.log_tail import LogStore, read_log_end, tail_log
+
+UFW_LINE = ("Jun  3 10:22:{:02d} web-1 kernel: [1.0] [UFW BLOCK] IN=eth0 OUT= SRC=10.0.0.{} "
+            "DST=10.0.0.1 LEN=40 PROTO=TCP SPT=5000 DPT=22\n")
+
+class FakeServer:
+    def __init__(self):
+        self.inode = "100"
+        self.content = b""
+        self.reads = []
+
+    def read_remote_log(self, remote_file_path, offset=0, max_bytes=None):
+        self.reads.append((offset, max_bytes))
+        data = b"" if max_bytes == 0 else self.content[offset:]
+        if max_bytes:
+            data = data[:max_bytes]
+        return self.inode, len(self.content), data
+
+class TestLogTail(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.store = LogStore(self.directory.name)
+        self.server = FakeServer()
+
+    def tail(self, kind="ufw", initial_bytes=1024 * 1024, max_bytes=1024 * 1024):
+        return tail_log(self.server, "s1", kind, self.store, initial_bytes, max_bytes)
+
+    def test_reads_only_new_complete_lines(self):
+        self.server.content = (UFW_LINE.format(1, 1) + UFW_LINE.format(2, 2)).encode() + b"Jun  3 10:22:03 web-1 ker"
+        self.assertEqual(self.tail(), (2, 0))
+        offset = self.store.load_cursor("s1", "ufw")["offset"]
+        self.assertEqual(offset, len(UFW_LINE.format(1, 1)) * 2)
+
+        self.server.content = self.server.content[:offset] + UFW_LINE.format(3, 3).encode()
+        self.assertEqual(self.tail(), (1, 0))
+        self.assertEqual(self.server.reads[-1], (offset, 1024 * 1024))
+        self.assertEqual([record["timestamp"] for record in self.store.read("s1", "ufw")],
+                         ["Jun  3 10:22:01", "Jun  3 10:22:02", "Jun  3 10:22:03"])
+        self.assertEqual(self.tail(), (0, 0))
+
+    def test_first_read_starts_near_the_end(self):
+        self.server.content = "".join(UFW_LINE.format(i, i) for i in range(10)).encode()
+        self.assertEqual(self.tail(initial_bytes=len(UFW_LINE.format(0, 0)) * 2 + 5), (2, 0))
+
+    def test_rotation_reads_new_file_from_start(self):
+        self.server.content = UFW_LINE.format(1, 1).encode()
+        self.tail()
+        self.server.inode = "101"
+        self.server.content = UFW_LINE.format(2, 2).encode()
+        self.assertEqual(self.tail(), (1, 0))
+        self.assertEqual(len(self.store.read("s1", "ufw")), 2)
+
+    def test_history_numbering(self):
+        self.server.content = b"ls\n#1700000000\npwd\n"
+        self.assertEqual(self.tail("history"), (2, 0))
+        self.server.content += b"cd /tmp\n"
+        self.tail("history")
+        self.assertEqual(self.store.read("s1", "history", limit=1), [{"no": "3", "command_line": "cd /tmp"}])
+
+    def test_line_longer_than_max_bytes_is_skipped(self):
+        self.server.content = UFW_LINE.format(1, 1).encode()
+        self.tail()
+        self.server.content += b"x" * 250 + b"\n" + UFW_LINE.format(2, 2).encode()
+        self.assertEqual(self.tail(max_bytes=100), (0, 1))
+        self.assertEqual(self.tail(max_bytes=100), (0, 0))
+        self.assertEqual(self.tail(max_bytes=200), (1, 0))
+        self.assertEqual([record["timestamp"] for record in self.store.read("s1", "ufw")],
+                         ["Jun  3 10:22:01", "Jun  3 10:22:02"])
+        self.assertEqual(self.store.load_cursor("s1", "ufw")["offset"], len(self.server.content))
+
+    def test_read_log_end_starts_at_a_whole_line(self):
+        self.server.content = "".join(UFW_LINE.format(i, i) for i in range(10)).encode() + b"Jun  3 10:22:10 partial"
+        text = read_log_end(self.server, "ufw", len(UFW_LINE.format(0, 0)) * 2 + 30)
+        self.assertEqual(text, UFW_LINE.format(8, 8) + UFW_LINE.format(9, 9))
+
+    def test_lock_is_shared_across_stores(self):
+        # Another worker process has its own LogStore over the same TMP_FOLDER
+        other = LogStore(self.directory.name)
+        with self.store.lock("s1", "ufw"):
+            with open(other._path("s1", "ufw", "lock"), "a") as lock_file:
+                with self.assertRaises(BlockingIOError):
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        with other.lock("s1", "ufw"):
+            pass
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import math
+import unittest
+from unittest import mock
+import numpy as np
+from src.server_management import metrics
+from src.server_management.metrics import METRIC_FIELDS, MetricsCollector, MetricSeries, MetricsStore, sample_values
+
+class FakeServerMetric:
+    # tbl_server_metric rows as (server_id, collected_at, values, data)
+    def __init__(self):
+        self.rows = []
+
+    def add_sample(self, server_id, collected_at, values, data):
+        self.rows.append((server_id, collected_at, values, data))
+        return True
+
+    def get_latest(self, server_id):
+        rows = [row for row in self.rows if row[0] == server_id]
+        return (rows[-1][1], rows[-1][3]) if rows else None
+
+    def get_samples(self, server_id, start=None, end=None):
+        return [(row[1], *row[2]) for row in self.rows if row[0] == server_id
+                and (start is None or row[1] >= start) and (end is None or row[1] <= end)]
+
+class FakeLockDB:
+    # One Postgres advisory lock shared by every connection of the test
+    holder = None
+
+    def __init__(self, *args, **kwargs):
+        self.conn = mock.MagicMock()
+        self.alive = True
+
+    def connect(self):
+        pass
+
+    def close(self):
+        self.alive = False
+        if FakeLockDB.holder is self:
+            FakeLockDB.holder = None
+
+    def execute_query(self, query, params=None):
+        if not self.alive:
+            return None
+        if "pg_try_advisory_lock" in query:
+            if FakeLockDB.holder is None:
+                FakeLockDB.holder = self
+            return [(FakeLockDB.holder is self,)]
+        return [(1,)]
+
+class TestMetrics(unittest.TestCase):
+
+    def values(self, cpu):
+        return np.array([cpu] + [0.0] * (len(METRIC_FIELDS) - 1))
+
+    def test_sample_values(self):
+        values = sample_values({"CPU_Percent": 12.5, "RAM_Used_Bytes": "1024", "Disk_Total_Bytes": None})
+        self.assertEqual(values[0], 12.5)
+        self.assertEqual(values[1], 1024)
+        self.assertTrue(math.isnan(values[4]))
+        self.assertEqual(sample_values({"CPU": "7.5%"})[0], 7.5)
+
+    def test_series_from_rows(self):
+        series = MetricSeries.from_rows([(second, second * 10, None, 0, 0, 0) for second in range(6)])
+        timestamps, values = series.range(3, 4)
+        self.assertEqual(timestamps.tolist(), [3, 4])
+        self.assertEqual(values[:, 0].tolist(), [30, 40])
+        self.assertTrue(np.isnan(values[0, 1]))
+        self.assertEqual(len(MetricSeries.from_rows([]).range()[0]), 0)
+
+    def test_downsample(self):
+        series = MetricSeries.from_rows([(second, *self.values(second)) for second in range(8)])
+        centers, counts, mean, low, high = series.downsample(0, 8, 4)
+        self.assertEqual(centers.tolist(), [1, 3, 5, 7])
+        self.assertEqual(counts.tolist(), [2, 2, 2, 2])
+        self.assertEqual(mean[:, 0].tolist(), [0.5, 2.5, 4.5, 6.5])
+        self.assertEqual(low[:, 0].tolist(), [0, 2, 4, 6])
+        self.assertEqual(high[:, 0].tolist(), [1, 3, 5, 7])
+
+    def test_store_latest_and_history(self):
+        store = MetricsStore(None)
+        store.samples = FakeServerMetric()
+        self.assertIsNone(store.get_latest("s1"))
+        store.record("s1", {"CPU_Percent": 5, "Hostname": "a"}, timestamp=100)
+        store.record("s1", {"CPU_Percent": 6}, timestamp=160)
+        self.assertEqual(store.samples.rows[0][2], [5.0, None, None, None, None])
+        self.assertIsNone(store.get_latest("s1", max_age=60))
+        self.assertEqual(store.get_latest("s1")[1], {"CPU_Percent": 6})
+
+        history = store.history("s1")
+        self.assertEqual(history["timestamps"], [100, 160])
+        self.assertEqual(history["values"]["CPU_Percent"], [5, 6])
+        self.assertEqual(history["values"]["RAM_Used_Bytes"], [None, None])
+
+        history = store.history("s1", 0, 200, buckets=4)
+        self.assertEqual(history["counts"], [0, 0, 1, 1])
+        self.assertEqual(history["values"]["CPU_Percent"]["mean"], [None, None, 5, 6])
+        self.assertEqual(store.history("s2")["timestamps"], [])
+
+    def test_one_collector_leads(self):
+        FakeLockDB.holder = None
+        first, second = MetricsCollector(), MetricsCollector()
+        with mock.patch.object(metrics.connector, "DBConnector", FakeLockDB):
+            self.assertTrue(first.is_leader())
+            self.assertFalse(second.is_leader())
+            self.assertTrue(first.is_leader())
+            # The leader's connection drops, its lock goes with it and another process takes over
+            first.leader.alive = False
+            FakeLockDB.holder = None
+            self.assertTrue(second.is_leader())
+            self.assertFalse(first.is_leader())
+
+if __name__ == "__main__":
+    unittest.main()
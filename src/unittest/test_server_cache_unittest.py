@@ -0,0 +1,65 @@
+import json
+import unittest
+from src.const import const
+from src.database import acl, server as server_module
+from src.database.organization import Organization
+from src.database.server import Server
+
+class FakeDB:
+    def __init__(self, row):
+        self.row = row
+        self.queries = []
+
+    def execute_query(self, query, values=None):
+        self.queries.append(query)
+        if query.lstrip().startswith("UPDATE"):
+            self.row = self.row[:9] + (tuple(values[0]),) + self.row[10:]
+            return None
+        return [self.row]
+
+class TestServerRowCache(unittest.TestCase):
+
+    def setUp(self):
+        acl_enabled = acl.acl_enabled
+        acl.acl_enabled = False
+        self.addCleanup(setattr, acl, "acl_enabled", acl_enabled)
+        server_module._server_row_cache.clear()
+        members = (json.dumps({"member": "owner", "role": [const.ROLE_ID_SUPER_USER]}),)
+        self.db = FakeDB(("s1", "web", "10.0.0.1", "org", "root", const.NULL_VALUE, const.NULL_VALUE,
+                          "2030-01-01T00:00:00", const.STATUS_ACTIVE, members, "22"))
+
+    def test_accessors_share_one_read(self):
+        server = Server(self.db)
+        self.assertTrue(server.check_user_access("owner", "s1"))
+        self.assertFalse(server.check_user_access("guest", "s1"))
+        info = server.get_info_to_connect("s1")
+        self.assertEqual(info["hostname"], "10.0.0.1")
+        self.assertEqual(server.get_server_by_id("s1")["server_name"], "web")
+        self.assertEqual(len(self.db.queries), 1)
+
+        # A later request within the TTL is served from the shared cache
+        self.assertTrue(Server(self.db).check_user_access("owner", "s1"))
+        self.assertEqual(len(self.db.queries), 1)
+
+    def test_write_invalidates_row(self):
+        server = Server(self.db)
+        self.assertFalse(server.check_user_access("guest", "s1"))
+        success, _ = server.add_member("s1", "guest")
+        self.assertTrue(success)
+        self.assertTrue(server.check_user_access("guest", "s1"))
+        self.assertTrue(Server(self.db).check_user_access("guest", "s1"))
+
+    def test_organization_writes_drop_its_server_rows(self):
+        class OrganizationDB:
+            def execute_query(self, query, values=None):
+                return [("s1",)] if "RETURNING server_id" in query else None
+
+        for change in (lambda org: org.change_organization_status("org", const.STATUS_INACTIVE),
+                       lambda org: org.delete_organization("org")):
+            Server(self.db).load_server_row("s1")
+            self.assertIsNotNone(server_module._server_row_cache.get("s1"))
+            self.assertTrue(change(Organization(OrganizationDB())))
+            self.assertIsNone(server_module._server_row_cache.get("s1"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,405 @@
+import hashlib
+import io
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+import zipfile
+import zlib
+from src.server_management import server_manager, script_deployer
+from src.server_management.script_deployer import FINGERPRINT_KEY, ScriptFile
+from src.server_management.server_manager import ServerManager, normalize_line_endings, gzip_stream
+
+class FakeAttr:
+    def __init__(self, filename, st_mode, st_size=0, st_mtime=1700000000):
+        self.filename = filename
+        self.st_mode = st_mode
+        self.st_size = st_size
+        self.st_mtime = st_mtime
+
+class FakeRemoteFile(io.BytesIO):
+    def prefetch(self, file_size=None):
+        pass
+
+    def readv(self, chunks):
+        self.requested = max([getattr(self, "requested", 0)] + [length for offset, length in chunks])
+        for offset, length in chunks:
+            self.seek(offset)
+            yield self.read(length)
+
+    def stat(self):
+        return FakeAttr("", stat.S_IFREG, len(self.getvalue()))
+
+class FakeSFTP:
+    def __init__(self, tree):
+        self.tree = tree
+        self.closed = False
+
+    def listdir_attr(self, path):
+        entries = []
+        for name, value in self.tree[path].items():
+            if isinstance(value, bytes):
+                entries.append(FakeAttr(name, stat.S_IFREG | 0o644, len(value)))
+            else:
+                entries.append(FakeAttr(name, stat.S_IFDIR | 0o755))
+        return entries
+
+    def open(self, path, mode="r"):
+        directory, name = path.rsplit("/", 1)
+        self.opened = FakeRemoteFile(self.tree[directory][name])
+        return self.opened
+
+    def stat(self, path):
+        self.stats = getattr(self, "stats", 0) + 1
+        if path in self.tree:
+            return FakeAttr(path, stat.S_IFDIR | 0o755)
+        directory, name = path.rsplit("/", 1)
+        if name not in self.tree.get(directory, {}):
+            raise FileNotFoundError(path)
+        return FakeAttr(name, stat.S_IFREG | 0o640, len(self.tree[directory][name]))
+
+    def close(self):
+        self.closed = True
+
+class FakeChannel:
+    def recv_exit_status(self):
+        return 0
+
+class FakeStdout(io.BytesIO):
+    channel = FakeChannel()
+
+class FakeSession:
+    # Session channel that has all of a script's output ready at once
+    def __init__(self, stdout, stderr, exit_status=0):
+        self.stdout = io.BytesIO(stdout)
+        self.stderr = io.BytesIO(stderr)
+        self.exit_status = exit_status
+        self.eof_received = True
+        self.closed = False
+
+    def exec_command(self, command):
+        self.command = command
+
+    def recv_ready(self):
+        return self.stdout.tell() < len(self.stdout.getvalue())
+
+    def recv(self, size):
+        return self.stdout.read(size)
+
+    def recv_stderr_ready(self):
+        return self.stderr.tell() < len(self.stderr.getvalue())
+
+    def recv_stderr(self, size):
+        return self.stderr.read(size)
+
+    def exit_status_ready(self):
+        return True
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+    def close(self):
+        self.closed = True
+
+class FakeTransport:
+    def __init__(self, session):
+        self.session = session
+
+    def open_session(self):
+        return self.session
+
+class FakeSSHClient:
+    def __init__(self, sftp):
+        self.sftp = sftp
+        self.commands = []
+
+    def open_sftp(self):
+        return self.sftp
+
+    def exec_command(self, command):
+        # Stands in for sha256sum over the single remote file the tests use
+        self.commands.append(command)
+        content = next(iter(self.sftp.tree["/srv"].values()))
+        return None, FakeStdout(f"{hashlib.sha256(content).hexdigest()}  -\n".encode()), io.BytesIO()
+
+class TestNormalizeLineEndings(unittest.TestCase):
+
+    def test_crlf_split_across_chunks(self):
+        chunks = [b"echo a\r", b"\necho b\r\n", b"echo c\r\n"]
+        self.assertEqual(b"".join(normalize_line_endings(chunks)), b"echo a\necho b\necho c\n")
+
+    def test_lone_carriage_return_kept(self):
+        self.assertEqual(b"".join(normalize_line_endings([b"a\rb\r"])), b"a\rb\r")
+
+    def test_binary_passed_through(self):
+        chunks = [b"\x89PNG\r\n\x1a\n\x00", b"\r\n"]
+        self.assertEqual(b"".join(normalize_line_endings(chunks)), b"".join(chunks))
+
+    def test_empty_stream(self):
+        self.assertEqual(b"".join(normalize_line_endings([])), b"")
+
+class TestStreamScriptOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ServerManager("host", "user", "password")
+        self.server.client = mock.MagicMock()
+        self.session = FakeSession("caf\u00e9 log\n".encode() * 1000, b"warning\n")
+        self.server.client.get_transport = lambda: FakeTransport(self.session)
+
+    def test_raw_bytes_split_anywhere(self):
+        chunks = list(self.server.stream_script_in_remote_server("/srv/log.sh", chunk_size=7, decode=False))
+        stdout = b"".join(data for stream, data in chunks if stream == "stdout")
+        self.assertEqual(stdout, self.session.stdout.getvalue())
+        self.assertEqual(chunks[-1], ("exit", 0))
+        self.assertTrue(self.session.closed)
+
+    def test_gzip_stream(self):
+        chunks = [data for stream, data in self.server.stream_script_in_remote_server("/srv/log.sh", decode=False)
+                  if stream == "stdout"]
+        compressed = b"".join(gzip_stream(chunks))
+        self.assertEqual(zlib.decompress(compressed, 31), self.session.stdout.getvalue())
+        self.assertEqual(zlib.decompress(b"".join(gzip_stream([])), 31), b"")
+
+class TestRemoteCompression(unittest.TestCase):
+
+    def setUp(self):
+        server_manager.script_output_sizes.clear()
+        server_manager.gzip_unavailable.clear()
+        self.output = b"CONTAINER ID   IMAGE\n" * 5000
+        self.server = ServerManager("host", "user", "password")
+        self.server.client = mock.MagicMock()
+
+    def run_script(self, *sessions):
+        sessions = list(sessions)
+
+        def transport():
+            self.session = sessions.pop(0)
+            return FakeTransport(self.session)
+        self.server.client.get_transport = transport
+        chunks = list(self.server.stream_script_in_remote_server("/srv/docker.sh", "list", chunk_size=1000,
+                                                                 decode=False, compress=True))
+        return b"".join(data for stream, data in chunks if stream == "stdout")
+
+    def test_gzipped_output_inflated_incrementally(self):
+        self.assertEqual(self.run_script(FakeSession(zlib.compress(self.output, wbits=31), b"")), self.output)
+        self.assertIn("gzip -c", self.session.command)
+        self.assertIn("pipefail", self.session.command)
+        self.assertEqual(server_manager.script_output_sizes.get(("host", "/srv/docker.sh")), len(self.output))
+
+    def test_gzipped_output_passed_through(self):
+        compressed = zlib.compress(self.output, wbits=31)
+        self.session = FakeSession(compressed, b"")
+        self.server.client.get_transport = lambda: FakeTransport(self.session)
+        chunks = list(self.server.stream_script_in_remote_server("/srv/docker.sh", chunk_size=1000, decode=False,
+                                                                 compress=True, inflate=False))
+        self.assertEqual(chunks[0], ("encoding", "gzip"))
+        self.assertEqual(b"".join(data for stream, data in chunks if stream == "stdout"), compressed)
+        self.assertEqual(server_manager.script_output_sizes.get(("host", "/srv/docker.sh")), len(self.output))
+
+    def test_small_output_sent_plain_next_time(self):
+        self.run_script(FakeSession(zlib.compress(b"none\n", wbits=31), b""))
+        self.assertEqual(self.run_script(FakeSession(b"none\n", b"")), b"none\n")
+        self.assertEqual(self.session.command, "bash /srv/docker.sh list")
+
+    def test_missing_gzip_falls_back(self):
+        missing = FakeSession(b"", b"bash: line 1: gzip: command not found\n", exit_status=127)
+        self.assertEqual(self.run_script(missing, FakeSession(self.output, b"")), self.output)
+        self.assertTrue(server_manager.gzip_unavailable.get("host"))
+        self.assertTrue(missing.closed)
+        self.assertEqual(self.session.command, "bash /srv/docker.sh list")
+
+class TestDisconnect(unittest.TestCase):
+
+    def test_second_disconnect_leaves_pooled_client_alone(self):
+        client = mock.MagicMock()
+        with mock.patch.object(server_manager, "ssh_pool") as pool:
+            pool.acquire.return_value = client
+            server = ServerManager("host", "user", "password", server_id="s1")
+            server.pooled = True
+            self.assertTrue(server.connect())
+            server.disconnect()
+            server.disconnect()
+        pool.release.assert_called_once()
+        client.close.assert_not_called()
+
+    def test_pooled_manager_never_builds_its_own_client(self):
+        with mock.patch.object(server_manager, "ssh_pool") as pool, \
+                mock.patch.object(server_manager.paramiko, "SSHClient") as ssh_client:
+            pool.acquire.return_value = mock.MagicMock()
+            server = ServerManager("host", "user", "password", server_id="s1")
+            server.pooled = True
+            self.assertTrue(server.connect())
+            server.disconnect()
+        ssh_client.assert_not_called()
+
+class FakeManifestStore:
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self.saved = None
+
+    def get_manifest(self, server_id, script_directory):
+        return self.manifest
+
+    def save_manifest(self, server_id, script_directory, manifest):
+        self.saved = manifest
+
+class FakeExecOutput(io.BytesIO):
+    def __init__(self, data, exit_status=0):
+        super().__init__(data)
+        self.channel = mock.MagicMock()
+        self.channel.recv_exit_status.return_value = exit_status
+
+class TestScriptDeployment(unittest.TestCase):
+
+    def setUp(self):
+        script = ScriptFile("/local/log/ufw.sh", b"tail -n 1000 /var/log/ufw.log\n")
+        patcher = mock.patch.dict(script_deployer.script_bundle, {script.name: script}, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        script_deployer.deployed_manifests.clear()
+        self.addCleanup(script_deployer.deployed_manifests.clear)
+        self.manifest = {script.name: script.digest, FINGERPRINT_KEY: "42 1700000000"}
+        self.server = ServerManager("host", "user", "password", server_id="s1")
+        self.server.upload_script_bundle = mock.MagicMock(return_value=True)
+        self.server.directory_fingerprint = mock.MagicMock(return_value="42 1700000000")
+
+    def test_matching_fingerprint_trusts_manifest(self):
+        self.assertTrue(self.server.ensure_scripts_deployed("/srv/scripts", FakeManifestStore(self.manifest)))
+        self.server.upload_script_bundle.assert_not_called()
+
+    def test_changed_directory_redeploys(self):
+        store = FakeManifestStore(self.manifest)
+        self.server.directory_fingerprint.side_effect = ["43 1700000500", "43 1700000600"]
+        self.assertTrue(self.server.ensure_scripts_deployed("/srv/scripts", store))
+        self.server.upload_script_bundle.assert_called_once()
+        self.assertEqual(store.saved[FINGERPRINT_KEY], "43 1700000600")
+
+    def test_failed_upload_reported(self):
+        self.server.upload_script_bundle.return_value = False
+        self.assertFalse(self.server.ensure_scripts_deployed("/srv/scripts", FakeManifestStore(None)))
+
+    def test_missing_script_redeployed_and_run_again(self):
+        runs = [
+            (FakeExecOutput(b"", 127), FakeExecOutput(b"bash: /srv/scripts/ufw.sh: No such file or directory\n")),
+            (FakeExecOutput(b"Jun  3 10:22:01 web-1 kernel\n"), FakeExecOutput(b""))
+        ]
+        self.server.client = mock.MagicMock()
+        self.server.client.exec_command.side_effect = lambda command, timeout=None: (None, *runs.pop(0))
+        self.server.redeploy_scripts = mock.MagicMock(return_value=True)
+        stdout, stderr = self.server.execute_script_in_remote_server("/srv/scripts/ufw.sh")
+        self.server.redeploy_scripts.assert_called_once_with("/srv/scripts")
+        self.assertEqual((stdout, stderr), ("Jun  3 10:22:01 web-1 kernel\n", ""))
+
+class TestStreamFolderAsZip(unittest.TestCase):
+
+    def test_zip_contains_tree(self):
+        sftp = FakeSFTP({
+            "/srv/app": {"main.py": b"print(1)\n", "lib": {}},
+            "/srv/app/lib": {"util.py": b"x" * 300000}
+        })
+        server = ServerManager("host", "user", "password")
+        server.client = FakeSSHClient(sftp)
+        chunks = list(server.stream_folder_as_zip("/srv/app/", chunk_size=65536))
+        self.assertGreater(len(chunks), 1)
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+            self.assertEqual(sorted(archive.namelist()), ["lib/util.py", "main.py"])
+            self.assertEqual(archive.read("lib/util.py"), b"x" * 300000)
+            self.assertIsNone(archive.testzip())
+        self.assertTrue(sftp.closed)
+        # Reads go out one bounded window at a time
+        self.assertLessEqual(sftp.opened.requested, 65536)
+
+class TestResumableTransfer(unittest.TestCase):
+
+    def setUp(self):
+        self.content = os.urandom(100000)
+        self.server = ServerManager("host", "user", "password")
+        self.server.client = FakeSSHClient(FakeSFTP({"/srv": {"artifact.bin": self.content}}))
+
+    def test_read_remote_range(self):
+        data = b"".join(self.server.read_remote_range("/srv/artifact.bin", 10, 70000, chunk_size=16384))
+        self.assertEqual(data, self.content[10:70000])
+
+    def test_resume_partial_download(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            local_path = os.path.join(tmp, "artifact.bin")
+            with open(local_path, "wb") as local_file:
+                local_file.write(self.content[:40000])
+            self.assertTrue(self.server.download_file_resumable("/srv/artifact.bin", local_path, chunk_size=16384))
+            with open(local_path, "rb") as local_file:
+                self.assertEqual(local_file.read(), self.content)
+
+    def test_corrupt_partial_download_restarts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            local_path = os.path.join(tmp, "artifact.bin")
+            with open(local_path, "wb") as local_file:
+                local_file.write(b"x" * 40000)
+            self.assertTrue(self.server.download_file_resumable("/srv/artifact.bin", local_path))
+            with open(local_path, "rb") as local_file:
+                self.assertEqual(local_file.read(), self.content)
+
+    def test_remote_sha256_range_command(self):
+        self.server.remote_sha256("/srv/my file.bin", 100, 50)
+        self.assertEqual(self.server.client.commands[-1], "tail -c +101 -- '/srv/my file.bin' | head -c 50 | sha256sum")
+        self.server.remote_sha256("/srv/artifact.bin")
+        self.assertEqual(self.server.client.commands[-1], "sha256sum -- /srv/artifact.bin")
+
+class TestStreamUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ServerManager("host", "user", "password")
+        self.server.client = mock.MagicMock()
+        self.sftp = self.server.client.open_sftp.return_value
+
+    def test_renamed_into_place_after_last_chunk(self):
+        self.assertTrue(self.server.upload_stream_to_remote([b"a", b"b"], "/srv/file.bin"))
+        self.sftp.open.assert_called_once_with("/srv/file.bin.part", "wb", bufsize=1024 * 1024)
+        self.sftp.posix_rename.assert_called_once_with("/srv/file.bin.part", "/srv/file.bin")
+        self.sftp.remove.assert_not_called()
+
+    def test_partial_file_removed_on_failure(self):
+        def chunks():
+            yield b"a"
+            raise IOError("client went away")
+        self.assertFalse(self.server.upload_stream_to_remote(chunks(), "/srv/file.bin"))
+        self.sftp.posix_rename.assert_not_called()
+        self.sftp.remove.assert_called_once_with("/srv/file.bin.part")
+        self.sftp.close.assert_called_once()
+
+class TestPathInfo(unittest.TestCase):
+
+    def setUp(self):
+        self.sftp = FakeSFTP({"/srv": {"run.sh": b"echo hi\n"}})
+        self.server = ServerManager("host", "user", "password")
+        self.server.client = FakeSSHClient(self.sftp)
+
+    def test_file_and_directory(self):
+        info = self.server.path_info("/srv/run.sh")
+        self.assertEqual(info, {"exists": True, "type": "file", "size": 8, "mode": 0o640, "mtime": 1700000000, "error": None})
+        self.assertEqual(self.server.path_info("/srv")["type"], "directory")
+        self.assertEqual(self.server.check_file_type("/srv"), (True, "directory"))
+        self.assertFalse(self.server.path_info("/srv/missing.sh")["exists"])
+        self.assertFalse(self.server.check_script_exists_on_remote("/srv/missing.sh"))
+
+    def test_stat_error_is_reported_and_not_cached(self):
+        def denied(path):
+            self.sftp.stats = getattr(self.sftp, "stats", 0) + 1
+            raise PermissionError(13, "Permission denied")
+        self.sftp.stat = denied
+        info = self.server.path_info("/root/secret")
+        self.assertIsNone(info["exists"])
+        self.assertIn("Permission denied", info["error"])
+        self.server.path_info("/root/secret")
+        self.assertEqual(self.sftp.stats, 2)
+
+    def test_cached_until_invalidated(self):
+        self.server.path_info("/srv/run.sh")
+        self.server.path_info("/srv/run.sh")
+        self.assertEqual(self.sftp.stats, 1)
+        self.server.invalidate_path_info()
+        self.server.path_info("/srv/run.sh")
+        self.assertEqual(self.sftp.stats, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import json
+import unittest
+from src.const import const
+from src.database import acl, server as server_module
+from src.database.server import Server
+from src.database.server_member import ServerMember
+
+class FakeDB:
+    def __init__(self, rows):
+        # rows of (server_id, username, role_id, position)
+        self.rows = rows
+        self.queries = []
+
+    def execute_query(self, query, values=None):
+        self.queries.append(query)
+        if "EXISTS" in query and "INSERT" not in query:
+            return [(any(row[0] == values[0] and row[1] == values[1] for row in self.rows),)]
+        if "ORDER BY position" in query:
+            rows = sorted((row for row in self.rows if row[0] == values[0]), key=lambda row: (row[3], row[2]))
+            return [(row[1], row[2]) for row in rows]
+        if "MIN(position)" in query:
+            positions = [row[3] for row in self.rows if row[0] == values[0] and row[1] == values[1]]
+            return [(min(positions) if positions else None,)]
+        if query.startswith("DELETE"):
+            self.rows = [row for row in self.rows if not (row[0] == values[0] and row[1] == values[1])]
+        return None
+
+    def execute_transaction(self, queries):
+        for query, values in queries:
+            if query.startswith("INSERT"):
+                self.rows += [(values[0], values[1], role, values[2]) for role in values[3]]
+            else:
+                self.execute_query(query, values)
+        return True
+
+class TestServerMember(unittest.TestCase):
+
+    def setUp(self):
+        acl_enabled = acl.acl_enabled
+        acl.acl_enabled = False
+        self.addCleanup(setattr, acl, "acl_enabled", acl_enabled)
+        self.db = FakeDB([("s1", "owner", const.ROLE_ID_SUPER_USER, 0),
+                          ("s1", "dev", const.ROLE_ID_USER, 1),
+                          ("s1", "dev", const.ROLE_ID_SUPER_USER, 1)])
+
+    def test_get_members_groups_roles(self):
+        members = ServerMember(self.db).get_members("s1")
+        self.assertEqual(members, [{"member": "owner", "role": [const.ROLE_ID_SUPER_USER]},
+                                   {"member": "dev", "role": [const.ROLE_ID_SUPER_USER, const.ROLE_ID_USER]}])
+
+    def test_server_uses_table_storage(self):
+        previous = server_module.member_storage
+        server_module.member_storage = "table"
+        try:
+            server = Server(self.db)
+            self.assertTrue(server.check_user_access("dev", "s1"))
+            self.assertFalse(server.check_user_access("guest", "s1"))
+            self.assertEqual(server.remove_member("s1", "owner")[1], "Cannot remove the creator of the server.")
+
+            self.assertTrue(server.update_member_roles("s1", "dev", [const.ROLE_ID_USER])[0])
+            self.assertEqual(ServerMember(self.db).get_members("s1")[1]["role"], [const.ROLE_ID_USER])
+            self.assertFalse(server.update_member_roles("s1", "guest", [const.ROLE_ID_USER])[0])
+
+            self.assertTrue(server.remove_member("s1", "dev")[0])
+            self.assertFalse(server.check_user_access("dev", "s1"))
+        finally:
+            server_module.member_storage = previous
+
+    def test_server_data_reads_member_table(self):
+        previous = server_module.member_storage
+        server_module.member_storage = "table"
+        try:
+            server = Server(self.db)
+            # The tbl_server.member array only holds the creator in table mode
+            server.rows["s1"] = {"server_id": "s1", "member": ('{"member": "owner", "role": []}',)}
+            members = [json.loads(member)["member"] for member in server.get_server_data("s1")["member"]]
+            self.assertEqual(members, ["owner", "dev"])
+        finally:
+            server_module.member_storage = previous
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import hashlib
+import io
+import os
+import shlex
+import tempfile
+import threading
+import unittest
+from src.server_management.transfer import (FolderUploader, mkdir_commands, parse_remote_hashes, parse_remote_listing, plan_sync,
+                                             plan_upload, remote_hash_commands, remote_listing_command)
+
+class FakeChannel:
+    def __init__(self, status=0):
+        self.status = status
+
+    def recv_exit_status(self):
+        return self.status
+
+class FakeStdout(io.BytesIO):
+    def __init__(self, data=b"", status=0):
+        super().__init__(data)
+        self.channel = FakeChannel(status)
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+class FakeRemoteFile(io.BytesIO):
+    def __init__(self, files, path):
+        super().__init__()
+        self.files = files
+        self.path = path
+
+    def set_pipelined(self, pipelined=True):
+        pass
+
+    def close(self):
+        self.files[self.path] = self.getvalue()
+        super().close()
+
+class FakeSFTP:
+    def __init__(self, files):
+        self.files = files
+
+    def open(self, path, mode="r", bufsize=-1):
+        return FakeRemoteFile(self.files, path)
+
+    def close(self):
+        pass
+
+class FakeClient:
+    def __init__(self):
+        self.commands = []
+        self.files = {}
+        self.sessions = 0
+        self.listing = ""
+        self.listing_status = 0
+        self.hashes = ""
+        self.lock = threading.Lock()
+
+    def exec_command(self, command):
+        self.commands.append(command)
+        if command.startswith("if [ -d"):
+            return None, FakeStdout(self.listing.encode(), self.listing_status), io.BytesIO(b"find: './private': Permission denied")
+        if "sha256sum" in command:
+            return None, FakeStdout(self.hashes.encode()), io.BytesIO()
+        return None, FakeStdout(), io.BytesIO()
+
+    def open_sftp(self):
+        with self.lock:
+            self.sessions += 1
+        return FakeSFTP(self.files)
+
+class TestTransfer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self.tmp.name, "project")
+        os.makedirs(os.path.join(self.folder, "src", "pkg"))
+        os.makedirs(os.path.join(self.folder, "empty"))
+        for relative, content in (("Dockerfile", b"FROM python\n"), ("src/app.py", b"x" * 5000), ("src/pkg/__init__.py", b"")):
+            with open(os.path.join(self.folder, relative), "wb") as local_file:
+                local_file.write(content)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_plan_upload(self):
+        directories, files = plan_upload(self.folder, "/srv/project")
+        self.assertEqual(directories, ["/srv/project", "/srv/project/empty", "/srv/project/src", "/srv/project/src/pkg"])
+        self.assertEqual([remote for _, remote, _ in files][0], "/srv/project/src/app.py")
+        self.assertEqual(len(files), 3)
+
+    def test_mkdir_commands_batch(self):
+        commands = mkdir_commands(["/a", "/b c", "/d"], batch_bytes=10)
+        self.assertEqual(commands, ["mkdir -p -- /a '/b c'", "mkdir -p -- /d"])
+        self.assertEqual(shlex.split(commands[0])[3:], ["/a", "/b c"])
+
+    def test_upload_folder(self):
+        client = FakeClient()
+        uploaded = []
+        stats = FolderUploader(client, channels=2).upload(self.folder, "/srv/project", uploaded.append).as_dict()
+        self.assertEqual(len(client.commands), 1)
+        self.assertEqual(stats["files"], 3)
+        self.assertEqual(stats["bytes"], 5012)
+        self.assertEqual(stats["errors"], [])
+        self.assertEqual(len(uploaded), 3)
+        self.assertEqual(client.sessions, 2)
+        self.assertEqual(client.files["/srv/project/src/app.py"], b"x" * 5000)
+        self.assertEqual(client.files["/srv/project/src/pkg/__init__.py"], b"")
+
+    def remote_listing(self):
+        return "\n".join([
+            "12 1700000000.5 Dockerfile",
+            "5000 1700000000.0 src/app.py",
+            "3 1700000000.0 old/removed.txt"
+        ]) + "\n"
+
+    def remote_hashes(self):
+        return "\n".join([
+            sha256(b"FROM python\n") + "  ./Dockerfile",
+            f"{sha256(b'y' * 5000)}  ./src/app.py"
+        ]) + "\n"
+
+    def test_parse_remote_listing(self):
+        files = parse_remote_listing(self.remote_listing())
+        parse_remote_hashes(self.remote_hashes(), files)
+        self.assertEqual(files["Dockerfile"], {"size": 12, "mtime": 1700000000.5, "sha256": sha256(b"FROM python\n")})
+        self.assertIsNone(files["old/removed.txt"]["sha256"])
+        self.assertEqual(len(files), 3)
+        self.assertEqual(parse_remote_listing(""), {})
+        self.assertIn("'/srv/my project'", remote_listing_command("/srv/my project"))
+        self.assertEqual(remote_hash_commands("/srv/my project", ["a b", "c"]), ["cd '/srv/my project' && sha256sum -- './a b' ./c"])
+
+    def test_plan_sync(self):
+        remote_files = parse_remote_listing(self.remote_listing())
+        parse_remote_hashes(self.remote_hashes(), remote_files)
+        _, uploads, unchanged, deletions = plan_sync(self.folder, "/srv/project", remote_files)
+        self.assertEqual(sorted(remote for _, remote, _ in uploads), ["/srv/project/src/app.py", "/srv/project/src/pkg/__init__.py"])
+        self.assertEqual([remote for _, remote, _ in unchanged], ["/srv/project/Dockerfile"])
+        self.assertEqual(deletions, ["/srv/project/old/removed.txt"])
+
+    def test_sync_folder(self):
+        client = FakeClient()
+        client.listing = self.remote_listing()
+        client.hashes = self.remote_hashes()
+        seen = []
+        stats = FolderUploader(client, channels=2).sync(self.folder, "/srv/project", seen.append).as_dict()
+        self.assertEqual((stats["files"], stats["skipped"], stats["deleted"]), (2, 1, 1))
+        self.assertEqual(len(seen), 3)
+        self.assertNotIn("/srv/project/Dockerfile", client.files)
+        self.assertIn("rm -f -- /srv/project/old/removed.txt", client.commands)
+        self.assertGreater(client.commands.index("rm -f -- /srv/project/old/removed.txt"),
+                           client.commands.index(mkdir_commands(plan_upload(self.folder, "/srv/project")[0])[0]))
+        # Only the files matching a local one in size are hashed
+        self.assertIn("cd /srv/project && sha256sum -- ./src/app.py ./Dockerfile", client.commands)
+
+    def test_sync_fails_when_the_listing_fails(self):
+        client = FakeClient()
+        client.listing = self.remote_listing()
+        client.listing_status = 1
+        with self.assertRaisesRegex(IOError, "Permission denied"):
+            FolderUploader(client).sync(self.folder, "/srv/project")
+        self.assertEqual(len(client.commands), 1)
+        self.assertEqual(client.files, {})
+
+    def test_sync_keeps_remote_files_when_an_upload_fails(self):
+        client = FakeClient()
+        client.listing = self.remote_listing()
+        client.hashes = self.remote_hashes()
+        uploader = FolderUploader(client, channels=2)
+
+        def disk_full(sftp, local_path, remote_path):
+            raise IOError("No space left on device")
+
+        uploader._put = disk_full
+        stats = uploader.sync(self.folder, "/srv/project").as_dict()
+        self.assertEqual((stats["deleted"], len(stats["errors"])), (0, 2))
+        self.assertFalse(any(command.startswith(("rm -f", "find")) for command in client.commands))
+
+if __name__ == "__main__":
+    unittest.main()